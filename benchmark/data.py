@@ -0,0 +1,345 @@
+"""Synthetic data for benchmarks.
+
+Sizes in real recipe sites are heavy tailed: a few users have most of
+the followers and recipes, a few recipes get most of the reviews and
+derivations. `generate_dataset` reproduces that with power-law choices
+and inserts everything in bulk, then rebuilds what model signals would
+otherwise have maintained (rating aggregates and feeds).
+"""
+from bisect import bisect
+from collections import Counter
+from django.contrib.auth.models import User
+from django.db import transaction
+from feed.models import rebuild_feed
+from notification.models import Notification
+from recipe.lineage import lineage_for
+from recipe.models import Recipe, recipe_ids
+from recipe.parsing import compile_recipe
+from recipebook.models import RecipeBook, recipebook_ids
+from review.models import Review, reconcile_ratings
+from user_profile.models import (
+    Follow,
+    UserProfile,
+    reconcile_follow_counts
+)
+
+
+BATCH_SIZE = 500
+
+SCORES = (1, 2, 3, 3, 4, 4, 4, 5, 5, 5)
+
+QUANTITIES = ('a', '1', '2', '3', '4', '1/2', '1 1/2', '100', '250', '500')
+
+UNITS = ('', '', '', 'cup', 'cups', 'tbsp', 'tsp', 'g', 'kg', 'ml', 'oz',
+         'lb', 'cloves', 'pinch')
+
+
+def make_vocabulary(size, rng):
+    """Return `size` pseudo-words."""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = set()
+    while len(words) < size:
+        length = rng.randint(4, 9)
+        words.add(''.join(rng.choice(letters) for _ in range(length)))
+    return sorted(words)
+
+
+class PowerLawChoice(object):
+    """Pick indexes below `n`, index i with weight 1 / (i + 1) ** exponent.
+
+    Shuffle what the indexes refer to if low ones should not also be
+    the oldest."""
+
+    def __init__(self, n, rng, exponent=1.0):
+        self.rng = rng
+        weights = [1 / (rank + 1) ** exponent for rank in range(n)]
+        total = sum(weights)
+        self.cumulative = []
+        running = 0
+        for weight in weights:
+            running += weight / total
+            self.cumulative.append(running)
+
+    def __call__(self):
+        i = bisect(self.cumulative, self.rng.random())
+        return min(i, len(self.cumulative) - 1)
+
+
+class TextGenerator(object):
+    """Zipf-distributed text, so a few words are common and most rare."""
+
+    def __init__(self, vocabulary, rng):
+        self.rng = rng
+        self.vocabulary = vocabulary
+        self.choose = PowerLawChoice(len(vocabulary), rng)
+
+    def word(self):
+        return self.vocabulary[self.choose()]
+
+    def words(self, n):
+        return ' '.join(self.word() for _ in range(n))
+
+    def ingredient(self):
+        """Return an ingredient line such as "1 1/2 cups word word"."""
+        parts = [self.rng.choice(QUANTITIES), self.rng.choice(UNITS)]
+        parts.append(self.words(self.rng.randint(1, 2)))
+        return ' '.join(part for part in parts if part)
+
+
+def sample_distinct(choose, k, limit):
+    """Return up to `k` distinct values from `choose()`, out of `limit`."""
+    k = min(k, limit)
+    values = set()
+    attempts = 0
+    while len(values) < k and attempts < k * 20:
+        values.add(choose())
+        attempts += 1
+    return values
+
+
+def generate_dataset(rng, prefix='bench', users=200, recipes=2000,
+                     reviews=5000, books=3, book_size=20,
+                     follow_exponent=1.2, derive_probability=0.2,
+                     read_fraction=0.8, stdout=None):
+    """Insert a synthetic dataset; return counts of the rows created.
+
+    Users are named "<prefix>_0" to "<prefix>_<users - 1>". The first
+    one is the heaviest: they follow the most users and own recipes,
+    books and reviews, so benchmarks can view every page as them."""
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    text = TextGenerator(make_vocabulary(3000, rng), rng)
+    with transaction.atomic():
+        log('Creating {} users...'.format(users))
+        user_ids = create_users(prefix, users)
+        popular_user = PowerLawChoice(users, rng, follow_exponent)
+        by_popularity = list(user_ids)
+        rng.shuffle(by_popularity)
+
+        log('Creating follows...')
+        follows = create_follows(
+            prefix, user_ids, by_popularity, popular_user, rng
+        )
+
+        log('Creating {} recipes...'.format(recipes))
+        recipe_rows = create_recipes(
+            user_ids, by_popularity, popular_user, recipes, text,
+            derive_probability, rng
+        )
+        recipe_ids = [row[0] for row in recipe_rows]
+        popular_recipe = PowerLawChoice(len(recipe_ids), rng)
+        recipes_by_popularity = list(recipe_ids)
+        rng.shuffle(recipes_by_popularity)
+
+        log('Creating {} reviews...'.format(reviews))
+        review_count = create_reviews(
+            user_ids, recipes_by_popularity, popular_recipe, reviews,
+            text, rng
+        )
+
+        log('Creating recipe books...')
+        book_count = create_books(
+            user_ids, recipes_by_popularity, popular_recipe, books,
+            book_size, text, rng
+        )
+
+        log('Creating notifications...')
+        notification_count = create_notifications(
+            prefix, follows, recipe_rows, read_fraction, rng
+        )
+
+        log('Updating rating aggregates...')
+        reconcile_ratings(Recipe.objects.filter(
+            user__username__startswith=prefix + '_'
+        ))
+
+    log('Building feeds...')
+    users = User.objects.filter(username__startswith=prefix + '_')
+    for user in users.iterator():
+        with transaction.atomic():
+            rebuild_feed(user)
+
+    return dict(
+        users=len(user_ids),
+        follows=len(follows),
+        recipes=len(recipe_ids),
+        derived_recipes=sum(1 for row in recipe_rows if row[2]),
+        reviews=review_count,
+        recipebooks=book_count,
+        notifications=notification_count,
+    )
+
+
+def create_users(prefix, count):
+    """Create users and their profiles; return their ids in order."""
+    names = ['{}_{}'.format(prefix, i) for i in range(count)]
+    User.objects.bulk_create(
+        (User(username=name, password='!') for name in names),
+        batch_size=BATCH_SIZE
+    )
+    ids = dict(User.objects.filter(
+        username__startswith=prefix + '_'
+    ).values_list('username', 'id'))
+    user_ids = [ids[name] for name in names]
+    UserProfile.objects.bulk_create(
+        (UserProfile(user_id=pk) for pk in user_ids),
+        batch_size=BATCH_SIZE
+    )
+    return user_ids
+
+
+def create_follows(prefix, user_ids, by_popularity, popular_user, rng):
+    """Follow popular users, with heavy-tailed numbers of follows.
+
+    Returns a list of (follower id, followed id) pairs."""
+    limit = len(user_ids) - 1
+    pairs = []
+    for i, user_id in enumerate(user_ids):
+        degree = int(rng.paretovariate(1.2))
+        if i == 0:
+            degree = max(degree, limit // 2)
+        followed = sample_distinct(
+            lambda: by_popularity[popular_user()], degree, limit
+        )
+        followed.discard(user_id)
+        pairs.extend((user_id, f) for f in followed)
+    Follow.objects.bulk_create(
+        (Follow(follower_id=a, followed_id=b) for a, b in pairs),
+        batch_size=BATCH_SIZE
+    )
+    reconcile_follow_counts(UserProfile.objects.filter(
+        user__username__startswith=prefix + '_'
+    ))
+    return pairs
+
+
+def create_recipes(user_ids, by_popularity, popular_user, count, text,
+                   derive_probability, rng):
+    """Create recipes; some derive from recent ones, forming chains.
+
+    Returns a list of (id, author id, origin id or None)."""
+    ids = recipe_ids.allocate_many(count)
+    rows = []
+    for i, pk in enumerate(ids):
+        author = user_ids[0] if i == 0 else by_popularity[popular_user()]
+        origin = None
+        if rows and rng.random() < derive_probability:
+            # Mostly derive from the latest recipes, often themselves
+            # derived, so chains of derivations form.
+            age = min(int(rng.paretovariate(1.0)), len(rows))
+            origin = rows[-age][0]
+        rows.append((pk, author, origin))
+    lineages = {}
+    derivations = Counter(origin for _, _, origin in rows if origin)
+
+    def make_recipe(pk, author, origin):
+        lineages[pk] = lineage_for(pk, lineages.get(origin, ''))
+        ingredients = '\n'.join(
+            text.ingredient() for _ in range(rng.randint(3, 12))
+        )
+        directions = '\n\n'.join(
+            text.words(2) + '\n' + text.words(12)
+            for _ in range(rng.randint(2, 8))
+        )
+        return Recipe(
+            id=pk,
+            user_id=author,
+            origin_recipe_id=origin,
+            title=text.words(3)[:50],
+            description=text.words(25),
+            ingredients=ingredients,
+            directions=directions,
+            compiled=compile_recipe(ingredients, directions),
+            lineage=lineages[pk],
+            derivation_count=derivations[pk]
+        )
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        Recipe.objects.bulk_create(
+            make_recipe(*row) for row in rows[start:start + BATCH_SIZE]
+        )
+    return rows
+
+
+def create_reviews(user_ids, recipes_by_popularity, popular_recipe, count,
+                   text, rng):
+    """Review popular recipes, at most once per user and recipe."""
+    pairs = set([(user_ids[0], recipes_by_popularity[0])])
+    attempts = 0
+    while len(pairs) < count and attempts < count * 20:
+        pairs.add((
+            rng.choice(user_ids),
+            recipes_by_popularity[popular_recipe()]
+        ))
+        attempts += 1
+    Review.objects.bulk_create(
+        (Review(
+            user_id=user,
+            recipe_id=recipe,
+            title=text.words(3)[:50],
+            body=text.words(40),
+            score=rng.choice(SCORES)
+        ) for user, recipe in pairs),
+        batch_size=BATCH_SIZE
+    )
+    return len(pairs)
+
+
+def create_books(user_ids, recipes_by_popularity, popular_recipe, average,
+                 average_size, text, rng):
+    """Give users recipe books of popular recipes."""
+    books = []
+    for i, user_id in enumerate(user_ids):
+        amount = rng.randint(1 if i == 0 else 0, 2 * average)
+        books.extend(
+            (user_id, rng.randint(0, 2 * average_size))
+            for _ in range(amount)
+        )
+    ids = recipebook_ids.allocate_many(len(books))
+    RecipeBook.objects.bulk_create(
+        (RecipeBook(
+            id=pk,
+            user_id=user_id,
+            title=text.words(2)[:50],
+            description=text.words(15)
+        ) for pk, (user_id, _) in zip(ids, books)),
+        batch_size=BATCH_SIZE
+    )
+    Through = RecipeBook.recipes.through
+    Through.objects.bulk_create(
+        (Through(recipebook_id=pk, recipe_id=recipe_id)
+         for pk, (_, size) in zip(ids, books)
+         for recipe_id in sample_distinct(
+             lambda: recipes_by_popularity[popular_recipe()],
+             size,
+             len(recipes_by_popularity)
+         )),
+        batch_size=BATCH_SIZE
+    )
+    return len(books)
+
+
+def create_notifications(prefix, follows, recipe_rows, read_fraction, rng):
+    """Notify users of follows, reviews and derivations, as views do."""
+    owners = dict((pk, author) for pk, author, _ in recipe_rows)
+    notes = [(followed, 'follow', follower) for follower, followed in follows]
+    notes.extend(
+        (owners[origin], 'derive', pk)
+        for pk, _, origin in recipe_rows if origin
+    )
+    reviews = Review.objects.filter(
+        user__username__startswith=prefix + '_'
+    ).values_list('id', 'recipe__user_id')
+    notes.extend((owner, 'review', pk) for pk, owner in reviews)
+    Notification.objects.bulk_create(
+        (Notification(
+            user_id=user_id,
+            type=type,
+            object_key=key,
+            read=rng.random() < read_fraction
+        ) for user_id, type, key in notes),
+        batch_size=BATCH_SIZE
+    )
+    return len(notes)
@@ -0,0 +1,121 @@
+import json
+import random
+import time
+from functools import reduce
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.query import QuerySet
+from benchmark.data import TextGenerator, make_vocabulary
+from benchmark.runner import percentile
+from recipe.models import Recipe
+from recipe.search import get_backend, search_recipes
+
+
+def legacy_search(words):
+    """The search implementation this replaced: per-word title ILIKE."""
+    return reduce(
+        lambda o, w: o.filter(title__icontains=w),
+        words,
+        Recipe.objects.all()
+    )
+
+
+def time_page(results, per_page=10):
+    """Time what a search page does: count results and fetch page one."""
+    start = time.perf_counter()
+    if isinstance(results, QuerySet):
+        results.count()
+    else:
+        len(results)
+    list(results[:per_page])
+    return (time.perf_counter() - start) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark recipe search against synthetic recipes at several '
+        'table sizes. All inserted rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10000, 100000, 1000000],
+            help='Numbers of recipes to benchmark with.'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=50,
+            help='Number of queries to time at each size.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--skip-legacy',
+            action='store_true',
+            help='Do not time the previous title ILIKE search.'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        text = TextGenerator(make_vocabulary(5000, rng), rng)
+        results = []
+        for size in options['sizes']:
+            results.extend(self.benchmark(size, text, rng, options))
+        self.stdout.write(json.dumps(dict(
+            vendor=connection.vendor,
+            results=results
+        ), indent=2))
+
+    def benchmark(self, size, text, rng, options):
+        queries = [
+            ' '.join(text.word() for _ in range(rng.randint(1, 2)))
+            for _ in range(options['queries'])
+        ]
+        backend = get_backend()
+        results = []
+        with transaction.atomic():
+            user = User.objects.create(username='benchmark_search_user')
+            self.insert_recipes(user, size, text)
+            backend.reset()
+            start = time.perf_counter()
+            list(search_recipes(queries[0])[:1])
+            results.append(dict(
+                size=size,
+                engine='search_recipes',
+                warmup_ms=round((time.perf_counter() - start) * 1000, 2)
+            ))
+            engines = [('search_recipes', search_recipes)]
+            if not options['skip_legacy']:
+                engines.append(
+                    ('legacy_icontains', lambda q: legacy_search(q.split()))
+                )
+            for name, search in engines:
+                samples = [time_page(search(q)) for q in queries]
+                results.append(dict(
+                    size=size,
+                    engine=name,
+                    p50_ms=round(percentile(samples, 50), 2),
+                    p95_ms=round(percentile(samples, 95), 2),
+                ))
+            transaction.set_rollback(True)
+        backend.reset()
+        return results
+
+    def insert_recipes(self, user, size, text, batch_size=5000):
+        # Ids below the 9-digit public range cannot clash with real rows.
+        for start in range(1, size + 1, batch_size):
+            Recipe.objects.bulk_create(
+                Recipe(
+                    id=i,
+                    user=user,
+                    title=text.words(4),
+                    description=text.words(20),
+                    ingredients='\n'.join(text.words(2) for _ in range(6)),
+                    directions=text.words(10)
+                )
+                for i in range(start, min(start + batch_size, size + 1))
+            )
@@ -0,0 +1,90 @@
+import json
+import random
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from benchmark.data import TextGenerator, make_vocabulary
+from benchmark.runner import percentile
+from recipe.models import Recipe
+from recipebook.models import RecipeBook
+from shoppinglist.models import add_recipes_to_shopping_list
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark adding a whole recipe book to a shopping list. All '
+        'inserted rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=200,
+            help='Number of recipes in the book.'
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=10,
+            help='Ingredient lines per recipe.'
+        )
+        parser.add_argument(
+            '--vocabulary',
+            type=int,
+            default=300,
+            help='Number of distinct ingredient words.'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        text = TextGenerator(make_vocabulary(options['vocabulary'], rng), rng)
+        with transaction.atomic():
+            user = User.objects.create(username='benchmark_shopping_user')
+            book = self.create_book(user, text, options)
+            samples = []
+            for _ in range(options['repeat']):
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        items = add_recipes_to_shopping_list(
+                            user, book.recipes.all()
+                        )
+                        samples.append((time.perf_counter() - start) * 1000)
+                    transaction.set_rollback(True)
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(dict(
+            vendor=connection.vendor,
+            recipes=options['recipes'],
+            lines=options['recipes'] * options['ingredients'],
+            items=items,
+            queries=len(captured),
+            p50_ms=round(percentile(samples, 50), 2),
+            max_ms=round(max(samples), 2)
+        ), indent=2))
+
+    def create_book(self, user, text, options):
+        # Ids below the 9-digit public range cannot clash with real rows.
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                id=i,
+                user=user,
+                title=text.words(3),
+                description=text.words(10),
+                ingredients='\n'.join(
+                    text.ingredient() for _ in range(options['ingredients'])
+                ),
+                directions=text.words(10)
+            )
+            for i in range(1, options['recipes'] + 1)
+        )
+        book = RecipeBook.objects.create(id=1, user=user, title='benchmark')
+        book.recipes.through.objects.bulk_create(
+            book.recipes.through(recipebook_id=book.pk, recipe_id=recipe.pk)
+            for recipe in recipes
+        )
+        return book
@@ -0,0 +1,70 @@
+import json
+import random
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from benchmark.data import generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic dataset of users, follows, recipes with '
+        'derivation chains, reviews, recipe books and notifications.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument(
+            '--books',
+            type=int,
+            default=3,
+            help='Average number of recipe books per user.'
+        )
+        parser.add_argument(
+            '--book-size',
+            type=int,
+            default=20,
+            help='Average number of recipes per recipe book.'
+        )
+        parser.add_argument(
+            '--follow-exponent',
+            type=float,
+            default=1.2,
+            help='Power-law exponent of user popularity.'
+        )
+        parser.add_argument(
+            '--derive-probability',
+            type=float,
+            default=0.2,
+            help='Chance that a recipe is derived from another.'
+        )
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help='Usernames are "<prefix>_<n>".'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix + '_').exists():
+            raise CommandError(
+                'Users named "{}_..." already exist; choose another '
+                '--prefix.'.format(prefix)
+            )
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Need at least 2 users and 1 recipe.')
+        counts = generate_dataset(
+            random.Random(options['seed']),
+            prefix=prefix,
+            users=options['users'],
+            recipes=options['recipes'],
+            reviews=options['reviews'],
+            books=options['books'],
+            book_size=options['book_size'],
+            follow_exponent=options['follow_exponent'],
+            derive_probability=options['derive_probability'],
+            stdout=self.stderr
+        )
+        self.stdout.write(json.dumps(counts, indent=2, sort_keys=True))
@@ -0,0 +1,89 @@
+import json
+import subprocess
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from benchmark.runner import (
+    EXCLUDED, build_scenarios, run_scenario, uncovered_url_names
+)
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every page through the test client and report latency '
+        'percentiles and query counts as JSON. Run against a database '
+        'filled by generate_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            default='bench_0',
+            help='User to view the site as.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Timed requests per page.'
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Only benchmark these URL names.'
+        )
+        parser.add_argument('--output', help='Write the JSON to this file.')
+
+    def handle(self, *args, **options):
+        viewer = User.objects.filter(username=options['username']).first()
+        if viewer is None:
+            raise CommandError(
+                'Unknown user {}; run generate_data first.'.format(
+                    options['username']
+                )
+            )
+        try:
+            scenarios = build_scenarios(viewer)
+        except ValueError as e:
+            raise CommandError(str(e))
+        uncovered = uncovered_url_names(scenarios)
+        for name in uncovered:
+            self.stderr.write('No benchmark for URL {}'.format(name))
+        if options['only']:
+            scenarios = [
+                s for s in scenarios if s.url_name in options['only']
+            ]
+        results = []
+        # Budgets are for tests; benchmarks measure whatever happens.
+        with override_settings(QUERY_BUDGET_RAISE=False):
+            for scenario in scenarios:
+                self.stderr.write(scenario.name)
+                results.append(
+                    run_scenario(scenario, viewer, options['repeat'])
+                )
+        report = json.dumps(dict(
+            commit=current_commit(),
+            vendor=connection.vendor,
+            viewer=viewer.username,
+            results=results,
+            excluded=EXCLUDED,
+            uncovered=uncovered,
+        ), indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
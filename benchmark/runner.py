@@ -0,0 +1,214 @@
+"""Drive every view of the site through the test client and time it."""
+import time
+from collections import namedtuple
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.urls.resolvers import RegexURLResolver
+from recipe.models import Recipe
+from recipe.search import get_words
+
+
+Scenario = namedtuple(
+    'Scenario',
+    'name url_name method path data login mutates'
+)
+
+# URL names deliberately not benchmarked.
+EXCLUDED = {
+    'notification_stream_view': 'long-lived event stream',
+}
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def project_url_names():
+    """Return the names of URLs defined by this project's urls modules.
+
+    Third-party URLs, e.g. the admin and registration, are skipped."""
+    packages = set(
+        config.name.split('.')[0] for config in apps.get_app_configs()
+        if config.path.startswith(settings.BASE_DIR)
+    )
+    packages.add(settings.ROOT_URLCONF.split('.')[0])
+    names = set()
+
+    def collect(resolver):
+        module = resolver.urlconf_module
+        name = getattr(module, '__name__', '')
+        if name.split('.')[0] not in packages:
+            return
+        for pattern in resolver.url_patterns:
+            if isinstance(pattern, RegexURLResolver):
+                collect(pattern)
+            elif pattern.name:
+                names.add(pattern.name)
+    collect(get_resolver())
+    return names
+
+
+def build_scenarios(viewer):
+    """Return the requests to benchmark, viewing the site as `viewer`.
+
+    Pages for objects use the busiest example available: the most
+    reviewed recipe, the most derived recipe, the most followed user.
+    Edit and delete pages use the viewer's own objects."""
+    recipe = Recipe.objects.order_by('-review_count').first()
+    origin = Recipe.objects.order_by('-derivation_count').first()
+    popular = User.objects.order_by('-profile__follower_count').first()
+    own_recipe = viewer.recipes.first()
+    own_book = viewer.recipebooks.annotate(
+        size=Count('recipes')
+    ).order_by('-size').first()
+    own_review = viewer.reviews.first()
+    if None in (recipe, origin, popular, own_recipe, own_book, own_review):
+        raise ValueError(
+            '{} needs recipes, recipe books and reviews to benchmark '
+            'with'.format(viewer.username)
+        )
+    query = ' '.join(get_words(recipe.title)[:2]) or recipe.title
+
+    def scenario(url_name, args=(), method='GET', data=None, login=True,
+                 mutates=False, query=''):
+        name = url_name if login else url_name + ' (anonymous)'
+        if method != 'GET':
+            name = '{} {}'.format(url_name, method)
+        path = reverse(url_name, args=args) + query
+        return Scenario(name, url_name, method, path, data or {}, login,
+                        mutates)
+
+    return [
+        scenario('home'),
+        scenario('home', login=False),
+        scenario('about', login=False),
+        scenario('view_recipe', [recipe.pk]),
+        scenario('view_recipe', [recipe.pk], login=False),
+        scenario('new_recipe'),
+        scenario('edit_recipe', [own_recipe.pk]),
+        scenario('delete_recipe', [own_recipe.pk]),
+        scenario('derive_recipe', [recipe.pk]),
+        scenario('derived_recipes', [origin.pk]),
+        scenario('recipe_lineage', [origin.pk]),
+        scenario('recipe_reviews', [recipe.pk]),
+        scenario('recipe_search', query='?q=' + query),
+        scenario('top_rated_recipes'),
+        scenario('trending_recipes', login=False),
+        scenario(
+            'recipe_update_recipebooks',
+            [recipe.pk],
+            method='POST',
+            data={'books': [own_book.pk]},
+            mutates=True
+        ),
+        scenario('new_recipebook'),
+        scenario(
+            'ajax_create_recipebook',
+            method='POST',
+            data={'title': 'benchmark', 'description': 'benchmark'},
+            mutates=True
+        ),
+        scenario('view_recipebook', [own_book.pk]),
+        scenario('edit_recipebook', [own_book.pk]),
+        scenario('delete_recipebook', [own_book.pk]),
+        scenario(
+            'new_review',
+            [recipe.pk],
+            method='POST',
+            data={'title': 'benchmark', 'body': 'benchmark', 'score': 4},
+            mutates=True
+        ),
+        scenario('delete_review', [own_review.pk]),
+        scenario('view_notifications'),
+        scenario('notification_count_view'),
+        scenario('view_shopping_list'),
+        scenario(
+            'add_recipe_to_shopping_list',
+            [recipe.pk],
+            method='POST',
+            mutates=True
+        ),
+        scenario(
+            'add_recipebook_to_shopping_list',
+            [own_book.pk],
+            method='POST',
+            mutates=True
+        ),
+        scenario('profile', [popular.username]),
+        scenario('profile', [popular.username], login=False),
+        scenario('following_list', [viewer.username]),
+        scenario('followers_list', [popular.username]),
+        scenario('profile_recipebooks', [viewer.username]),
+        scenario('edit_profile'),
+        scenario('export_recipes'),
+        scenario(
+            'follow',
+            [popular.username],
+            method='POST',
+            data={'follow': 'follow'},
+            mutates=True
+        ),
+    ]
+
+
+def uncovered_url_names(scenarios):
+    """Return project URL names with no scenario and no exclusion."""
+    covered = set(s.url_name for s in scenarios)
+    return sorted(project_url_names() - covered - set(EXCLUDED))
+
+
+def timed_request(client, scenario):
+    """Return a scenario's response, its latency and query count."""
+    with CaptureQueriesContext(connection) as captured:
+        start = time.perf_counter()
+        if scenario.method == 'GET':
+            response = client.get(scenario.path)
+        else:
+            response = client.post(scenario.path, scenario.data)
+        if response.streaming:
+            # Streamed bodies are produced as they are read.
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - start) * 1000
+    return response, elapsed, len(captured)
+
+
+def run_scenario(scenario, viewer, repeat=20, warmup=1):
+    """Time `repeat` requests for a scenario.
+
+    Requests that change data run in a transaction that is rolled back,
+    so every repetition sees the same database."""
+    client = Client(HTTP_HOST='localhost')
+    if scenario.login:
+        client.force_login(viewer)
+    latencies = []
+    queries = []
+    for i in range(warmup + repeat):
+        if scenario.mutates:
+            with transaction.atomic():
+                response, elapsed, count = timed_request(client, scenario)
+                transaction.set_rollback(True)
+        else:
+            response, elapsed, count = timed_request(client, scenario)
+        if i >= warmup:
+            latencies.append(elapsed)
+            queries.append(count)
+    return dict(
+        name=scenario.name,
+        url_name=scenario.url_name,
+        method=scenario.method,
+        path=scenario.path,
+        status=response.status_code,
+        requests=repeat,
+        p50_ms=round(percentile(latencies, 50), 2),
+        p95_ms=round(percentile(latencies, 95), 2),
+        queries=percentile(queries, 50),
+        max_queries=max(queries),
+    )
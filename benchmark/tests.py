@@ -0,0 +1,94 @@
+import json
+import random
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from notification.models import Notification
+from recipe.lineage import rebuild_lineages
+from recipe.models import Recipe
+from review.models import Review
+from .data import generate_dataset
+from .runner import build_scenarios, uncovered_url_names
+
+
+class GenerateDataTests(TestCase):
+    """Tests for the synthetic dataset."""
+
+    def setUp(self):
+        self.counts = generate_dataset(
+            random.Random(1),
+            users=30,
+            recipes=100,
+            reviews=150,
+            books=2,
+            book_size=5
+        )
+
+    def test_counts(self):
+        """The requested rows are created."""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Recipe.objects.count(), 100)
+        self.assertEqual(Review.objects.count(), self.counts['reviews'])
+        self.assertEqual(
+            Notification.objects.count(),
+            self.counts['notifications']
+        )
+
+    def test_derivation_chains(self):
+        """Some derived recipes are derived from derived recipes."""
+        self.assertTrue(Recipe.objects.filter(
+            origin_recipe__origin_recipe__isnull=False
+        ).exists())
+
+    def test_lineages(self):
+        """Lineages and derivation counts match the origin links."""
+        self.assertEqual(rebuild_lineages(Recipe.objects.all()), 0)
+
+    def test_rating_aggregates(self):
+        """Aggregates match the bulk-inserted reviews."""
+        for recipe in Recipe.objects.filter(review_count__gt=0)[:10]:
+            self.assertEqual(recipe.review_count, recipe.reviews.count())
+
+    def test_feeds_built(self):
+        """The heaviest user has a feed."""
+        viewer = User.objects.get(username='bench_0')
+        self.assertTrue(viewer.feed_entries.exists())
+
+
+# Over-budget pages are logged; budgets are checked by the view tests.
+@override_settings(QUERY_BUDGETS={})
+class RunBenchmarksTests(TestCase):
+    """Tests for the benchmark runner."""
+
+    def setUp(self):
+        generate_dataset(
+            random.Random(2),
+            users=20,
+            recipes=60,
+            reviews=80,
+            books=2,
+            book_size=5
+        )
+
+    def test_every_url_covered(self):
+        """Every project URL has a benchmark or a reason to skip it."""
+        viewer = User.objects.get(username='bench_0')
+        self.assertEqual(uncovered_url_names(build_scenarios(viewer)), [])
+
+    def test_report(self):
+        """Each page is reported with latencies and query counts."""
+        out = StringIO()
+        call_command(
+            'run_benchmarks',
+            repeat=2,
+            stdout=out,
+            stderr=StringIO()
+        )
+        report = json.loads(out.getvalue())
+        results = dict((r['name'], r) for r in report['results'])
+        self.assertIn('view_recipe (anonymous)', results)
+        self.assertGreater(results['home']['queries'], 0)
+        for result in report['results']:
+            self.assertLess(result['status'], 400, result['name'])
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
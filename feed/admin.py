@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import FeedEntry
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    pass
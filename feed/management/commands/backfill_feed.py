@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from feed.models import rebuild_feed
+
+
+class Command(BaseCommand):
+    help = 'Rebuild home page feeds from follows and existing recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames',
+            nargs='*',
+            help='Only rebuild the feeds of these users.'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(
+                users.values_list('username', flat=True)
+            )
+            if missing:
+                raise CommandError(
+                    'Unknown users: {}'.format(', '.join(sorted(missing)))
+                )
+        count = 0
+        for user in users.iterator():
+            with transaction.atomic():
+                rebuild_feed(user)
+            count += 1
+        self.stdout.write('Rebuilt {} feeds.'.format(count))
@@ -0,0 +1,119 @@
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from recipe.models import Recipe
+from user_profile.models import Follow
+
+
+class FeedEntry(models.Model):
+    """A recipe shown on a user's home page.
+
+    Entries are written when a recipe is created or a follow changes,
+    so reading the home page is a single indexed, pre-sorted query."""
+
+    user = models.ForeignKey(
+        User,
+        related_name='feed_entries',
+        on_delete=models.deletion.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_entries',
+        on_delete=models.deletion.CASCADE
+    )
+    date_created = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'recipe')
+        index_together = [('user', 'date_created')]
+
+    def __str__(self):
+        return '{} ({})'.format(self.recipe_id, self.user_id)
+
+
+def get_feed(user):
+    """Return the recipes on a user's home page, newest first."""
+    return Recipe.objects.filter(
+        feed_entries__user=user
+    ).order_by('-feed_entries__date_created')
+
+
+def create_entries(user_ids, recipes):
+    """Insert feed entries for every user in `user_ids` and recipe.
+
+    `recipes` is an iterable of (id, date_created) pairs."""
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=pk, date_created=date)
+            for user_id in user_ids
+            for pk, date in recipes
+        ),
+        batch_size=500
+    )
+
+
+def get_audience(user_id):
+    """Return ids of users whose feed shows recipes by `user_id`."""
+    followers = Follow.objects.filter(
+        followed=user_id
+    ).values_list('follower_id', flat=True)
+    return set(followers) | {user_id}
+
+
+def fan_out(recipe):
+    """Add a new recipe to its author's and followers' feeds."""
+    create_entries(
+        get_audience(recipe.user_id),
+        [(recipe.id, recipe.date_created)]
+    )
+
+
+def add_followed(user_id, followed_ids):
+    """Add the recipes of newly followed users to a user's feed."""
+    recipes = Recipe.objects.filter(
+        user_id__in=followed_ids
+    ).exclude(
+        feed_entries__user=user_id
+    ).values_list('id', 'date_created')
+    create_entries([user_id], recipes)
+
+
+def remove_followed(user_id, unfollowed_ids):
+    """Remove the recipes of unfollowed users from a user's feed."""
+    FeedEntry.objects.filter(
+        user=user_id,
+        recipe__user_id__in=unfollowed_ids
+    ).exclude(
+        recipe__user=user_id
+    ).delete()
+
+
+def rebuild_feed(user):
+    """Recompute a user's feed from their follows and own recipes."""
+    FeedEntry.objects.filter(user=user).delete()
+    authors = set(Follow.objects.filter(
+        follower=user
+    ).values_list('followed_id', flat=True))
+    authors.add(user.id)
+    recipes = Recipe.objects.filter(
+        user_id__in=authors
+    ).values_list('id', 'date_created')
+    create_entries([user.id], recipes)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_followed_recipes(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_followed(instance.follower_id, [instance.followed_id])
+
+
+@receiver(post_delete, sender=Follow)
+def remove_followed_recipes(sender, instance, **kwargs):
+    remove_followed(instance.follower_id, [instance.followed_id])
@@ -0,0 +1,146 @@
+from io import StringIO
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from recipe.models import Recipe
+from user_profile.models import Follow, follow, unfollow
+from .models import FeedEntry, get_feed, rebuild_feed
+
+
+def create_recipe(user, title='recipe'):
+    recipe = Recipe(
+        user=user,
+        title=title,
+        description='a recipe',
+        ingredients='food',
+        directions='make it'
+    )
+    recipe.save()
+    return recipe
+
+
+class FeedTestCase(TestCase):
+    def setUp(self):
+        self.user = User(username='reader')
+        self.user.save()
+        self.author = User(username='author')
+        self.author.save()
+        self.other = User(username='other')
+        self.other.save()
+
+
+class FanOutTests(FeedTestCase):
+    """Test feed entries are written as recipes are created."""
+
+    def test_own_recipe_in_feed(self):
+        recipe = create_recipe(self.user)
+        self.assertEqual(list(get_feed(self.user)), [recipe])
+
+    def test_followed_recipe_in_feed(self):
+        follow(self.user, self.author)
+        recipe = create_recipe(self.author)
+        self.assertIn(recipe, get_feed(self.user))
+
+    def test_unfollowed_recipe_not_in_feed(self):
+        create_recipe(self.other)
+        self.assertFalse(get_feed(self.user).exists())
+
+    def test_feed_newest_first(self):
+        follow(self.user, self.author)
+        recipes = [create_recipe(self.author, str(i)) for i in range(3)]
+        self.assertEqual(list(get_feed(self.user)), recipes[::-1])
+
+    def test_deleted_recipe_leaves_feed(self):
+        recipe = create_recipe(self.user)
+        recipe.delete()
+        self.assertFalse(FeedEntry.objects.exists())
+
+
+class FollowFeedTests(FeedTestCase):
+    """Test feeds follow changes to follow edges."""
+
+    def test_follow_adds_existing_recipes(self):
+        recipe = create_recipe(self.author)
+        follow(self.user, self.author)
+        self.assertIn(recipe, get_feed(self.user))
+
+    def test_unfollow_removes_recipes(self):
+        follow(self.user, self.author)
+        create_recipe(self.author)
+        own = create_recipe(self.user)
+        unfollow(self.user, self.author)
+        self.assertEqual(list(get_feed(self.user)), [own])
+
+    def test_follow_view_updates_feed(self):
+        recipe = create_recipe(self.author)
+        self.client.force_login(self.user)
+        url = reverse('follow', args=[self.author.username])
+        self.client.post(url, dict(follow='follow'))
+        self.assertIn(recipe, get_feed(self.user))
+        self.client.post(url, dict(follow='unfollow'))
+        self.assertNotIn(recipe, get_feed(self.user))
+
+    def test_edge_created_directly_updates_feed(self):
+        recipe = create_recipe(self.author)
+        Follow.objects.create(follower=self.user, followed=self.author)
+        self.assertIn(recipe, get_feed(self.user))
+
+    def test_clear_follows(self):
+        follow(self.user, self.author)
+        create_recipe(self.author)
+        Follow.objects.filter(follower=self.user).delete()
+        self.assertFalse(get_feed(self.user).exists())
+
+
+class RebuildFeedTests(FeedTestCase):
+    """Test rebuilding feeds from scratch."""
+
+    def setUp(self):
+        super(RebuildFeedTests, self).setUp()
+        follow(self.user, self.author)
+        self.recipes = [create_recipe(self.author), create_recipe(self.user)]
+        FeedEntry.objects.all().delete()
+
+    def test_rebuild_feed(self):
+        rebuild_feed(self.user)
+        self.assertEqual(set(get_feed(self.user)), set(self.recipes))
+
+    def test_rebuild_is_idempotent(self):
+        rebuild_feed(self.user)
+        rebuild_feed(self.user)
+        self.assertEqual(get_feed(self.user).count(), 2)
+
+    def test_backfill_command(self):
+        call_command('backfill_feed', stdout=StringIO())
+        self.assertEqual(get_feed(self.user).count(), 2)
+        self.assertEqual(get_feed(self.author).count(), 1)
+
+    def test_backfill_single_user(self):
+        call_command('backfill_feed', self.author.username, stdout=StringIO())
+        self.assertEqual(get_feed(self.author).count(), 1)
+        self.assertFalse(get_feed(self.user).exists())
+
+
+class HomePageQueryTests(FeedTestCase):
+    """Test the home page reads the feed in constant queries."""
+
+    def count_home_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('home'))
+        return len(queries)
+
+    def test_home_page_queries_independent_of_follows(self):
+        self.client.force_login(self.user)
+        follow(self.user, self.author)
+        for i in range(10):
+            create_recipe(self.author)
+        expected = self.count_home_queries()
+        for i in range(20):
+            followed = User(username='followed{}'.format(i))
+            followed.save()
+            create_recipe(followed)
+            follow(self.user, followed)
+        self.assertEqual(self.count_home_queries(), expected)
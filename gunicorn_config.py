@@ -0,0 +1,12 @@
+# Gunicorn settings. Notification streams hold their connection open, so
+# requests are served by gevent greenlets rather than one sync worker
+# each.
+
+worker_class = 'gevent'
+
+worker_connections = 1000
+
+
+def post_fork(server, worker):
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
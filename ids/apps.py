@@ -0,0 +1,5 @@
+from django.apps import AppConfig
+
+
+class IdsConfig(AppConfig):
+    name = 'ids'
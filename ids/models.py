@@ -0,0 +1,82 @@
+import re
+from random import SystemRandom
+from django.db import connection, migrations, models, transaction
+from django.db.models import F
+
+
+NAME_RE = re.compile(r'^[a-z][a-z0-9_]*$')
+
+
+class IdSequence(models.Model):
+    """Counter and scrambling key of one id allocator."""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    key = models.BigIntegerField()
+    # Unused on PostgreSQL, which counts with a database sequence.
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+    def sequence_name(self):
+        return 'ids_sequence_{}'.format(self.name)
+
+
+def get_sequence(name):
+    """Return the IdSequence called `name`, creating it if needed."""
+    if not NAME_RE.match(name):
+        raise ValueError('Invalid id sequence name {!r}'.format(name))
+    sequence, _ = IdSequence.objects.get_or_create(
+        name=name,
+        defaults=dict(key=SystemRandom().getrandbits(62))
+    )
+    return sequence
+
+
+def reserve_counters(sequence, count):
+    """Return `count` counter values no other caller will ever get.
+
+    On PostgreSQL these come from a database sequence, created by the
+    migration that adds the allocator (see `create_sequence`). Sequences
+    are never rolled back, so values stay reserved even if the caller's
+    transaction fails. Elsewhere the row's counter is advanced with an
+    UPDATE."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(%s) - 1 FROM generate_series(1, %s)',
+                [sequence.sequence_name(), count]
+            )
+            return [row[0] for row in cursor.fetchall()]
+    with transaction.atomic():
+        rows = IdSequence.objects.filter(name=sequence.name)
+        if not rows.update(next_value=F('next_value') + count):
+            # The row was rolled back since it was read; start again.
+            get_sequence(sequence.name)
+            rows.update(next_value=F('next_value') + count)
+        end = rows.values_list('next_value', flat=True).get()
+    return list(range(end - count, end))
+
+
+def create_sequence(name):
+    """Return a migration operation creating the id sequence `name`."""
+    def forward(apps, schema_editor):
+        IdSequence = apps.get_model('ids', 'IdSequence')
+        IdSequence.objects.get_or_create(
+            name=name,
+            defaults=dict(key=SystemRandom().getrandbits(62))
+        )
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(
+                'CREATE SEQUENCE IF NOT EXISTS ids_sequence_{}'.format(name)
+            )
+
+    def backward(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(
+                'DROP SEQUENCE IF EXISTS ids_sequence_{}'.format(name)
+            )
+        apps.get_model('ids', 'IdSequence').objects.filter(
+            name=name
+        ).delete()
+    return migrations.RunPython(forward, backward)
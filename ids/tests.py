@@ -0,0 +1,127 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from recipe.models import Recipe
+from recipebook.models import RecipeBook
+from .allocator import (
+    ID_MAX, ID_MIN, IdAllocator, round_keys, scramble
+)
+from .models import IdSequence
+
+
+class ScrambleTests(TestCase):
+    """Tests for the counter to id permutation."""
+
+    def test_unique_and_in_range(self):
+        keys = round_keys(12345)
+        ids = [scramble(counter, keys) for counter in range(20000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(ID_MIN <= pk <= ID_MAX for pk in ids))
+
+    def test_not_sequential(self):
+        """Consecutive counters give unrelated ids."""
+        keys = round_keys(12345)
+        self.assertGreater(
+            abs(scramble(1, keys) - scramble(0, keys)),
+            1000
+        )
+
+    def test_depends_on_key(self):
+        self.assertNotEqual(
+            scramble(0, round_keys(1)),
+            scramble(0, round_keys(2))
+        )
+
+    def test_exhausted(self):
+        with self.assertRaises(OverflowError):
+            scramble(ID_MAX - ID_MIN + 1, round_keys(1))
+
+
+class IdAllocatorTests(TestCase):
+    """Tests for block-reserved id allocation."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.allocator = IdAllocator(
+            'test_recipe',
+            'recipe.Recipe',
+            block_size=10
+        )
+
+    def create_recipe(self, pk):
+        return Recipe.objects.create(
+            id=pk,
+            user=self.user,
+            title='title',
+            description='description',
+            ingredients='ingredients',
+            directions='directions'
+        )
+
+    def test_unique(self):
+        ids = self.allocator.allocate_many(25)
+        ids.extend(self.allocator.allocate() for _ in range(25))
+        self.assertEqual(len(set(ids)), 50)
+        self.assertEqual(
+            IdSequence.objects.get(name='test_recipe').next_value,
+            55
+        )
+
+    def test_no_queries_within_block(self):
+        self.allocator.allocate()
+        with self.assertNumQueries(0):
+            for _ in range(9):
+                self.allocator.allocate()
+
+    def test_one_reservation_and_check_per_block(self):
+        self.allocator.allocate()
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(10):
+                self.allocator.allocate()
+        checks = [
+            q for q in queries.captured_queries
+            if 'recipe_recipe' in q['sql']
+        ]
+        self.assertEqual(len(checks), 1)
+
+    def test_skips_existing_ids(self):
+        """Ids already used, e.g. by the old random allocator, are skipped."""
+        self.allocator.allocate()
+        keys = self.allocator.keys
+        self.allocator.pending.clear()
+        taken = scramble(10, keys)
+        self.create_recipe(taken)
+        ids = self.allocator.allocate_many(10)
+        self.assertNotIn(taken, ids)
+        self.assertEqual(ids[0], scramble(11, keys))
+
+
+class ModelIdTests(TestCase):
+    """Tests for allocated ids on recipes and recipe books."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+
+    def test_recipe_saved_with_single_insert(self):
+        recipe = Recipe(
+            user=self.user,
+            title='title',
+            description='description',
+            ingredients='ingredients',
+            directions='directions'
+        )
+        recipe.save()
+        self.assertTrue(ID_MIN <= recipe.pk <= ID_MAX)
+        recipe.title = 'changed'
+        recipe.save()
+        self.assertEqual(Recipe.objects.get(pk=recipe.pk).title, 'changed')
+
+    def test_recipebook_ids_from_own_sequence(self):
+        book = RecipeBook.objects.create(
+            user=self.user,
+            title='title',
+            description='description'
+        )
+        self.assertTrue(ID_MIN <= book.pk <= ID_MAX)
+        self.assertTrue(IdSequence.objects.filter(name='recipebook').exists())
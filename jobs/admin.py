@@ -0,0 +1,8 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'run_at', 'attempts', 'failed')
+    list_filter = ('failed', 'name')
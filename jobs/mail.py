@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from .models import enqueue, register_job
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Send email from a job, through `JOBS_EMAIL_BACKEND`.
+
+    Attachments are not supported."""
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            enqueue(
+                send_email,
+                subject=message.subject,
+                body=message.body,
+                from_email=message.from_email,
+                to=message.to,
+                cc=message.cc,
+                bcc=message.bcc,
+                reply_to=message.reply_to,
+                headers=message.extra_headers,
+                alternatives=getattr(message, 'alternatives', [])
+            )
+        return len(email_messages)
+
+
+@register_job
+def send_email(alternatives, **kwargs):
+    message = EmailMultiAlternatives(**kwargs)
+    for content, mimetype in alternatives:
+        message.attach_alternative(content, mimetype)
+    get_connection(settings.JOBS_EMAIL_BACKEND).send_messages([message])
@@ -0,0 +1,79 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+from jobs.models import logger, run_due_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs as they fall due.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of jobs to run at once, each in its own thread.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between checks for due jobs.'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no jobs are due.'
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        counts = []
+
+        def work():
+            count = 0
+            try:
+                while not stop.is_set():
+                    try:
+                        ran = run_due_jobs(limit=1)
+                    except DatabaseError:
+                        # E.g. SQLite busy with another thread's write;
+                        # a job claimed is claimed again once its lock
+                        # expires.
+                        logger.exception('Could not claim or finish a job')
+                        stop.wait(options['interval'])
+                        continue
+                    count += ran
+                    if not ran:
+                        if options['burst']:
+                            break
+                        stop.wait(options['interval'])
+            finally:
+                counts.append(count)
+
+        def work_in_thread():
+            try:
+                work()
+            finally:
+                # Each thread opened its own connections.
+                connections.close_all()
+
+        threads = []
+        try:
+            if options['concurrency'] == 1:
+                work()
+            else:
+                threads.extend(
+                    threading.Thread(target=work_in_thread)
+                    for _ in range(options['concurrency'])
+                )
+                for thread in threads:
+                    thread.start()
+                while any(thread.is_alive() for thread in threads):
+                    time.sleep(0.1)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write('Ran {} jobs.'.format(sum(counts)))
@@ -0,0 +1,158 @@
+"""Background jobs queued in the database and run by `runworker`.
+
+Jobs are functions registered with `register_job`, enqueued with
+keyword arguments that serialize to JSON. A job enqueued in a
+transaction is committed, or rolled back, with it. With `JOBS_EAGER`,
+as in development, jobs run as soon as they are enqueued instead.
+
+A worker claims a job by locking it for `JOBS_LEASE_SECONDS`, and
+deletes it once it succeeds; jobs of a worker that died are claimed
+again when their lock expires. A failed job is retried after
+`JOBS_RETRY_DELAY` seconds, doubling with each attempt, until it has
+been tried `JOBS_MAX_ATTEMPTS` times, when it is kept, marked failed.
+
+On PostgreSQL, jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED,
+so workers never wait on each other's claims. Elsewhere, e.g. SQLite, a
+job is claimed with an UPDATE conditional on its attempt count, which
+only one of the workers racing for it can make.
+"""
+import json
+import logging
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+logger = logging.getLogger('jobs')
+
+JOBS = {}
+
+
+def job_name(func):
+    return '{}.{}'.format(func.__module__, func.__name__)
+
+
+def register_job(func):
+    """Register a function to be run by workers."""
+    JOBS[job_name(func)] = func
+    return func
+
+
+class Job(models.Model):
+    """A call of a registered function, waiting to be run."""
+
+    name = models.CharField(max_length=200)
+    kwargs = models.TextField()
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    failed = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        index_together = [('failed', 'run_at')]
+
+    def __str__(self):
+        return '{} ({})'.format(self.name, self.pk)
+
+
+def enqueue(func, **kwargs):
+    """Run a registered function in the background.
+
+    Returns the job, or None if it was run already."""
+    name = job_name(func)
+    if name not in JOBS:
+        raise ValueError('{} is not a registered job'.format(name))
+    payload = json.dumps(kwargs, sort_keys=True)
+    if settings.JOBS_EAGER:
+        # Given what a worker would be.
+        func(**json.loads(payload))
+        return None
+    return Job.objects.create(name=name, kwargs=payload)
+
+
+def due_jobs(now):
+    return Job.objects.filter(failed=False, run_at__lte=now).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ).order_by('run_at', 'pk')
+
+
+def claim_jobs(limit=1):
+    """Lock up to `limit` due jobs for this worker and return them."""
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+    db = router.db_for_write(Job)
+    if connections[db].vendor == 'postgresql':
+        with transaction.atomic(using=db):
+            query = due_jobs(now).values_list('pk')[:limit].query
+            sql, params = query.sql_with_params()
+            with connections[db].cursor() as cursor:
+                cursor.execute(sql + ' FOR UPDATE SKIP LOCKED', params)
+                ids = [row[0] for row in cursor.fetchall()]
+            Job.objects.filter(pk__in=ids).update(
+                locked_until=lease,
+                attempts=F('attempts') + 1
+            )
+        return list(Job.objects.using(db).filter(pk__in=ids))
+    claimed = []
+    for job in due_jobs(now).using(db)[:limit * 2]:
+        # Every claim counts an attempt, so this matches no row if
+        # another worker claimed the job since it was read.
+        if Job.objects.filter(pk=job.pk, attempts=job.attempts).update(
+                locked_until=lease, attempts=job.attempts + 1):
+            job.locked_until = lease
+            job.attempts += 1
+            claimed.append(job)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def retry_delay(attempts):
+    return timedelta(
+        seconds=settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1)
+    )
+
+
+def run_job(job):
+    """Run a claimed job, deleting it or scheduling its retry.
+
+    Returns whether it succeeded."""
+    try:
+        func = JOBS.get(job.name)
+        if func is None:
+            raise LookupError('{} is not a registered job'.format(job.name))
+        with transaction.atomic():
+            func(**json.loads(job.kwargs))
+    except Exception:
+        error = traceback.format_exc()
+        failed = job.attempts >= settings.JOBS_MAX_ATTEMPTS
+        logger.warning('Job %s failed on attempt %s%s:\n%s',
+                       job, job.attempts, ', giving up' if failed else '',
+                       error)
+        Job.objects.filter(pk=job.pk).update(
+            run_at=timezone.now() + retry_delay(job.attempts),
+            locked_until=None,
+            failed=failed,
+            last_error=error
+        )
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def run_due_jobs(limit=None):
+    """Claim and run due jobs one at a time until none are left, or
+    `limit` have run. Returns the number run."""
+    count = 0
+    while limit is None or count < limit:
+        jobs = claim_jobs()
+        if not jobs:
+            break
+        run_job(jobs[0])
+        count += 1
+    return count
@@ -0,0 +1,155 @@
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from notification.models import Notification
+from .models import Job, claim_jobs, enqueue, register_job, run_due_jobs
+
+
+CALLS = []
+
+
+@register_job
+def record(value):
+    CALLS.append(value)
+
+
+@register_job
+def fail():
+    raise RuntimeError('failed')
+
+
+def unregistered():
+    pass
+
+
+@override_settings(
+    JOBS_EAGER=False,
+    JOBS_RETRY_DELAY=10,
+    JOBS_MAX_ATTEMPTS=2,
+    JOBS_LEASE_SECONDS=60
+)
+class JobQueueTests(TestCase):
+    """Test jobs are queued, claimed, run and retried."""
+
+    def setUp(self):
+        del CALLS[:]
+
+    def test_enqueue_and_run(self):
+        enqueue(record, value=[1, 2])
+        self.assertEqual(CALLS, [])
+        self.assertEqual(run_due_jobs(), 1)
+        self.assertEqual(CALLS, [[1, 2]])
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager(self):
+        self.assertIsNone(enqueue(record, value='now'))
+        self.assertEqual(CALLS, ['now'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_unregistered(self):
+        with self.assertRaises(ValueError):
+            enqueue(unregistered)
+
+    def test_claimed_once(self):
+        enqueue(record, value=1)
+        self.assertEqual(len(claim_jobs()), 1)
+        self.assertEqual(claim_jobs(), [])
+
+    def test_expired_lock_reclaimed(self):
+        job = enqueue(record, value=1)
+        claim_jobs()
+        Job.objects.filter(pk=job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(claim_jobs()[0].attempts, 2)
+
+    def test_claim_order(self):
+        later = enqueue(record, value='later')
+        sooner = enqueue(record, value='sooner')
+        Job.objects.filter(pk=later.pk).update(
+            run_at=timezone.now() - timedelta(seconds=1)
+        )
+        Job.objects.filter(pk=sooner.pk).update(
+            run_at=timezone.now() - timedelta(seconds=2)
+        )
+        self.assertEqual(
+            [job.pk for job in claim_jobs(limit=2)],
+            [sooner.pk, later.pk]
+        )
+
+    def test_retried_with_backoff(self):
+        job = enqueue(fail)
+        before = timezone.now()
+        with self.assertLogs('jobs', 'WARNING'):
+            self.assertEqual(run_due_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertFalse(job.failed)
+        self.assertIn('RuntimeError', job.last_error)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=10))
+        # Not due yet.
+        self.assertEqual(run_due_jobs(), 0)
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('jobs', 'WARNING') as logs:
+            self.assertEqual(run_due_jobs(), 1)
+        self.assertIn('giving up', logs.output[0])
+        job.refresh_from_db()
+        self.assertTrue(job.failed)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=20))
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(run_due_jobs(), 0)
+
+    def test_runworker(self):
+        enqueue(record, value=1)
+        enqueue(record, value=2)
+        stdout = StringIO()
+        call_command('runworker', burst=True, stdout=stdout)
+        self.assertEqual(sorted(CALLS), [1, 2])
+        self.assertIn('Ran 2 jobs', stdout.getvalue())
+
+
+@override_settings(JOBS_EAGER=False)
+class DeferredWorkTests(TestCase):
+    """Test side effects of requests are left to workers."""
+
+    @override_settings(
+        EMAIL_BACKEND='jobs.mail.QueuedEmailBackend',
+        JOBS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+    )
+    def test_email(self):
+        message = mail.EmailMultiAlternatives(
+            'subject',
+            'body',
+            'from@example.com',
+            ['to@example.com']
+        )
+        message.attach_alternative('<p>body</p>', 'text/html')
+        message.send()
+        self.assertEqual(mail.outbox, [])
+        run_due_jobs()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['to@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+
+    def test_notification(self):
+        user = User(username='user')
+        user.save()
+        followed = User(username='followed')
+        followed.save()
+        self.client.force_login(user)
+        self.client.post(
+            reverse('follow', args=['followed']),
+            dict(follow='follow')
+        )
+        self.assertFalse(Notification.objects.exists())
+        run_due_jobs()
+        self.assertEqual(
+            Notification.objects.get().user,
+            followed
+        )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from notification.models import sweep_notifications
+
+
+class Command(BaseCommand):
+    help = 'Delete notifications about objects that no longer exist.'
+
+    def handle(self, *args, **options):
+        deleted = sweep_notifications()
+        self.stdout.write('Deleted {} notifications.'.format(deleted))
@@ -1,25 +1,47 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.template.loader import get_template
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from review.models import Review
 from recipe.models import Recipe
+from jobs.models import enqueue, register_job
+from utils.cache import CacheStats
 
 
 NOTIFICATION_TYPES = {}
 
+unread_count_stats = CacheStats('notification_unread_count')
+
 
 class NotificationType(object):
-    def __init__(self, model, template_name):
+    def __init__(self, type, model, template_name, related=()):
+        self.type = type
         self.template_name = template_name
         self.model = model
+        self.related = related
         self.template = get_template(self.template_name)
 
     def find(self, pk):
         return self.model.objects.filter(pk=pk).first()
 
+    def find_many(self, pks):
+        """Return a dict of pk to object, in one query."""
+        objects = self.model.objects.select_related(*self.related)
+        return objects.in_bulk(pks)
+
     def render(self, obj):
         return self.template.render(context={'object': obj})
 
+    def delete_notifications(self, sender, instance, **kwargs):
+        """Remove notifications about a deleted object."""
+        Notification.objects.filter(
+            type=self.type,
+            object_key=instance.pk
+        ).delete()
+
 
 class Notification(models.Model):
     user = models.ForeignKey(
@@ -32,9 +54,18 @@ class Notification(models.Model):
     read = models.BooleanField(default=False)
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        index_together = [
+            ('user', 'read'),
+            ('user', 'date'),
+            ('type', 'object_key'),
+        ]
+
     def get_object(self):
-        model = NOTIFICATION_TYPES[self.type].model
-        return model.objects.filter(id=self.object_key).first()
+        if not hasattr(self, '_object'):
+            model = NOTIFICATION_TYPES[self.type].model
+            self._object = model.objects.filter(id=self.object_key).first()
+        return self._object
 
     def __str__(self):
         return '{} ({})'.format(self.type, self.object_key)
@@ -46,12 +77,150 @@ class Notification(models.Model):
         return NOTIFICATION_TYPES[self.type].render(search)
 
 
-def define_notification_type(type, model, template_name):
-    NOTIFICATION_TYPES[type] = NotificationType(model, template_name)
+@register_job
+def create_notification(user_id, type, object_key):
+    # The user may have been deleted since.
+    if User.objects.filter(pk=user_id).exists():
+        Notification.objects.create(
+            user_id=user_id,
+            type=type,
+            object_key=object_key
+        )
+
+
+def notify(user_id, type, object_key):
+    """Notify a user about an object, in the background."""
+    enqueue(
+        create_notification,
+        user_id=user_id,
+        type=type,
+        object_key=object_key
+    )
+
+
+def resolve_notifications(notifications):
+    """Attach each notification's object, dropping dangling ones.
+
+    Objects are fetched with one query per notification type rather
+    than one per notification. Returns a list in the original order."""
+    notifications = list(notifications)
+    keys = {}
+    for note in notifications:
+        keys.setdefault(note.type, set()).add(note.object_key)
+    objects = dict(
+        (type, NOTIFICATION_TYPES[type].find_many(pks))
+        for type, pks in keys.items()
+        if type in NOTIFICATION_TYPES
+    )
+    resolved = []
+    for note in notifications:
+        obj = objects.get(note.type, {}).get(note.object_key)
+        if obj is not None:
+            note._object = obj
+            resolved.append(note)
+    return resolved
+
+
+def get_change_stamp(user_id):
+    """Return a token that changes whenever a user's unread count does:
+    the count itself, read from the database with the (user, read) index.
+
+    Unlike the cached count it is current whichever process, e.g. a job
+    worker, changed the user's notifications, whatever the cache."""
+    return Notification.objects.filter(user=user_id, read=False).count()
+
+
+def unread_count_key(user_id):
+    return 'notifications:unread:{}'.format(user_id)
+
+
+def get_unread_count(user_id):
+    """Return a user's unread notification count.
+
+    The count is cached and kept current as notifications are created,
+    read and deleted; on a miss it is counted from the database."""
+    key = unread_count_key(user_id)
+    count = cache.get(key)
+    if count is not None:
+        unread_count_stats.hit()
+        return count
+    unread_count_stats.miss()
+    count = Notification.objects.filter(user=user_id, read=False).count()
+    cache.add(key, count, settings.NOTIFICATION_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    """Adjust a cached unread count, if one is cached."""
+    try:
+        cache.incr(unread_count_key(user_id), delta)
+    except ValueError:
+        pass
+
+
+def forget_unread_count(user_id):
+    """Drop a cached unread count, so the next read counts it afresh."""
+    cache.delete(unread_count_key(user_id))
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created and not instance.read:
+        adjust_unread_count(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.read:
+        adjust_unread_count(instance.user_id, -1)
+
+
+@receiver(post_save, sender=User)
+def forget_new_user_unread_count(sender, instance, created, **kwargs):
+    """Drop any count cached for a reused user id."""
+    if created:
+        forget_unread_count(instance.id)
+
+
+def sweep_notifications():
+    """Delete notifications whose objects no longer exist.
+
+    Returns the number of notifications deleted."""
+    deleted = 0
+    for type, notification_type in NOTIFICATION_TYPES.items():
+        existing = notification_type.model.objects.values('pk')
+        count, _ = Notification.objects.filter(type=type).exclude(
+            object_key__in=existing
+        ).delete()
+        deleted += count
+    return deleted
+
+
+def define_notification_type(type, model, template_name, related=()):
+    notification_type = NotificationType(type, model, template_name, related)
+    NOTIFICATION_TYPES[type] = notification_type
+    post_delete.connect(
+        notification_type.delete_notifications,
+        sender=model,
+        weak=False,
+        dispatch_uid='notification_cleanup_{}'.format(type)
+    )
 
 
-define_notification_type('review', Review, 'notifications/review.html')
+define_notification_type(
+    'review',
+    Review,
+    'notifications/review.html',
+    related=('user', 'recipe')
+)
 
 define_notification_type('follow', User, 'notifications/follow.html')
 
-define_notification_type('derive', Recipe, 'notifications/derive.html')
+define_notification_type(
+    'derive',
+    Recipe,
+    'notifications/derive.html',
+    related=('user', 'origin_recipe')
+)
@@ -1,8 +1,17 @@
 import json
-from django.test import TestCase
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.urls import reverse
-from .models import Notification
+from .models import (
+    Notification,
+    resolve_notifications,
+    get_unread_count,
+    unread_count_stats,
+)
 from review.models import Review
 from recipe.models import Recipe
 
@@ -77,6 +86,7 @@ class NotificationCountView(NotificationTestCase):
         self.assertEqual(response.status_code, 403)
 
 
+@override_settings(JOBS_EAGER=True)
 class ReviewNotificationTests(NotificationTestCase):
     def setUp(self):
         """Set up a recipe and review."""
@@ -125,6 +135,7 @@ class ReviewNotificationTests(NotificationTestCase):
         self.assertEqual(reviewer.notifications.count(), 0)
 
 
+@override_settings(JOBS_EAGER=True)
 class FollowNotificationTests(NotificationTestCase):
     def setUp(self):
         """Set up two users."""
@@ -140,6 +151,7 @@ class FollowNotificationTests(NotificationTestCase):
         self.assertEqual(self.followed_user.notifications.count(), count + 1)
 
 
+@override_settings(JOBS_EAGER=True)
 class RecipeDerivationTests(NotificationTestCase):
     def setUp(self):
         """Set up two users."""
@@ -158,3 +170,201 @@ class RecipeDerivationTests(NotificationTestCase):
             origin_recipe=self.recipe.id,
         ))
         self.assertEqual(self.user.notifications.count(), count + 1)
+
+
+class NotificationResolutionTests(NotificationTestCase):
+    def add_review_notifications(self, amount):
+        for i in range(amount):
+            review = Review(
+                title='review {}'.format(i),
+                body='good',
+                user=self.user,
+                score=4,
+                recipe=self.recipe
+            )
+            review.save()
+            Notification(
+                user=self.user,
+                type='review',
+                object_key=review.id
+            ).save()
+
+    def test_resolve_attaches_objects(self):
+        notes = resolve_notifications(self.user.notifications.all())
+        self.assertEqual(notes[0].get_object(), self.review)
+
+    def test_resolve_drops_dangling(self):
+        Notification(user=self.user, type='review', object_key=0).save()
+        notes = resolve_notifications(self.user.notifications.all())
+        self.assertEqual(notes, [self.notification])
+
+    def test_resolve_queries_once_per_type(self):
+        self.add_review_notifications(10)
+        Notification(
+            user=self.user,
+            type='follow',
+            object_key=self.user.id
+        ).save()
+        with self.assertNumQueries(3):
+            notes = resolve_notifications(self.user.notifications.all())
+            for note in notes:
+                note.render()
+        self.assertEqual(len(notes), 12)
+
+    def test_notifications_view_queries_constant(self):
+        self.client.force_login(self.user)
+        url = reverse('view_notifications')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        self.add_review_notifications(10)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(many), len(few))
+
+    def test_deleting_object_deletes_notification(self):
+        self.review.delete()
+        self.assertFalse(self.user.notifications.exists())
+
+    def test_count_excludes_deleted_objects(self):
+        self.client.force_login(self.user)
+        self.review.delete()
+        response = self.client.get(reverse('notification_count_view'))
+        self.assertEqual(json.loads(response.content.decode())['count'], 0)
+
+    def test_sweep_notifications(self):
+        Notification(user=self.user, type='review', object_key=0).save()
+        Notification(user=self.user, type='derive', object_key=0).save()
+        call_command('sweep_notifications', stdout=StringIO())
+        self.assertEqual(list(self.user.notifications.all()),
+                         [self.notification])
+
+
+@override_settings(
+    NOTIFICATION_STREAM_TIMEOUT=0,
+    NOTIFICATION_STREAM_INTERVAL=0
+)
+class NotificationStreamTests(NotificationTestCase):
+    def get_events(self, **extra):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('notification_stream_view'),
+            **extra
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return ''.join(
+            chunk.decode() for chunk in response.streaming_content
+        )
+
+    def test_logged_out_disallowed(self):
+        response = self.client.get(reverse('notification_stream_view'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_stream_sends_count(self):
+        events = self.get_events()
+        self.assertIn('event: count\ndata: {"count": 1}', events)
+
+    def test_stream_checks_with_one_query(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('notification_stream_view'))
+        with self.assertNumQueries(1):
+            list(response.streaming_content)
+
+    def test_stream_sends_nothing_if_unchanged(self):
+        events = self.get_events(HTTP_LAST_EVENT_ID='1')
+        self.assertNotIn('event: count', events)
+
+    def test_new_notification_sends_count(self):
+        Notification(
+            user=self.user,
+            type='follow',
+            object_key=self.user.id
+        ).save()
+        events = self.get_events(HTTP_LAST_EVENT_ID='1')
+        self.assertIn('id: 2\nevent: count\ndata: {"count": 2}', events)
+
+    def test_uncached_change_sends_count(self):
+        """Changes made without the cache, e.g. by workers in other
+        processes, are seen."""
+        Notification.objects.filter(user=self.user).update(read=True)
+        events = self.get_events(HTTP_LAST_EVENT_ID='1')
+        self.assertIn('data: {"count": 0}', events)
+
+    def test_reading_notifications_sends_count(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('view_notifications'))
+        events = self.get_events(HTTP_LAST_EVENT_ID='1')
+        self.assertIn('data: {"count": 0}', events)
+
+
+class UnreadCountCacheTests(NotificationTestCase):
+    def add_notification(self):
+        note = Notification(
+            user=self.user,
+            type='follow',
+            object_key=self.user.id
+        )
+        note.save()
+        return note
+
+    def test_count_cached_after_first_read(self):
+        self.assertEqual(get_unread_count(self.user.id), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.id), 1)
+
+    def test_new_notification_increments_count(self):
+        get_unread_count(self.user.id)
+        self.add_notification()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.id), 2)
+
+    def test_deleted_notification_decrements_count(self):
+        get_unread_count(self.user.id)
+        self.add_notification().delete()
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+    def test_reading_notifications_resets_count(self):
+        get_unread_count(self.user.id)
+        self.client.force_login(self.user)
+        self.client.get(reverse('view_notifications'))
+        self.add_notification()
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+    def test_reading_notifications_forgets_count(self):
+        """Notifications created while others are marked read, e.g. by a
+        worker, are counted."""
+        get_unread_count(self.user.id)
+        self.client.force_login(self.user)
+        self.client.get(reverse('view_notifications'))
+        # Without signals, as if between the update and the view's end.
+        Notification.objects.bulk_create([Notification(
+            user=self.user,
+            type='follow',
+            object_key=self.user.id
+        )])
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+    def test_count_view_uses_cache(self):
+        self.client.force_login(self.user)
+        url = reverse('notification_count_view')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(any(
+            'notification_notification' in q['sql'] for q in queries
+        ))
+        self.assertEqual(json.loads(response.content.decode())['count'], 1)
+
+    def test_stats_record_hits_and_misses(self):
+        unread_count_stats.reset()
+        get_unread_count(self.user.id)
+        get_unread_count(self.user.id)
+        get_unread_count(self.user.id)
+        unread_count_stats.flush()
+        totals = unread_count_stats.totals()
+        self.assertEqual((totals['hits'], totals['misses']), (2, 1))
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn(
+            'notification_unread_count: 2 hits, 1 misses, hit rate 66.7%',
+            out.getvalue()
+        )
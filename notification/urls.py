@@ -1,7 +1,14 @@
 from django.conf.urls import url
-from .views import notifications_view, notification_count_view
+from .views import (
+    notifications_view,
+    notification_count_view,
+    notification_stream_view,
+)
 
 urlpatterns = [
     url(r'count$', notification_count_view, name='notification_count_view'),
+    url(r'stream$',
+        notification_stream_view,
+        name='notification_stream_view'),
     url(r'$', notifications_view, name='view_notifications'),
 ]
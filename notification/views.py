@@ -1,27 +1,84 @@
-from django.http import JsonResponse
+import json
+import time
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden
+from .models import (
+    resolve_notifications,
+    get_change_stamp,
+    get_unread_count,
+    forget_unread_count,
+)
 
 
 @login_required
 def notifications_view(request):
-    notifications = (
-        note
-        for note in request.user.notifications.order_by('-date')
-        if note.get_object()
+    notifications = resolve_notifications(
+        request.user.notifications.order_by('-date')
     )
     context = dict(notifications=notifications)
-    request.user.notifications.update(read=True)
+    request.user.notifications.filter(read=False).update(read=True)
+    # Rather than set to 0, which would lose notifications created since
+    # the update.
+    forget_unread_count(request.user.id)
     return render(request, 'notifications.html', context=context)
 
 
 def notification_count_view(request):
     if not request.user.is_authenticated():
         return HttpResponseForbidden()
-    count = sum(
-        1
-        for note in request.user.notifications.order_by('-date')
-        if note.get_object() and not note.read
+    return JsonResponse(dict(count=get_unread_count(request.user.id)))
+
+
+def format_event(count):
+    return 'id: {}\nevent: count\ndata: {}\n\n'.format(
+        count, json.dumps(dict(count=count))
+    )
+
+
+def notification_events(user, since):
+    """Yield server-sent events whenever the user's unread count changes.
+
+    The count is read with one indexed query every
+    NOTIFICATION_STREAM_INTERVAL seconds, on the connection the stream
+    keeps until it ends, so changes made by any process are seen with
+    any cache. The stream ends after NOTIFICATION_STREAM_TIMEOUT seconds
+    and the browser reconnects, sending the last count as its event id."""
+    interval = settings.NOTIFICATION_STREAM_INTERVAL
+    keepalive = settings.NOTIFICATION_STREAM_KEEPALIVE
+    deadline = time.time() + settings.NOTIFICATION_STREAM_TIMEOUT
+    keepalive_at = time.time() + keepalive
+    yield 'retry: {}\n\n'.format(settings.NOTIFICATION_STREAM_RETRY_MS)
+    while True:
+        count = get_change_stamp(user.id)
+        if str(count) != since:
+            since = str(count)
+            yield format_event(count)
+        if time.time() >= deadline:
+            return
+        if time.time() >= keepalive_at:
+            keepalive_at = time.time() + keepalive
+            yield ': keepalive\n\n'
+        time.sleep(interval)
+
+
+def notification_stream_view(request):
+    """Push unread notification counts as server-sent events.
+
+    Resumes from the `Last-Event-ID` header or `since` parameter, so a
+    reconnecting client only receives an event if something changed."""
+    if not request.user.is_authenticated():
+        return HttpResponseForbidden()
+    since = request.META.get(
+        'HTTP_LAST_EVENT_ID',
+        request.GET.get('since')
+    )
+    response = StreamingHttpResponse(
+        notification_events(request.user, since),
+        content_type='text/event-stream'
     )
-    return JsonResponse(dict(count=count))
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
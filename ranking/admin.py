@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import RecipeRanking
+
+
+@admin.register(RecipeRanking)
+class RecipeRankingAdmin(admin.ModelAdmin):
+    pass
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from ranking.models import rank_recipes
+
+
+class Command(BaseCommand):
+    help = 'Recompute top rated and trending recipe rankings.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            'Created or corrected {} rankings.'.format(rank_recipes())
+        )
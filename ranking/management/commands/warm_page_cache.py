@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from ranking.models import TRENDING, RecipeRanking
+from user_profile.models import UserProfile
+
+
+def hottest_pages(recipes, profiles):
+    """Return the paths of the home page, the most trending recipes and
+    the most followed profiles."""
+    paths = [reverse('home')]
+    recipe_ids = RecipeRanking.objects.order_by(*TRENDING).values_list(
+        'recipe_id',
+        flat=True
+    )[:recipes]
+    paths.extend(reverse('view_recipe', args=[pk]) for pk in recipe_ids)
+    usernames = UserProfile.objects.order_by(
+        '-follower_count',
+        'user_id'
+    ).values_list('user__username', flat=True)[:profiles]
+    paths.extend(reverse('profile', args=[name]) for name in usernames)
+    return paths
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the most visited pages into the anonymous page cache, '
+        'e.g. after a deploy. Only useful with a cache shared by every '
+        'worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=100,
+            help='Number of trending recipes to render.'
+        )
+        parser.add_argument(
+            '--profiles',
+            type=int,
+            default=50,
+            help='Number of most followed profiles to render.'
+        )
+        parser.add_argument(
+            '--host',
+            default='localhost',
+            help='Host to request pages from, one of ALLOWED_HOSTS.'
+        )
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST=options['host'])
+        paths = hottest_pages(options['recipes'], options['profiles'])
+        warmed = 0
+        for path in paths:
+            if client.get(path).status_code == 200:
+                warmed += 1
+        self.stdout.write('Warmed {} of {} pages.'.format(
+            warmed,
+            len(paths)
+        ))
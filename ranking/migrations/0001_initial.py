@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 19:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+from ranking.models import rank_recipes
+
+
+def rank(apps, schema_editor):
+    rank_recipes(apps)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('recipe', '0011_recipe_lineage'),
+        ('recipebook', '0006_id_sequence'),
+        ('review', '0004_auto_20261018_1829'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeRanking',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='recipe.Recipe')),
+                ('rating', models.FloatField()),
+                ('trending', models.FloatField()),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='reciperanking',
+            index_together=set([('trending', 'recipe'), ('rating', 'recipe')]),
+        ),
+        migrations.RunPython(rank, migrations.RunPython.noop),
+    ]
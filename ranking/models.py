@@ -0,0 +1,220 @@
+"""Top rated and trending recipe rankings.
+
+`rating` is a Bayesian average: each recipe's reviews are averaged
+together with PRIOR_WEIGHT reviews of PRIOR_MEAN, so a single five star
+review does not outrank many good ones.
+
+`trending` is the log of a sum of events, each worth its weight doubled
+for every HALF_LIFE between EPOCH and when it happened. Comparing those
+sums is the same as comparing sums decayed to the present, so adding an
+event never requires rewriting older scores; logs keep them finite.
+
+Both are kept up to date as recipes are created, reviewed, derived and
+added to recipe books, and recomputed by the rank_recipes command.
+"""
+from datetime import datetime, timedelta
+from math import exp, log, log1p
+from django.apps import apps as global_apps
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from recipe.models import LISTING_DEFERRED, Recipe
+from recipebook.models import RecipeBook
+from review.models import Review
+
+
+PRIOR_MEAN = 3.0
+PRIOR_WEIGHT = 5
+
+EPOCH = datetime(2017, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE = timedelta(days=7)
+
+WEIGHTS = dict(recipe=1.0, review=2.0, derivation=3.0, recipebook=1.0)
+
+TOP_RATED = ('-rating', '-recipe_id')
+TRENDING = ('-trending', '-recipe_id')
+
+
+class RecipeRanking(models.Model):
+    """A recipe's place in the top rated and trending listings."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='ranking',
+        on_delete=models.deletion.CASCADE
+    )
+    rating = models.FloatField()
+    trending = models.FloatField()
+
+    class Meta:
+        index_together = [('rating', 'recipe'), ('trending', 'recipe')]
+
+    def __str__(self):
+        return 'ranking of {}'.format(self.recipe_id)
+
+
+def bayesian_rating(review_count, score_sum):
+    return (PRIOR_WEIGHT * PRIOR_MEAN + score_sum) / (
+        PRIOR_WEIGHT + review_count
+    )
+
+
+def decayed(kind, when, count=1):
+    """Return the log trending score of `count` events at `when`."""
+    elapsed = (when - EPOCH).total_seconds() / HALF_LIFE.total_seconds()
+    return log(WEIGHTS[kind] * count) + elapsed * log(2)
+
+
+def log_add(a, b):
+    """Return log(exp(a) + exp(b)) without overflowing."""
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + log1p(exp(low - high))
+
+
+def get_rankings():
+    """Return rankings with their recipes and authors selected.
+
+    List them in TOP_RATED or TRENDING order, which the indexes serve."""
+    return RecipeRanking.objects.select_related('recipe__user').defer(
+        *('recipe__' + field for field in LISTING_DEFERRED)
+    )
+
+
+def record_event(recipe_id, kind, when=None, count=1):
+    """Add `count` events of `kind` to a recipe's trending score.
+
+    Recipes without a ranking yet are left for rank_recipes."""
+    score = decayed(kind, when or timezone.now(), count)
+    with transaction.atomic():
+        trending = RecipeRanking.objects.select_for_update().filter(
+            recipe_id=recipe_id
+        ).values_list('trending', flat=True).first()
+        if trending is not None:
+            RecipeRanking.objects.filter(recipe_id=recipe_id).update(
+                trending=log_add(trending, score)
+            )
+
+
+def refresh_rating(recipe_id):
+    """Recompute a recipe's rating from its review aggregates."""
+    aggregates = Recipe.objects.filter(pk=recipe_id).values_list(
+        'review_count', 'score_sum'
+    ).first()
+    if aggregates is not None:
+        RecipeRanking.objects.filter(recipe_id=recipe_id).update(
+            rating=bayesian_rating(*aggregates)
+        )
+
+
+def rank_recipes(apps=global_apps):
+    """Recompute every ranking, creating missing ones and fixing drift.
+
+    Recipe book memberships do not record when they were made, so each
+    counts from when both the book and the recipe existed. Takes an
+    app registry so that migrations can use it. Returns the number of
+    rankings created or corrected."""
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Review = apps.get_model('review', 'Review')
+    RecipeRanking = apps.get_model('ranking', 'RecipeRanking')
+    through = apps.get_model('recipebook', 'RecipeBook').recipes.through
+
+    ratings = {}
+    trending = {}
+
+    def add(recipe_id, kind, when):
+        if recipe_id in trending:
+            trending[recipe_id] = log_add(
+                trending[recipe_id],
+                decayed(kind, when)
+            )
+
+    rows = Recipe.objects.values_list(
+        'pk', 'date_created', 'review_count', 'score_sum'
+    )
+    for pk, date_created, review_count, score_sum in rows.iterator():
+        ratings[pk] = bayesian_rating(review_count, score_sum)
+        trending[pk] = decayed('recipe', date_created)
+    reviews = Review.objects.values_list('recipe_id', 'date_created')
+    for recipe_id, date_created in reviews.iterator():
+        add(recipe_id, 'review', date_created)
+    derivations = Recipe.objects.filter(
+        origin_recipe__isnull=False
+    ).values_list('origin_recipe_id', 'date_created')
+    for recipe_id, date_created in derivations.iterator():
+        add(recipe_id, 'derivation', date_created)
+    members = through.objects.values_list(
+        'recipe_id', 'recipe__date_created', 'recipebook__date_created'
+    )
+    for recipe_id, recipe_created, book_created in members.iterator():
+        add(recipe_id, 'recipebook', max(recipe_created, book_created))
+
+    fixed = 0
+    existing = RecipeRanking.objects.values_list(
+        'recipe_id', 'rating', 'trending'
+    )
+    with transaction.atomic():
+        for recipe_id, rating, score in existing.iterator():
+            if recipe_id not in ratings:
+                continue
+            expected = (ratings.pop(recipe_id), trending.pop(recipe_id))
+            if (abs(rating - expected[0]) > 1e-9 or
+                    abs(score - expected[1]) > 1e-9):
+                RecipeRanking.objects.filter(recipe_id=recipe_id).update(
+                    rating=expected[0],
+                    trending=expected[1]
+                )
+                fixed += 1
+        RecipeRanking.objects.bulk_create(
+            (
+                RecipeRanking(
+                    recipe_id=recipe_id,
+                    rating=rating,
+                    trending=trending[recipe_id]
+                )
+                for recipe_id, rating in ratings.items()
+            ),
+            batch_size=500
+        )
+    return fixed + len(ratings)
+
+
+@receiver(post_save, sender=Recipe)
+def rank_recipe(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        RecipeRanking.objects.create(
+            recipe=instance,
+            rating=bayesian_rating(0, 0),
+            trending=decayed('recipe', instance.date_created)
+        )
+        if instance.origin_recipe_id:
+            record_event(instance.origin_recipe_id, 'derivation')
+
+
+@receiver(post_save, sender=Review)
+def rank_review(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        refresh_rating(instance.recipe_id)
+        if created:
+            record_event(instance.recipe_id, 'review', instance.date_created)
+
+
+@receiver(post_delete, sender=Review)
+def rank_deleted_review(sender, instance, **kwargs):
+    refresh_rating(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=RecipeBook.recipes.through)
+def rank_recipebook_add(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # Recipe added to several books at once.
+        record_event(instance.pk, 'recipebook', count=len(pk_set))
+    else:
+        for recipe_id in pk_set:
+            record_event(recipe_id, 'recipebook')
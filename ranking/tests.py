@@ -0,0 +1,221 @@
+from io import StringIO
+from math import exp, log
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from recipe.models import Recipe
+from recipebook.models import RecipeBook
+from review.models import Review
+from user_profile.models import follow
+from utils.page_cache import page_key
+from .models import (
+    HALF_LIFE, RecipeRanking, decayed, log_add, rank_recipes
+)
+
+
+def create_recipe(user, title='recipe', origin=None):
+    recipe = Recipe(
+        user=user,
+        title=title,
+        description='a recipe',
+        ingredients='food',
+        directions='make it',
+        origin_recipe=origin
+    )
+    recipe.save()
+    return recipe
+
+
+def create_review(user, recipe, score):
+    review = Review(
+        user=user,
+        recipe=recipe,
+        title='review',
+        body='a review',
+        score=score
+    )
+    review.save()
+    return review
+
+
+def ranking(recipe):
+    return RecipeRanking.objects.get(recipe=recipe)
+
+
+class ScoreTests(TestCase):
+    """Test the rating and trending arithmetic."""
+
+    def test_half_life(self):
+        now = timezone.now()
+        self.assertAlmostEqual(
+            decayed('review', now + HALF_LIFE) - decayed('review', now),
+            log(2)
+        )
+
+    def test_log_add(self):
+        self.assertAlmostEqual(log_add(log(2), log(3)), log(5))
+        self.assertEqual(log_add(None, 1.5), 1.5)
+        # Would overflow outside log space.
+        self.assertAlmostEqual(log_add(1000, 1000), 1000 + log(2))
+
+
+class IncrementalRankingTests(TestCase):
+    """Test rankings are kept up to date as things happen."""
+
+    def setUp(self):
+        self.user = User(username='user')
+        self.user.save()
+        self.recipe = create_recipe(self.user)
+
+    def test_created_with_recipe(self):
+        self.assertEqual(ranking(self.recipe).rating, 3.0)
+
+    def test_bayesian_rating(self):
+        lucky = create_recipe(self.user, 'lucky')
+        create_review(self.user, lucky, 5)
+        for _ in range(10):
+            create_review(self.user, self.recipe, 4)
+        self.assertGreater(
+            ranking(self.recipe).rating,
+            ranking(lucky).rating
+        )
+
+    def test_review_deleted(self):
+        review = create_review(self.user, self.recipe, 5)
+        review.delete()
+        self.assertEqual(ranking(self.recipe).rating, 3.0)
+
+    def test_events_trend(self):
+        other = create_recipe(self.user, 'other')
+        before = ranking(self.recipe).trending
+        create_review(self.user, self.recipe, 1)
+        after_review = ranking(self.recipe).trending
+        self.assertGreater(after_review, before)
+        create_recipe(self.user, 'derived', origin=self.recipe)
+        after_derive = ranking(self.recipe).trending
+        self.assertGreater(after_derive, after_review)
+        book = RecipeBook(user=self.user, title='book', description='')
+        book.save()
+        book.recipes.add(self.recipe)
+        self.assertGreater(ranking(self.recipe).trending, after_derive)
+        self.recipe.recipebooks.set([])
+        other.recipebooks.add(book)
+        self.assertGreater(
+            ranking(self.recipe).trending,
+            ranking(other).trending
+        )
+
+    def test_event_weights_add(self):
+        before = exp(ranking(self.recipe).trending)
+        review = create_review(self.user, self.recipe, 4)
+        self.assertAlmostEqual(
+            exp(ranking(self.recipe).trending) / before,
+            1 + exp(decayed('review', review.date_created)) / before,
+            places=6
+        )
+
+
+class RankRecipesTests(TestCase):
+    """Test rankings are rebuilt in batch."""
+
+    def setUp(self):
+        self.user = User(username='user')
+        self.user.save()
+
+    def test_matches_incremental(self):
+        recipe = create_recipe(self.user)
+        create_review(self.user, recipe, 5)
+        create_recipe(self.user, 'derived', origin=recipe)
+        self.assertEqual(rank_recipes(), 0)
+
+    def test_fixes_drift(self):
+        recipe = create_recipe(self.user)
+        create_review(self.user, recipe, 5)
+        expected = ranking(recipe)
+        RecipeRanking.objects.update(rating=0, trending=0)
+        self.assertEqual(rank_recipes(), 1)
+        self.assertAlmostEqual(ranking(recipe).rating, expected.rating)
+        self.assertAlmostEqual(ranking(recipe).trending, expected.trending)
+
+    def test_creates_missing(self):
+        Recipe.objects.bulk_create([
+            Recipe(id=pk, user=self.user, title='bulk', lineage=str(pk))
+            for pk in (101, 102)
+        ])
+        stdout = StringIO()
+        call_command('rank_recipes', stdout=stdout)
+        self.assertIn('2', stdout.getvalue())
+        self.assertEqual(RecipeRanking.objects.count(), 2)
+
+
+class RankedRecipesViewTests(TestCase):
+    """Test the top rated and trending listings."""
+
+    def setUp(self):
+        self.user = User(username='user')
+        self.user.save()
+        self.recipes = [
+            create_recipe(self.user, 'recipe {}'.format(i))
+            for i in range(15)
+        ]
+        for i, recipe in enumerate(self.recipes[:5]):
+            create_review(self.user, recipe, i + 1)
+
+    def test_top_rated(self):
+        response = self.client.get(reverse('top_rated_recipes'))
+        listed = [r.recipe for r in response.context['objects']]
+        self.assertEqual(listed[0], self.recipes[4])
+        self.assertEqual(listed[1], self.recipes[3])
+        self.assertEqual(len(listed), 10)
+
+    def test_pages(self):
+        url = reverse('trending_recipes')
+        response = self.client.get(url)
+        next_page = response.context['pagination_arrows'].split(
+            'href="'
+        )[1].split('"')[0].replace('&amp;', '&')
+        listed = [r.recipe for r in response.context['objects']]
+        listed += [
+            r.recipe for r in self.client.get(next_page).context['objects']
+        ]
+        self.assertEqual(set(listed), set(self.recipes))
+        # Reviewed recipes trend above the others.
+        self.assertEqual(set(listed[:5]), set(self.recipes[:5]))
+
+    def test_query_count(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('top_rated_recipes'))
+
+
+class WarmPageCacheTests(TestCase):
+    """Test the hottest pages are rendered into the page cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User(username='user')
+        self.user.save()
+        self.cold = create_recipe(self.user, 'cold')
+        self.hot = create_recipe(self.user, 'hot')
+        create_review(self.user, self.hot, 5)
+        fan = User(username='fan')
+        fan.save()
+        follow(fan, self.user)
+
+    def test_warms_hottest(self):
+        stdout = StringIO()
+        call_command(
+            'warm_page_cache',
+            recipes=1,
+            profiles=1,
+            stdout=stdout
+        )
+        self.assertIn('Warmed 3 of 3 pages', stdout.getvalue())
+        with self.assertNumQueries(0):
+            self.client.get(reverse('home'))
+            self.client.get(reverse('view_recipe', args=[self.hot.id]))
+            self.client.get(reverse('profile', args=['user']))
+        cold = reverse('view_recipe', args=[self.cold.id])
+        self.assertIsNone(cache.get(page_key(cold)))
@@ -0,0 +1,7 @@
+from django.conf.urls import url
+from .views import TopRatedView, TrendingView
+
+urlpatterns = [
+    url(r'^top$', TopRatedView.as_view(), name='top_rated_recipes'),
+    url(r'^trending$', TrendingView.as_view(), name='trending_recipes'),
+]
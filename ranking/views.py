@@ -0,0 +1,30 @@
+from django.views.generic.base import TemplateView
+from utils.utils import paginate_by_cursor
+from .models import TOP_RATED, TRENDING, get_rankings
+
+
+class RankedRecipesView(TemplateView):
+    """View that lists recipes in ranking order."""
+    template_name = 'ranked_recipes.html'
+    heading = None
+    order = None
+
+    def get_context_data(self, **kwargs):
+        context = super(RankedRecipesView, self).get_context_data(**kwargs)
+        context['heading'] = self.heading
+        context.update(paginate_by_cursor(
+            self.request,
+            get_rankings(),
+            order=self.order
+        ))
+        return context
+
+
+class TopRatedView(RankedRecipesView):
+    heading = 'Top rated recipes'
+    order = TOP_RATED
+
+
+class TrendingView(RankedRecipesView):
+    heading = 'Trending recipes'
+    order = TRENDING
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        from . import search  # noqa: connects the search index signals
+        from .templatetags import recipe_fragments  # noqa: registers stats
@@ -0,0 +1,122 @@
+"""Materialized paths for recipe derivation trees.
+
+Each recipe stores its `lineage`: the ids of its root ancestor down to
+itself, each as SEGMENT_LENGTH base-36 digits. So with one indexed query
+each:
+
+- descendants are the recipes whose lineage starts with the recipe's,
+- the family is every recipe whose lineage starts with the root's
+  segment, and
+- ancestors are the ids read back out of the recipe's own lineage.
+
+Sorting by lineage lists a tree depth first, parents before children.
+"""
+from collections import Counter
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Length, Substr
+
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+# Six base-36 digits cover every positive 32-bit id.
+SEGMENT_LENGTH = 6
+
+# Deriving from a recipe whose lineage is this long starts a new
+# family, so lineages always fit the column: 100 generations.
+MAX_LENGTH = 600
+
+
+def segment(pk):
+    """Encode an id as a fixed-width lineage segment."""
+    digits = []
+    while pk:
+        pk, digit = divmod(pk, 36)
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits)).rjust(SEGMENT_LENGTH, '0')
+
+
+def lineage_for(pk, origin_lineage):
+    """Return the lineage of recipe `pk` derived from `origin_lineage`.
+
+    `origin_lineage` is '' for recipes that are not derived."""
+    if len(origin_lineage) >= MAX_LENGTH:
+        origin_lineage = ''
+    return origin_lineage + segment(pk)
+
+
+def split_lineage(lineage):
+    """Return the ids in a lineage, root first."""
+    return [
+        int(lineage[i:i + SEGMENT_LENGTH], 36)
+        for i in range(0, len(lineage), SEGMENT_LENGTH)
+    ]
+
+
+def depth(lineage):
+    """Return how many derivations separate a recipe from its root."""
+    return len(lineage) // SEGMENT_LENGTH - 1
+
+
+def move_subtree(model, pk, origin_pk):
+    """Derive recipe `pk`, not yet derived, from `origin_pk`.
+
+    Used when origins are linked after insertion, e.g. by imports.
+    Descendants' lineages are rewritten in one UPDATE."""
+    old = model.objects.values_list('lineage', flat=True).get(pk=pk)
+    origin = model.objects.values_list('lineage', flat=True).get(
+        pk=origin_pk
+    )
+    new = lineage_for(pk, origin)
+    with transaction.atomic():
+        model.objects.filter(pk=pk).update(origin_recipe_id=origin_pk)
+        model.objects.filter(pk=origin_pk).update(
+            derivation_count=F('derivation_count') + 1,
+            version=F('version') + 1
+        )
+        model.objects.filter(lineage__startswith=old).update(
+            lineage=Concat(
+                Value(new),
+                Substr('lineage', len(old) + 1, Length('lineage'))
+            )
+        )
+
+
+def rebuild_lineages(recipes):
+    """Recompute every lineage and derivation count, fixing drift.
+
+    `recipes` is a queryset over all recipes, so this also serves data
+    migrations. Only rows whose values changed are written. Returns the
+    number of recipes corrected."""
+    model = recipes.model
+    origins = dict(recipes.values_list('pk', 'origin_recipe_id').iterator())
+    lineages = {}
+
+    def resolve(pk):
+        # Walk up to the nearest recipe with a known lineage, then back.
+        chain = []
+        while pk is not None and pk not in lineages:
+            chain.append(pk)
+            pk = origins.get(pk)
+            if len(chain) > len(origins):
+                raise ValueError('origin_recipe links form a cycle')
+        lineage = lineages.get(pk, '')
+        for pk in reversed(chain):
+            lineage = lineages[pk] = lineage_for(pk, lineage)
+        return lineage
+
+    counts = Counter(origin for origin in origins.values() if origin)
+    fixed = 0
+    rows = recipes.order_by('pk').values_list(
+        'pk', 'lineage', 'derivation_count'
+    )
+    with transaction.atomic():
+        for pk, lineage, count in rows.iterator():
+            expected = resolve(pk)
+            if (lineage, count) != (expected, counts[pk]):
+                model.objects.filter(pk=pk).update(
+                    lineage=expected,
+                    derivation_count=counts[pk]
+                )
+                fixed += 1
+    return fixed
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from recipe.models import Recipe
+from recipe.parsing import compile_recipes
+
+
+class Command(BaseCommand):
+    help = 'Store parsed ingredients and directions for recipes lacking them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of recipes to compile per transaction.'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Recompile every recipe, e.g. after a parser change.'
+        )
+
+    def handle(self, *args, **options):
+        count = compile_recipes(
+            Recipe.objects.all(),
+            batch_size=options['batch_size'],
+            force=options['force']
+        )
+        self.stdout.write('Compiled {} recipes.'.format(count))
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:29
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipe', '0004_auto_20261018_1828'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='recipe',
+            index_together=set([('user', 'date_created', 'id'), ('origin_recipe', 'date_created', 'id')]),
+        ),
+    ]
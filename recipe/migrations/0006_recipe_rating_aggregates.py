@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def compute_aggregates(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    aggregates = Recipe.objects.annotate(
+        actual_count=Count('reviews'),
+        actual_sum=Sum('reviews__score')
+    ).filter(actual_count__gt=0).values_list(
+        'id', 'actual_count', 'actual_sum'
+    )
+    for pk, count, score_sum in aggregates.iterator():
+        Recipe.objects.filter(pk=pk).update(
+            review_count=count,
+            score_sum=score_sum
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0005_auto_20261018_1829'),
+        ('review', '0004_auto_20261018_1829'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='score_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(compute_aggregates, migrations.RunPython.noop),
+    ]
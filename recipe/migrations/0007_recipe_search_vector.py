@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# The search vector is managed entirely in SQL so that it never appears
+# in ORM queries; recipe.search reads it with extra().
+FORWARD_SQL = [
+    """
+    ALTER TABLE recipe_recipe ADD COLUMN search_vector tsvector
+    """,
+    """
+    CREATE FUNCTION recipe_recipe_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.ingredients, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipe_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, ingredients
+    ON recipe_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipe_recipe_search_vector_update()
+    """,
+    """
+    UPDATE recipe_recipe SET title = title
+    """,
+    """
+    CREATE INDEX recipe_recipe_search_vector_gin
+    ON recipe_recipe USING gin(search_vector)
+    """,
+]
+
+REVERSE_SQL = [
+    """
+    DROP TRIGGER recipe_recipe_search_vector_trigger ON recipe_recipe
+    """,
+    """
+    DROP FUNCTION recipe_recipe_search_vector_update()
+    """,
+    """
+    ALTER TABLE recipe_recipe DROP COLUMN search_vector
+    """,
+]
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0006_recipe_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(FORWARD_SQL),
+            run_on_postgresql(REVERSE_SQL)
+        ),
+    ]
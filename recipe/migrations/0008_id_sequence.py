@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from ids.models import create_sequence
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ids', '0001_initial'),
+        ('recipe', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        create_sequence('recipe'),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:46
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from recipe.parsing import compile_recipes
+
+
+def compile_existing(apps, schema_editor):
+    compile_recipes(apps.get_model('recipe', 'Recipe').objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0009_recipe_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='compiled',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(compile_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from recipe.lineage import rebuild_lineages
+
+
+def build_lineages(apps, schema_editor):
+    rebuild_lineages(apps.get_model('recipe', 'Recipe').objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0010_recipe_compiled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='derivation_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='lineage',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=600),
+        ),
+        migrations.RunPython(build_lineages, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,44 @@
-from random import randint
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.forms import ModelForm
 from django.contrib.auth.models import User
 from django.utils.encoding import python_2_unicode_compatible
 from django.urls import reverse
+from django.utils.functional import cached_property
+from ids.allocator import IdAllocator
+from user_profile.models import bump_profile_version
+from utils.page_cache import (
+    LISTING_TAG, invalidate_pages, profile_tag, recipe_tag
+)
+from .lineage import (
+    MAX_LENGTH,
+    SEGMENT_LENGTH,
+    depth,
+    lineage_for,
+    split_lineage
+)
+from .parsing import compile_recipe, load_compiled
 
 
-def create_unique_urlindex(lower_bound=100000000):
-    """Creates a unique urlindex.
+def create_unique_urlindex():
+    """Return an unused public id for a new recipe."""
+    return recipe_ids.allocate()
 
-    Ensures the generated value is not already a urlindex."""
-    while True:
-        i = randint(lower_bound, lower_bound*10-1)
-        if not Recipe.objects.filter(id=i).exists():
-            return i
+
+# Columns listed-recipe.html never shows.
+LISTING_DEFERRED = ('ingredients', 'directions', 'compiled')
+
+
+class RecipeQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Load recipes for pages rendering recipes/listed-recipe.html.
+
+        Authors are joined in the same query. Review and derivation
+        counts are columns already, so nothing needs annotating, and the
+        text only shown on a recipe's own page is left unloaded."""
+        return self.select_related('user').defer(*LISTING_DEFERRED)
 
 
 @python_2_unicode_compatible
@@ -33,7 +58,7 @@ class Recipe(models.Model):
     description = models.TextField()
     ingredients = models.TextField()
     directions = models.TextField()
-    date_created = models.DateTimeField(auto_now_add=True)
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True)
     origin_recipe = models.ForeignKey(
         'self',
         on_delete=models.deletion.CASCADE,
@@ -41,6 +66,50 @@ class Recipe(models.Model):
         null=True,
         blank=True
     )
+    review_count = models.PositiveIntegerField(default=0)
+    score_sum = models.PositiveIntegerField(default=0)
+    # Bumped whenever anything shown in cached fragments changes.
+    version = models.PositiveIntegerField(default=0)
+    # Parsed ingredients and directions; see recipe.parsing.
+    compiled = models.TextField(blank=True, default='', editable=False)
+    # Ids from the root of the derivation tree to this recipe; see
+    # recipe.lineage.
+    lineage = models.CharField(
+        max_length=MAX_LENGTH,
+        db_index=True,
+        blank=True,
+        default='',
+        editable=False
+    )
+    derivation_count = models.PositiveIntegerField(default=0)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        index_together = [
+            ('user', 'date_created', 'id'),
+            ('origin_recipe', 'date_created', 'id'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # A new row's allocated id is unused, so skip the UPDATE Django
+        # would otherwise try first because the primary key is set.
+        if self.pk is None:
+            self.pk = create_unique_urlindex()
+        if self._state.adding and not kwargs.get('force_update'):
+            kwargs.setdefault('force_insert', True)
+        if self._state.adding:
+            origin = ''
+            if self.origin_recipe_id is not None:
+                origin = self.origin_recipe.lineage
+            self.lineage = lineage_for(self.pk, origin)
+        self.version += 1
+        self.compiled = compile_recipe(self.ingredients, self.directions)
+        self.__dict__.pop('parsed', None)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields'])
+            kwargs['update_fields'].update(['version', 'compiled'])
+        super(Recipe, self).save(*args, **kwargs)
 
     def __str__(self):
         return self.title
@@ -51,11 +120,64 @@ class Recipe(models.Model):
     def get_absolute_url(self):
         return reverse('view_recipe', args=[str(self.id)])
 
+    def get_cache_key(self, name):
+        """Return the cache key for a fragment showing this recipe.
+
+        Keys change with the version, and include the creation time so
+        a reused id (e.g. between tests) never finds another recipe's
+        fragment."""
+        return 'fragment:{}:{}:{}:{}'.format(
+            name,
+            self.pk,
+            self.version,
+            int(self.date_created.timestamp() * 1000000)
+        )
+
+    @cached_property
+    def parsed(self):
+        compiled = self.compiled or compile_recipe(
+            self.ingredients,
+            self.directions
+        )
+        return load_compiled(compiled)
+
+    def get_ingredients(self):
+        """Ingredient lines."""
+        return self.parsed[0]
+
+    def get_directions(self):
+        """Direction steps, as dicts of summary and details."""
+        return self.parsed[1]
+
+    def get_depth(self):
+        """Number of derivations from the root of the family."""
+        return depth(self.lineage)
+
+    def get_ancestors(self):
+        """Recipes this was derived from, the root first."""
+        return Recipe.objects.filter(
+            pk__in=split_lineage(self.lineage)[:-1]
+        ).order_by('lineage')
+
+    def get_descendants(self):
+        """Recipes derived from this one, at any depth, depth first."""
+        return Recipe.objects.filter(
+            lineage__startswith=self.lineage
+        ).exclude(pk=self.pk).order_by('lineage')
+
+    def get_family(self):
+        """Every recipe sharing this one's root, the root first."""
+        return Recipe.objects.filter(
+            lineage__startswith=self.lineage[:SEGMENT_LENGTH]
+        ).order_by('lineage')
+
     def get_average_score(self):
-        reviews_count = self.reviews.count()
-        score_sum = sum(map(lambda r: r.score, self.reviews.all()))
-        if reviews_count:
-            return round(score_sum / reviews_count, 1)
+        """Average review score, from the denormalized aggregates."""
+        if self.review_count:
+            return round(self.score_sum / self.review_count, 1)
+
+
+recipe_ids = IdAllocator('recipe', 'recipe.Recipe')
 
 
 class RecipeForm(ModelForm):
@@ -64,3 +186,75 @@ class RecipeForm(ModelForm):
     class Meta:
         model = Recipe
         fields = ['title', 'description', 'ingredients', 'directions']
+
+    def __init__(self, *args, **kwargs):
+        # Pages render these forms on every view; leave the id of a new
+        # recipe unset until it is saved rather than allocate one.
+        if kwargs.get('instance') is None:
+            kwargs['instance'] = Recipe(id=None)
+        super(RecipeForm, self).__init__(*args, **kwargs)
+
+
+def update_derivation_count(recipe_id, delta):
+    Recipe.objects.filter(pk=recipe_id).update(
+        derivation_count=F('derivation_count') + delta,
+        version=F('version') + 1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def add_derivation(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.origin_recipe_id is not None:
+        update_derivation_count(instance.origin_recipe_id, 1)
+
+
+@receiver(post_save, sender=Recipe)
+def add_author_recipe(sender, instance, created, raw=False, **kwargs):
+    # Profiles list their author's recipes. Their versions only change
+    # on edits, and a new recipe has the version a deleted one may have
+    # had, so additions and removals bump the profile.
+    if created and not raw:
+        bump_profile_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_author_recipe(sender, instance, **kwargs):
+    bump_profile_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_derivation(sender, instance, **kwargs):
+    # Deleting a recipe cascades to its derivations; updating an origin
+    # deleted in the same cascade does nothing.
+    if instance.origin_recipe_id is not None:
+        update_derivation_count(instance.origin_recipe_id, -1)
+
+
+def recipe_page_tags(recipe):
+    """Return the tags of the cached pages showing `recipe`."""
+    tags = [
+        LISTING_TAG,
+        recipe_tag(recipe.pk),
+        profile_tag(recipe.user.username)
+    ]
+    if recipe.origin_recipe_id is not None:
+        tags.append(recipe_tag(recipe.origin_recipe_id))
+    return tags
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    tags = recipe_page_tags(instance)
+    if not created:
+        # Derived recipes show their origin's title.
+        tags.extend(recipe_tag(pk) for pk in Recipe.objects.filter(
+            origin_recipe=instance.pk
+        ).values_list('pk', flat=True))
+    invalidate_pages(*tags)
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    invalidate_pages(*recipe_page_tags(instance))
@@ -0,0 +1,87 @@
+"""Parsing of recipe ingredients and directions.
+
+Recipes store the parsed form in `Recipe.compiled`, computed on save,
+so pages showing a recipe do not parse its text on every request.
+"""
+import json
+import re
+from django.db import transaction
+from django.db.models import F
+
+
+def splitDirectionLine(direction):
+    """Split a direction line into its summary and details."""
+    try:
+        t, d = direction.split('\n', 1)
+    except ValueError:
+        t, d = direction, ''
+    return dict(summary=t.strip(), details=d.strip())
+
+
+def removeNewlineWhitespace(s):
+    """Remove whitespace surrounding newlines.
+
+    Also remove \rs."""
+    return re.sub('[ \t]*\n[ \t]*', '\n', re.sub('\r', '', s))
+
+
+def structureDirections(directions):
+    """Structure directions.
+
+    Directions are entered like:
+    <direction summary>\n<direction details>...
+    """
+    directionLines = removeNewlineWhitespace(directions).split('\n\n')
+    return map(splitDirectionLine, directionLines)
+
+
+def compile_recipe(ingredients, directions):
+    """Return the parsed ingredients and directions, serialized.
+
+    The result is compact JSON: {"i": [line, ...], "d": [[summary,
+    details], ...]}."""
+    return json.dumps(dict(
+        i=ingredients.split('\n'),
+        d=[[step['summary'], step['details']]
+           for step in structureDirections(directions)]
+    ), separators=(',', ':'))
+
+
+def load_compiled(compiled):
+    """Return (ingredient lines, direction dicts) from `compile_recipe`."""
+    data = json.loads(compiled)
+    directions = [
+        dict(summary=summary, details=details)
+        for summary, details in data['d']
+    ]
+    return data['i'], directions
+
+
+def compile_recipes(recipes, batch_size=500, force=False):
+    """Store compiled text for recipes without it, in batches.
+
+    `recipes` is a queryset, so this also serves data migrations. With
+    `force` every recipe is recompiled, e.g. after a parser change.
+    Returns the number of recipes compiled."""
+    if not force:
+        recipes = recipes.filter(compiled='')
+    model = recipes.model
+    done = 0
+    last_pk = None
+    while True:
+        batch = recipes.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        rows = list(batch.values_list(
+            'pk', 'ingredients', 'directions'
+        )[:batch_size])
+        if not rows:
+            return done
+        with transaction.atomic():
+            for pk, ingredients, directions in rows:
+                model.objects.filter(pk=pk).update(
+                    compiled=compile_recipe(ingredients, directions),
+                    version=F('version') + 1
+                )
+        done += len(rows)
+        last_pk = rows[-1][0]
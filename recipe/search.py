@@ -0,0 +1,219 @@
+"""Full-text recipe search.
+
+On PostgreSQL recipes carry a weighted `search_vector` tsvector column
+with a GIN index, maintained by a trigger (see migration 0007) so every
+insert and update keeps it current. Other databases, i.e. SQLite in
+development and tests, use an in-memory inverted index with the same
+field weights, so `search_recipes` behaves the same everywhere.
+"""
+import re
+import threading
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Recipe
+
+
+MIN_WORD_LENGTH = 3
+
+SEARCH_CONFIG = 'english'
+
+# Field weights, matching PostgreSQL's default ts_rank weights for the
+# A, B and C labels assigned by the trigger.
+FIELD_WEIGHTS = (
+    ('title', 'A', 1.0),
+    ('description', 'B', 0.4),
+    ('ingredients', 'C', 0.2),
+)
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+SUFFIXES = ('ing', 'ed', 'es', 's', 'e')
+
+
+def get_words(query):
+    """Split a query into words, dropping ones too short to search."""
+    return [w for w in query.split() if len(w) >= MIN_WORD_LENGTH]
+
+
+def stem(token):
+    """Reduce a token to a crude stem, e.g. "baked" to "bak"."""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """Return the stemmed terms in `text`."""
+    return [stem(t) for t in TOKEN_RE.findall(text.lower())]
+
+
+class PostgresSearchBackend(object):
+    """Search the trigger-maintained `search_vector` column."""
+
+    def search(self, words):
+        tsquery = ' && '.join(
+            ['plainto_tsquery(%s, %s)'] * len(words)
+        )
+        params = []
+        for word in words:
+            params.extend([SEARCH_CONFIG, word])
+        return Recipe.objects.for_listing().extra(
+            select={
+                'rank': 'ts_rank(search_vector, {})'.format(tsquery)
+            },
+            select_params=params,
+            where=['search_vector @@ ({})'.format(tsquery)],
+            params=params,
+            order_by=['-rank', '-date_created']
+        )
+
+    def add(self, recipe):
+        pass
+
+    def remove(self, pk):
+        pass
+
+    def reset(self):
+        pass
+
+
+class RankedResults(object):
+    """Lazy sequence of recipes for a list of ranked ids.
+
+    Only the sliced ids are fetched, so pagination loads one page."""
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        ids = self.ids[index]
+        recipes = Recipe.objects.for_listing().in_bulk(ids)
+        return [recipes[pk] for pk in ids if pk in recipes]
+
+
+class MemorySearchBackend(object):
+    """In-memory inverted index used when PostgreSQL is unavailable.
+
+    The index is built lazily from the database and kept current by
+    model signals within this process. Before each search the indexed
+    document count is checked against the table, rebuilding when they
+    disagree (e.g. after another process wrote or a test rolled back)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.postings = None
+        self.documents = {}
+
+    def index_document(self, pk, date_created, fields):
+        terms = {}
+        for name, _, weight in FIELD_WEIGHTS:
+            for term in tokenize(fields[name] or ''):
+                terms[term] = terms.get(term, 0) + weight
+        for term, weight in terms.items():
+            self.postings.setdefault(term, {})[pk] = weight
+        self.documents[pk] = (date_created, list(terms))
+
+    def unindex_document(self, pk):
+        _, terms = self.documents.pop(pk, (None, ()))
+        for term in terms:
+            postings = self.postings.get(term, {})
+            postings.pop(pk, None)
+            if not postings:
+                self.postings.pop(term, None)
+
+    def build(self):
+        self.postings = {}
+        self.documents = {}
+        fields = [name for name, _, _ in FIELD_WEIGHTS]
+        rows = Recipe.objects.values('id', 'date_created', *fields)
+        for row in rows.iterator():
+            self.index_document(row['id'], row['date_created'], row)
+
+    def ensure_built(self):
+        if (self.postings is None or
+                len(self.documents) != Recipe.objects.count()):
+            self.build()
+
+    def add(self, recipe):
+        with self.lock:
+            if self.postings is None:
+                return
+            self.unindex_document(recipe.pk)
+            self.index_document(
+                recipe.pk,
+                recipe.date_created,
+                dict((name, getattr(recipe, name))
+                     for name, _, _ in FIELD_WEIGHTS)
+            )
+
+    def remove(self, pk):
+        with self.lock:
+            if self.postings is not None:
+                self.unindex_document(pk)
+
+    def search(self, words):
+        terms = set()
+        for word in words:
+            terms.update(tokenize(word))
+        with self.lock:
+            self.ensure_built()
+            postings = [self.postings.get(term, {}) for term in terms]
+            if not postings:
+                return RankedResults([])
+            postings.sort(key=len)
+            matches = set(postings[0]).intersection(*postings[1:])
+            scores = dict(
+                (pk, sum(p[pk] for p in postings)) for pk in matches
+            )
+            ranked = sorted(
+                matches,
+                key=lambda pk: (scores[pk], self.documents[pk][0], pk),
+                reverse=True
+            )
+        return RankedResults(ranked)
+
+
+_backends = {}
+
+
+def get_backend():
+    """Return the search backend for the default database."""
+    vendor = connection.vendor
+    if vendor not in _backends:
+        if vendor == 'postgresql':
+            _backends[vendor] = PostgresSearchBackend()
+        else:
+            _backends[vendor] = MemorySearchBackend()
+    return _backends[vendor]
+
+
+def search_recipes(query):
+    """Return recipes matching every word of `query`, best first.
+
+    The result is a queryset on PostgreSQL and a lazy sequence
+    otherwise; both can be handed to `paginate`."""
+    words = get_words(query)
+    if not words:
+        return Recipe.objects.none()
+    return get_backend().search(words)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_backend().add(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
@@ -0,0 +1,65 @@
+from django import template
+from django.conf import settings
+from django.core.cache import caches
+from utils.cache import CACHE_STATS, CacheStats
+
+
+register = template.Library()
+
+# Fragments used by the templates, registered up front so their hit
+# rates are reported even by processes that render no templates.
+FRAGMENTS = ('listed_header', 'listed_body', 'body')
+
+
+def get_fragment_stats(name):
+    stats_name = 'fragment_{}'.format(name)
+    return CACHE_STATS.get(stats_name) or CacheStats(stats_name)
+
+
+for name in FRAGMENTS:
+    get_fragment_stats(name)
+
+
+class RecipeFragmentNode(template.Node):
+    def __init__(self, name, recipe, nodelist):
+        self.name = name
+        self.recipe = recipe
+        self.nodelist = nodelist
+        self.stats = get_fragment_stats(name)
+
+    def render(self, context):
+        recipe = self.recipe.resolve(context)
+        cache = caches[settings.FRAGMENT_CACHE]
+        key = recipe.get_cache_key(self.name)
+        content = cache.get(key)
+        if content is not None:
+            self.stats.hit()
+            return content
+        self.stats.miss()
+        content = self.nodelist.render(context)
+        cache.set(key, content, settings.FRAGMENT_CACHE_TIMEOUT)
+        return content
+
+
+@register.tag
+def recipe_fragment(parser, token):
+    """Cache the enclosed template for a recipe until it changes.
+
+    Usage::
+
+        {% recipe_fragment "listed" recipe %}...{% endrecipe_fragment %}
+
+    The enclosed template must depend only on the recipe, as the same
+    content is shown to every viewer."""
+    bits = token.split_contents()
+    if len(bits) != 3 or bits[1][0] not in '"\'' or bits[1][-1] != bits[1][0]:
+        raise template.TemplateSyntaxError(
+            '{} takes a quoted fragment name and a recipe'.format(bits[0])
+        )
+    nodelist = parser.parse(('endrecipe_fragment',))
+    parser.delete_first_token()
+    return RecipeFragmentNode(
+        bits[1][1:-1],
+        parser.compile_filter(bits[2]),
+        nodelist
+    )
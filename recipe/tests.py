@@ -1,11 +1,28 @@
+import json
+import re
+from base64 import urlsafe_b64encode
 from functools import partial
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from recipebook.models import RecipeBook
 from review.models import Review
+from user_profile.models import follow
 from .models import Recipe
-from . import views
+from .templatetags.recipe_fragments import get_fragment_stats
+from . import lineage, parsing, search
+
+
+# Render every page, rather than serve anonymous visitors whole cached
+# ones.
+without_page_cache = override_settings(MIDDLEWARE=[
+    name for name in settings.MIDDLEWARE
+    if name != 'recipes.middleware.AnonymousPageCacheMiddleware'
+])
 
 
 RECIPE_FIELDS = ['title', 'description', 'ingredients', 'directions']
@@ -191,7 +208,7 @@ class ViewLogicTests(TestCase):
 
     def test_structure_directions(self):
         """Test structure_directions helper function on an example recipe."""
-        structured = list(views.structureDirections("""Season
+        structured = list(parsing.structureDirections("""Season
         Mix cubed tofu with lime juice, turmeric, salt, and black pepper.
 
         Fry
@@ -270,6 +287,68 @@ class SearchViewTests(TestCase):
         self.assertNotContains(response, self.title)
 
 
+class SearchRankingTests(TestCase):
+    """Test full-text search over recipe fields."""
+
+    def setUp(self):
+        """Insert recipes mentioning tomatoes in different fields."""
+        self.user = User(username="cook")
+        self.user.save()
+        self.in_ingredients = self.add_recipe(
+            'soup', 'a warm soup', '2 tomatoes\n1 onion'
+        )
+        self.in_title = self.add_recipe(
+            'tomato salad', 'fresh salad', 'lettuce'
+        )
+        self.in_description = self.add_recipe(
+            'bruschetta', 'bread with tomatoes', 'bread'
+        )
+        self.unrelated = self.add_recipe('pancakes', 'breakfast', 'flour')
+
+    def add_recipe(self, title, description, ingredients):
+        recipe = Recipe(
+            user=self.user,
+            title=title,
+            description=description,
+            ingredients=ingredients,
+            directions='cook it'
+        )
+        recipe.save()
+        return recipe
+
+    def test_searches_all_fields_ranked_by_field(self):
+        """Test title matches outrank description and ingredients."""
+        results = list(search.search_recipes('tomatoes'))
+        self.assertEqual(
+            results,
+            [self.in_title, self.in_description, self.in_ingredients]
+        )
+
+    def test_all_words_must_match(self):
+        """Test every query word must appear in a result."""
+        results = list(search.search_recipes('tomato bread'))
+        self.assertEqual(results, [self.in_description])
+
+    def test_edited_recipe_is_reindexed(self):
+        """Test saving a recipe updates the index."""
+        self.unrelated.title = 'tomato pancakes'
+        self.unrelated.save()
+        self.assertIn(self.unrelated, search.search_recipes('tomato'))
+
+    def test_deleted_recipe_is_unindexed(self):
+        """Test deleting a recipe removes it from results."""
+        self.in_title.delete()
+        self.assertNotIn(self.in_title, search.search_recipes('tomato'))
+
+    def test_search_view_paginates_ranked_results(self):
+        """Test the search view shows ranked results."""
+        response = self.client.get(reverse('recipe_search') + '?q=tomato')
+        self.assertEqual(
+            list(response.context['objects']),
+            [self.in_title, self.in_description, self.in_ingredients]
+        )
+
+
 class EditViewTests(TestCase):
     """Test recipe updatae view recipes."""
 
@@ -410,6 +489,63 @@ class AddRecipeBookTests(TestCase):
         self.rb1.recipes.add(other_recipe)
         self.assertEqual(self.rb1.recipes.count(), count + 1)
 
+    def test_remove_recipe_from_book(self):
+        """Test books left out of the POST lose the recipe."""
+        self.post_data(dict(books=[self.rb1.id, self.rb2.id]))
+        self.post_data(dict(books=[self.rb2.id]))
+        self.assertEqual(list(self.recipe.recipebooks.all()), [self.rb2])
+        self.post_data(dict())
+        self.assertEqual(self.recipe.recipebooks.count(), 0)
+
+    def test_other_users_books_kept(self):
+        """Test updating leaves other users' books containing the recipe."""
+        other, _ = create_recipe_and_user('other')
+        book = RecipeBook(title='theirs', description='', user=other)
+        book.save()
+        book.recipes.add(self.recipe)
+        self.post_data(dict(books=[self.rb1.id]))
+        self.assertEqual(
+            set(self.recipe.recipebooks.all()),
+            set([self.rb1, book])
+        )
+
+    def test_missing_book_forbidden(self):
+        """Test books that do not exist are refused."""
+        response = self.post_data(dict(books=[self.rb1.id, 1]))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.recipe.recipebooks.count(), 0)
+
+    def test_invalid_book_id(self):
+        """Test book ids must be integers."""
+        response = self.post_data(dict(books=['one']))
+        self.assertEqual(response.status_code, 400)
+
+    def test_ajax_returns_json(self):
+        """Test AJAX POSTs get the changes instead of a redirect."""
+        self.post_data(dict(books=[self.rb1.id]))
+        response = self.post_data(
+            dict(books=[self.rb2.id]),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.json(), dict(
+            added=[str(self.rb2.id)],
+            removed=[str(self.rb1.id)]
+        ))
+
+    def test_query_count(self):
+        """Test the number of queries does not grow with the books."""
+        books = [self.rb1, self.rb2]
+        for i in range(8):
+            book = RecipeBook(title=str(i), description='', user=self.user)
+            book.save()
+            books.append(book)
+        with CaptureQueriesContext(connection) as few:
+            self.post_data(dict(books=[self.rb1.id]))
+        self.recipe.recipebooks.clear()
+        with CaptureQueriesContext(connection) as many:
+            self.post_data(dict(books=[book.id for book in books]))
+        self.assertEqual(len(many), len(few))
+
 
 class DisplayReviewTests(TestCase):
     """Test displaying reviews on recipe page."""
@@ -634,3 +770,556 @@ class DerivedRecipesViewTests(TestCase):
         recipe_response = self.client.get(view_recipe_url)
         derived_url = reverse('derived_recipes', args=[self.origin_recipe.id])
         self.assertContains(recipe_response, 'href="{}"'.format(derived_url))
+
+
+class DerivedRecipesPaginationTests(TestCase):
+    """Tests for cursor pagination of the derived recipe list."""
+
+    def setUp(self):
+        """Sets up a recipe with 25 derivations."""
+        self.user, self.origin_recipe = create_recipe_and_user()
+        for i in range(25):
+            Recipe(
+                user=self.user,
+                title="derivation {}".format(i),
+                description="this recipe is derived from another",
+                ingredients="food",
+                directions="make it",
+                origin_recipe=self.origin_recipe
+            ).save()
+        self.url = reverse('derived_recipes', args=[self.origin_recipe.id])
+
+    def get_page(self, url):
+        """GET a page, returning its recipes and pagination links."""
+        response = self.client.get(url)
+        links = dict(
+            (label, href.replace('&amp;', '&'))
+            for href, label in re.findall(
+                r'<a href="([^"]*)">&(larr|rarr);</a>',
+                response.context['pagination_arrows']
+            )
+        )
+        return response.context['objects'], links
+
+    def test_pages_cover_all_recipes_in_order(self):
+        """Test following next links visits every derivation once."""
+        objects, links = self.get_page(self.url)
+        seen = list(objects)
+        self.assertNotIn('larr', links)
+        while 'rarr' in links:
+            objects, links = self.get_page(links['rarr'])
+            seen.extend(objects)
+        expected = list(
+            self.origin_recipe.recipe_derivations.order_by(
+                '-date_created', '-id'
+            )
+        )
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        """Test the previous link of page two leads back to page one."""
+        first, links = self.get_page(self.url)
+        second, links = self.get_page(links['rarr'])
+        previous, links = self.get_page(links['larr'])
+        self.assertEqual(previous, first)
+        self.assertNotIn('larr', links)
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Test a malformed cursor falls back to the first page."""
+        first, _ = self.get_page(self.url)
+        objects, _ = self.get_page(self.url + '?c=not-a-cursor')
+        self.assertEqual(objects, first)
+        for values in (['garbage', '1'], ['2017-01-01', 'x'], [1, 2],
+                       [['2017-01-01'], '1'], [None, '1']):
+            cursor = urlsafe_b64encode(
+                json.dumps(['next', values]).encode()
+            ).decode()
+            objects, _ = self.get_page(self.url + '?c=' + cursor)
+            self.assertEqual(objects, first)
+
+    def test_deep_page_fetches_one_page(self):
+        """Test a page query is limited to one page plus one row."""
+        _, links = self.get_page(self.url)
+        _, links = self.get_page(links['rarr'])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(links['rarr'])
+        derivation_queries = [
+            q['sql'] for q in queries
+            if 'origin_recipe_id" =' in q['sql'] and 'LIMIT' in q['sql']
+        ]
+        self.assertEqual(len(derivation_queries), 1)
+        self.assertIn('LIMIT 11', derivation_queries[0])
+        self.assertNotIn('OFFSET', derivation_queries[0])
+
+
+class RecipeDetailQueryTests(TestCase):
+    """Test the recipe page's query count is independent of book sizes."""
+
+    def setUp(self):
+        """Create a viewer with recipe books and a recipe to view."""
+        self.user, self.recipe = create_recipe_and_user()
+        self.client.force_login(self.user)
+        self.books = []
+        for i in range(3):
+            book = RecipeBook(
+                user=self.user,
+                title='book {}'.format(i),
+                description='recipes'
+            )
+            book.save()
+            self.books.append(book)
+        self.books[1].recipes.add(self.recipe)
+        self.url = reverse('view_recipe', args=[self.recipe.id])
+
+    def fill_books(self, amount):
+        """Add `amount` other recipes to every book."""
+        for i in range(amount):
+            recipe = Recipe(
+                user=self.user,
+                title='filler {}'.format(i),
+                description='filler',
+                ingredients='food',
+                directions='make it'
+            )
+            recipe.save()
+            for book in self.books:
+                book.recipes.add(recipe)
+
+    def test_membership_flags(self):
+        """Test only the book containing the recipe is selected."""
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [checked for _, checked in response.context['recipebooks']],
+            [False, True, False]
+        )
+
+    def test_query_count_constant(self):
+        """Test the page's queries don't grow with book contents."""
+        with self.assertNumQueries(8):
+            self.client.get(self.url)
+        self.fill_books(50)
+        with self.assertNumQueries(8):
+            self.client.get(self.url)
+
+
+@without_page_cache
+class RecipeFragmentCacheTests(TestCase):
+    """Test cached recipe fragments are reused until the recipe changes."""
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.user, self.recipe = create_recipe_and_user()
+        self.stats = get_fragment_stats('body')
+        self.stats.flush()
+        self.stats.reset()
+        self.url = reverse('view_recipe', args=[self.recipe.id])
+
+    def test_body_cached(self):
+        """The second view of a recipe reuses its rendered body."""
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.stats.flush()
+        totals = self.stats.totals()
+        self.assertEqual((totals['hits'], totals['misses']), (1, 1))
+
+    def test_body_rendered_after_edit(self):
+        """Saving a recipe invalidates its cached body."""
+        self.client.get(self.url)
+        self.recipe.directions = 'stir it\nuntil smooth'
+        self.recipe.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'stir it')
+        self.assertContains(response, 'until smooth')
+
+    def test_listing_rendered_after_review(self):
+        """Reviews invalidate the average score shown in listings."""
+        home = reverse('home')
+        self.assertNotContains(self.client.get(home), 'average-rating')
+        Review(
+            user=self.user,
+            recipe=self.recipe,
+            title='good',
+            body='good',
+            score=4
+        ).save()
+        self.assertContains(self.client.get(home), 'average-rating')
+
+    def test_listing_rendered_after_edit(self):
+        home = reverse('home')
+        self.client.get(home)
+        self.recipe.title = 'new title'
+        self.recipe.save()
+        self.assertContains(self.client.get(home), 'new title')
+
+    def test_listing_skips_author_lookup(self):
+        """A cached listing does not look up the recipe's author."""
+        home = reverse('home')
+        self.client.get(home)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(home)
+        self.assertFalse(any(
+            'FROM "auth_user"' in q['sql'] for q in queries.captured_queries
+        ))
+
+
+class CompiledRecipeTests(TestCase):
+    """Test parsed ingredients and directions are stored on save."""
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.user = User.objects.create(username='cook')
+        self.client.force_login(self.user)
+
+    def test_created_recipe_compiled(self):
+        """Recipes created through the form store their parsed text."""
+        self.client.post(reverse('new_recipe'), dict(
+            title='soup',
+            description='hot',
+            ingredients='water\nsalt',
+            directions='Boil\nthe water\n\nSalt\nto taste'
+        ))
+        recipe = Recipe.objects.get(title='soup')
+        self.assertEqual(recipe.get_ingredients(), ['water', 'salt'])
+        self.assertEqual(recipe.get_directions(), [
+            dict(summary='Boil', details='the water'),
+            dict(summary='Salt', details='to taste'),
+        ])
+
+    def test_view_reads_compiled(self):
+        """The recipe page shows the stored parse, not the raw text."""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='soup',
+            description='hot',
+            ingredients='water',
+            directions='Boil'
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(
+            compiled=parsing.compile_recipe('stored water', 'Stored boil')
+        )
+        response = self.client.get(reverse('view_recipe', args=[recipe.pk]))
+        self.assertContains(response, 'stored water')
+        self.assertContains(response, 'Stored boil')
+
+    def test_update_fields_recompiles(self):
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='soup',
+            description='hot',
+            ingredients='water',
+            directions='Boil'
+        )
+        recipe.ingredients = 'stock'
+        recipe.save(update_fields=['ingredients'])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.get_ingredients(), ['stock'])
+
+    def test_backfill(self):
+        """compile_recipes fills in recipes saved without a parse."""
+        for i in range(5):
+            Recipe.objects.create(
+                user=self.user,
+                title='soup {}'.format(i),
+                description='hot',
+                ingredients='water',
+                directions='Boil'
+            )
+        Recipe.objects.update(compiled='')
+        self.assertEqual(parsing.compile_recipes(
+            Recipe.objects.all(),
+            batch_size=2
+        ), 5)
+        self.assertFalse(Recipe.objects.filter(compiled='').exists())
+        self.assertEqual(
+            Recipe.objects.first().get_ingredients(),
+            ['water']
+        )
+
+
+class RecipeLineageTests(TestCase):
+    """Tests for derivation trees stored as materialized paths."""
+
+    def setUp(self):
+        """Sets up a family: root -> a -> a1, root -> b, and a stranger."""
+        self.user, self.root = create_recipe_and_user()
+        self.a = self.derive(self.root, 'a')
+        self.a1 = self.derive(self.a, 'a1')
+        self.b = self.derive(self.root, 'b')
+        _, self.stranger = create_recipe_and_user('stranger')
+
+    def derive(self, origin, title):
+        recipe = Recipe(
+            user=self.user,
+            title=title,
+            description='derived',
+            ingredients='food',
+            directions='make it',
+            origin_recipe=origin
+        )
+        recipe.save()
+        return recipe
+
+    def reload(self, recipe):
+        return Recipe.objects.get(pk=recipe.pk)
+
+    def test_segments_round_trip(self):
+        for pk in (1, 100000000, 999999999, 2 ** 31 - 1):
+            encoded = lineage.segment(pk)
+            self.assertEqual(len(encoded), lineage.SEGMENT_LENGTH)
+            self.assertEqual(lineage.split_lineage(encoded), [pk])
+
+    def test_lineage(self):
+        self.assertEqual(
+            lineage.split_lineage(self.a1.lineage),
+            [self.root.pk, self.a.pk, self.a1.pk]
+        )
+        self.assertEqual(self.a1.get_depth(), 2)
+        self.assertEqual(self.root.get_depth(), 0)
+
+    def test_descendants(self):
+        with self.assertNumQueries(1):
+            descendants = list(self.root.get_descendants())
+        self.assertEqual(
+            sorted(descendants, key=lambda r: r.title),
+            [self.a, self.a1, self.b]
+        )
+        self.assertEqual(list(self.a.get_descendants()), [self.a1])
+        # Depth first: a child directly follows its parent.
+        index = descendants.index(self.a)
+        self.assertEqual(descendants[index + 1], self.a1)
+
+    def test_ancestors(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(self.a1.get_ancestors()),
+                [self.root, self.a]
+            )
+        self.assertEqual(list(self.root.get_ancestors()), [])
+
+    def test_family(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.a1.get_family().count(), 4)
+        self.assertEqual(list(self.stranger.get_family()), [self.stranger])
+
+    def test_derivation_counts(self):
+        self.assertEqual(self.reload(self.root).derivation_count, 2)
+        self.assertEqual(self.reload(self.a).derivation_count, 1)
+        self.b.delete()
+        self.assertEqual(self.reload(self.root).derivation_count, 1)
+        self.a.delete()
+        self.assertEqual(self.reload(self.root).derivation_count, 0)
+        self.assertFalse(Recipe.objects.filter(pk=self.a1.pk).exists())
+
+    def test_rebuild(self):
+        Recipe.objects.update(lineage='', derivation_count=0)
+        self.assertEqual(lineage.rebuild_lineages(Recipe.objects.all()), 5)
+        self.assertEqual(self.reload(self.a1).lineage, self.a1.lineage)
+        self.assertEqual(self.reload(self.root).derivation_count, 2)
+        self.assertEqual(lineage.rebuild_lineages(Recipe.objects.all()), 0)
+
+    def test_move_subtree(self):
+        lineage.move_subtree(Recipe, self.root.pk, self.stranger.pk)
+        a1 = self.reload(self.a1)
+        self.assertEqual(
+            lineage.split_lineage(a1.lineage),
+            [self.stranger.pk, self.root.pk, self.a.pk, self.a1.pk]
+        )
+        self.assertEqual(self.reload(self.stranger).derivation_count, 1)
+        self.assertEqual(self.reload(self.root).origin_recipe, self.stranger)
+
+    def test_deep_derivation_starts_family(self):
+        recipe = self.root
+        for i in range(lineage.MAX_LENGTH // lineage.SEGMENT_LENGTH):
+            recipe = self.derive(recipe, 'level {}'.format(i))
+        self.assertEqual(recipe.lineage, lineage.segment(recipe.pk))
+        self.assertEqual(recipe.origin_recipe_id, recipe.origin_recipe.pk)
+
+    def test_lineage_view(self):
+        response = self.client.get(reverse('recipe_lineage', args=[self.a.pk]))
+        self.assertEqual(response.context['count'], 4)
+        self.assertEqual(list(response.context['ancestors']), [self.root])
+        for recipe in (self.root, self.a1, self.b):
+            self.assertContains(
+                response,
+                reverse('view_recipe', args=[recipe.pk])
+            )
+        self.assertNotContains(
+            response,
+            reverse('view_recipe', args=[self.stranger.pk])
+        )
+
+    def test_recipe_page_links_lineage(self):
+        response = self.client.get(reverse('view_recipe', args=[self.a.pk]))
+        self.assertContains(
+            response,
+            reverse('recipe_lineage', args=[self.a.pk])
+        )
+        self.assertContains(response, '1 derivations')
+
+
+class RecipeListingQueryTests(TestCase):
+    """Test recipe listings take a fixed number of queries.
+
+    Fragments are cleared before each measured request, so every listed
+    recipe is rendered from the rows loaded for the page. A request
+    before that builds the in-memory search index, if used."""
+
+    def setUp(self):
+        self.author, self.origin = create_recipe_and_user('author')
+        self.viewer = User.objects.create(username='viewer')
+        follow(self.viewer, self.author)
+        self.book = RecipeBook(
+            user=self.author,
+            title='listing book',
+            description='recipes'
+        )
+        self.book.save()
+        self.add_recipes(3)
+
+    def add_recipes(self, amount):
+        for i in range(amount):
+            recipe = Recipe(
+                user=self.author,
+                title='listing recipe {}'.format(i),
+                description='a listed recipe',
+                ingredients='food',
+                directions='make it',
+                origin_recipe=self.origin
+            )
+            recipe.save()
+            self.book.recipes.add(recipe)
+            Review(
+                user=self.viewer,
+                recipe=recipe,
+                title='review',
+                body='a review',
+                score=4
+            ).save()
+
+    def assertListingQueries(self, url, count):
+        self.client.force_login(self.viewer)
+        for _ in range(2):
+            self.client.get(url)
+            caches['fragments'].clear()
+            with self.assertNumQueries(count):
+                response = self.client.get(url)
+            self.assertContains(response, 'listing recipe 0')
+            self.add_recipes(10)
+
+    def test_home(self):
+        self.assertListingQueries(reverse('home'), 6)
+
+    def test_profile(self):
+        self.assertListingQueries(reverse('profile', args=['author']), 7)
+
+    def test_search(self):
+        self.assertListingQueries(reverse('recipe_search') + '?q=listing', 4)
+
+    def test_recipebook(self):
+        self.assertListingQueries(
+            reverse('view_recipebook', args=[self.book.pk]),
+            7
+        )
+
+    def test_derivations(self):
+        self.assertListingQueries(
+            reverse('derived_recipes', args=[self.origin.pk]),
+            4
+        )
+
+
+class RecipeConditionalGetTests(TestCase):
+    """Test unchanged recipe pages are answered with 304."""
+
+    def setUp(self):
+        self.user, self.recipe = create_recipe_and_user()
+        self.url = reverse('view_recipe', args=[self.recipe.id])
+
+    def revalidate(self, response):
+        return self.client.get(
+            self.url,
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        # Answered by the view, not the page cache.
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate(response).status_code, 304)
+
+    def test_not_modified_from_page_cache(self):
+        cache.clear()
+        response = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(response).status_code, 304)
+
+    def test_review_changes_tag(self):
+        response = self.client.get(self.url)
+        Review(
+            user=self.user,
+            recipe=self.recipe,
+            title='review',
+            body='a review',
+            score=2
+        ).save()
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_edit_changes_tag(self):
+        response = self.client.get(self.url)
+        self.recipe.title = 'new title'
+        self.recipe.save()
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_origin_rename_changes_tag(self):
+        """Derived recipes show their origin's title."""
+        derived = Recipe(
+            user=self.user,
+            title='derived',
+            description='a derived recipe',
+            ingredients='food',
+            directions='make it',
+            origin_recipe=self.recipe
+        )
+        derived.save()
+        self.url = reverse('view_recipe', args=[derived.id])
+        response = self.client.get(self.url)
+        self.assertEqual(self.revalidate(response).status_code, 304)
+        # Deriving bumped the origin's version in the database.
+        self.recipe.refresh_from_db()
+        self.recipe.title = 'renamed'
+        self.recipe.save()
+        # Answered by the view, not the page cache.
+        cache.clear()
+        response = self.revalidate(response)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'renamed')
+
+    def test_tag_varies_on_viewer(self):
+        response = self.client.get(self.url)
+        self.client.force_login(self.user)
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_membership_changes_tag(self):
+        book = RecipeBook(user=self.user, title='book', description='')
+        book.save()
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(self.revalidate(response).status_code, 304)
+        book.recipes.add(self.recipe)
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_recipebook_replaced_changes_tag(self):
+        """Deleting a book and creating one keeps the viewer's book count
+        and version sum, but not the tag."""
+        book = RecipeBook(user=self.user, title='old', description='')
+        book.save()
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        book.delete()
+        RecipeBook(user=self.user, title='new', description='').save()
+        self.assertEqual(self.revalidate(response).status_code, 200)
+
+    def test_missing_recipe(self):
+        url = reverse('view_recipe', args=[self.recipe.id + 1])
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -9,6 +9,7 @@ from .views import (
     ReviewsListView,
     DeriveRecipeView,
     DerivedRecipesListView,
+    RecipeLineageView,
 )
 
 urlpatterns = [
@@ -26,6 +27,9 @@ urlpatterns = [
     url(r'(?P<pk>[0-9]+)/derivations$',
         DerivedRecipesListView.as_view(),
         name='derived_recipes'),
+    url(r'(?P<pk>[0-9]+)/lineage$',
+        RecipeLineageView.as_view(),
+        name='recipe_lineage'),
     url(r'search', RecipeSearchView.as_view(), name='recipe_search'),
     url(r'(?P<pk>[0-9]+)/update_recipebooks',
         update_recipebooks_view,
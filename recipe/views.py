@@ -1,18 +1,53 @@
-import re
-from functools import reduce
 from django.urls import reverse, reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import (
      TemplateView, DetailView, CreateView, UpdateView, DeleteView
 )
-from django.http import HttpResponseRedirect, HttpResponseForbidden
-from utils.utils import paginate, ownership_dispatch
+from django.http import (
+    HttpResponseBadRequest, HttpResponseForbidden, HttpResponseRedirect,
+    JsonResponse
+)
+from django.contrib.auth.models import User
+from django.db.models import Count, Sum
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from utils.utils import (
+    ownership_dispatch, page_etag, paginate, paginate_by_cursor
+)
 from .models import Recipe, RecipeForm
-from recipebook.models import RecipeBook, RecipeBookForm
+from .search import get_words, search_recipes
+from recipebook.models import (
+    RecipeBookForm, owns_recipebooks, set_recipe_recipebooks
+)
 from review.models import ReviewForm
-from notification.models import Notification
-
-
+from notification.models import notify
+
+
+def recipe_etag(request, pk):
+    """ETag from the versions of the recipe and the one it derives from,
+    whose title it shows, and, for a logged in viewer, the versions of
+    the recipe books listed with their memberships.
+
+    The viewer's profile version changes as books are created and
+    deleted, which the count and sum of book versions can miss."""
+    versions = Recipe.objects.filter(pk=pk).values_list(
+        'version',
+        'origin_recipe_id',
+        'origin_recipe__version'
+    ).first()
+    if versions is None:
+        return None
+    stamps = list(versions)
+    if request.user.is_authenticated():
+        stamps.extend(User.objects.filter(pk=request.user.pk).annotate(
+            count=Count('recipebooks'),
+            versions=Sum('recipebooks__version')
+        ).values_list('profile__version', 'count', 'versions').first())
+    return page_etag(request, *stamps)
+
+
+@method_decorator(condition(etag_func=recipe_etag), name='dispatch')
 class RecipeDetailView(DetailView):
     """View that renders a recipe."""
     model = Recipe
@@ -21,15 +56,17 @@ class RecipeDetailView(DetailView):
     def get_context_data(self, **kwargs):
         """Attach necessary context."""
         context = super(RecipeDetailView, self).get_context_data(**kwargs)
-        context['ingredients'] = self.object.ingredients.split('\n')
-        context['directions'] = structureDirections(self.object.directions)
+        # Only evaluated when the cached recipe body must be rendered.
+        context['ingredients'] = self.object.get_ingredients
+        context['directions'] = self.object.get_directions
         context['own_recipe'] = self.object.user == self.request.user
         if self.request.user.is_authenticated():
-            recipebooks = self.request.user.recipebooks.all()
-            context['recipebooks'] = zip(
-                recipebooks,
-                (self.object in book.recipes.all() for book in recipebooks)
+            recipebooks = self.request.user.recipebooks.with_membership(
+                self.object
             )
+            context['recipebooks'] = [
+                (book, bool(book.contains_recipe)) for book in recipebooks
+            ]
         context['derive_form'] = RecipeForm(initial=self.object.__dict__)
         context['review_form'] = ReviewForm
         context['reviews'] = self.object.reviews.order_by('-date_created')[:5]
@@ -54,12 +91,10 @@ class RecipeCreateView(LoginRequiredMixin, CreateView):
         origin_recipe = Recipe.objects.filter(id=id).first()
         if origin_recipe:
             form.instance.origin_recipe = origin_recipe
-            Notification(
-                user=origin_recipe.user,
-                type='derive',
-                object_key=form.instance.id
-            ).save()
-        return super(RecipeCreateView, self).form_valid(form)
+        response = super(RecipeCreateView, self).form_valid(form)
+        if origin_recipe:
+            notify(origin_recipe.user_id, 'derive', form.instance.id)
+        return response
 
 
 class RecipeSearchView(TemplateView):
@@ -70,14 +105,8 @@ class RecipeSearchView(TemplateView):
         """Process and find matching objects for the query."""
         context = super(RecipeSearchView, self).get_context_data(**kwargs)
         query = self.request.GET.get('q', '')
-        cleaned = [w for w in query.split() if w[2:]]
-        if cleaned:
-            search_results = reduce(
-                lambda o, w: o.filter(title__icontains=w),
-                cleaned,
-                Recipe.objects.all()
-            )
-            context.update(paginate(self.request, search_results))
+        if get_words(query):
+            context.update(paginate(self.request, search_recipes(query)))
         context['query'] = query
         return context
 
@@ -105,10 +134,10 @@ class ReviewsListView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super(ReviewsListView, self).get_context_data(**kwargs)
-        context.update(paginate(
+        context.update(paginate_by_cursor(
             self.request,
-            self.object.reviews.order_by('-date_created'))
-        )
+            self.object.reviews.all()
+        ))
         return context
 
 
@@ -134,58 +163,49 @@ class DerivedRecipesListView(DetailView):
         context = super(
             DerivedRecipesListView, self
         ).get_context_data(**kwargs)
-        context.update(paginate(
+        context.update(paginate_by_cursor(
             self.request,
-            self.object.recipe_derivations.order_by('-date_created'))
+            self.object.recipe_derivations.for_listing()
+        ))
+        return context
+
+
+class RecipeLineageView(DetailView):
+    """View that shows a recipe's ancestors and its family tree."""
+    model = Recipe
+    template_name = 'recipe_lineage.html'
+
+    def get_context_data(self, **kwargs):
+        context = super(RecipeLineageView, self).get_context_data(**kwargs)
+        context['ancestors'] = self.object.get_ancestors().select_related(
+            'user'
+        )
+        family = self.object.get_family().select_related('user').only(
+            'id', 'title', 'lineage', 'derivation_count', 'user__username'
         )
+        context.update(paginate(self.request, family, per_page=50))
         return context
 
 
 def update_recipebooks_view(request, pk):
-    """View for updating recipebooks contain a recipe.
+    """View for updating which of the user's recipebooks contain a recipe.
 
-    For POST requests only. To be used internally for AJAX
-    requests."""
+    For POST requests only. AJAX requests get the book ids added and
+    removed as JSON instead of a redirect."""
     if request.method == 'POST':
-        books = request.POST.getlist('books')
-        recipe = Recipe.objects.filter(pk=pk).first()
         if request.user.is_anonymous():
             return HttpResponseRedirect(reverse('auth_login'))
-        elif any_recipebooks_user_mismatched(request.user, books):
+        try:
+            books = set(int(book) for book in request.POST.getlist('books'))
+        except ValueError:
+            return HttpResponseBadRequest()
+        if not owns_recipebooks(request.user, books):
             return HttpResponseForbidden()
-        recipe.recipebooks.set(books)
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        added, removed = set_recipe_recipebooks(recipe, request.user, books)
+        if request.is_ajax():
+            return JsonResponse(dict(
+                added=[str(book) for book in sorted(added)],
+                removed=[str(book) for book in sorted(removed)]
+            ))
     return HttpResponseRedirect(reverse('view_recipe', args=[pk]))
-
-
-def any_recipebooks_user_mismatched(user, book_pks):
-    """Check if recipebooks are all owned by user."""
-    for pk in book_pks:
-        book = RecipeBook.objects.filter(id=pk).first()
-        if book and book.user != user:
-            return True
-
-
-def splitDirectionLine(direction):
-    """Split a direction line into its summary and details."""
-    try:
-        t, d = direction.split('\n', 1)
-    except ValueError:
-        t, d = direction, ''
-    return dict(summary=t.strip(), details=d.strip())
-
-
-def removeNewlineWhitespace(s):
-    """Remove whitespace surrounding newlines.
-
-    Also remove \rs."""
-    return re.sub('[ \t]*\n[ \t]*', '\n', re.sub('\r', '', s))
-
-
-def structureDirections(directions):
-    """Structure directions.
-
-    Directions are entered like:
-    <direction summary>\n<direction details>...
-    """
-    directionLines = removeNewlineWhitespace(directions).split('\n\n')
-    return map(splitDirectionLine, directionLines)
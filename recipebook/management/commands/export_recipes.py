@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from recipe.models import Recipe
+from recipebook.models import RecipeBook
+from recipebook.transfer import export_lines
+
+
+class Command(BaseCommand):
+    help = 'Write recipes and recipe books as JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Export only the recipes and books of this username.'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write, or - for standard output.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of rows to read per query.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        books = RecipeBook.objects.all()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(
+                    'No user named {}.'.format(options['user'])
+                )
+            recipes = recipes.filter(user=user)
+            books = books.filter(user=user)
+        lines = export_lines(recipes, books, options['chunk_size'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            f.writelines(lines)
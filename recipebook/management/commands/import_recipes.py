@@ -0,0 +1,52 @@
+import sys
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from recipebook.transfer import TransferError, import_lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Create recipes and recipe books from JSON Lines, as written by '
+        'export_recipes. Everything is imported or nothing is.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='File to read, or - for standard input.'
+        )
+        parser.add_argument(
+            '--user',
+            help='Give every row to this username instead of the users '
+                 'named in the file.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rows to insert per query.'
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(
+                    'No user named {}.'.format(options['user'])
+                )
+        try:
+            if options['input'] == '-':
+                counts = import_lines(
+                    sys.stdin, user, options['batch_size']
+                )
+            else:
+                with open(options['input'], encoding='utf-8') as f:
+                    counts = import_lines(
+                        f, user, options['batch_size']
+                    )
+        except TransferError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Imported {recipes} recipes and {recipebooks} '
+                          'recipe books.'.format(**counts))
+
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:29
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipebook', '0004_auto_20170329_1700'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='recipebook',
+            index_together=set([('user', 'date_created', 'id')]),
+        ),
+    ]
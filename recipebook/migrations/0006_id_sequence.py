@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from ids.models import create_sequence
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ids', '0001_initial'),
+        ('recipebook', '0005_auto_20261018_1829'),
+    ]
+
+    operations = [
+        create_sequence('recipebook'),
+    ]
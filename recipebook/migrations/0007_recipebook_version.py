@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 19:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipebook', '0006_id_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipebook',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -1,19 +1,45 @@
-from random import randint
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.forms import ModelForm
 from django.urls import reverse
+from ids.allocator import IdAllocator
 from recipe.models import Recipe
+from user_profile.models import bump_profile_version
+from utils.page_cache import invalidate_pages, profile_tag
 
 
-def create_unique_urlindex(lower_bound=100000000):
-    """Creates a unique urlindex.
+def create_unique_urlindex():
+    """Return an unused public id for a new recipe book."""
+    return recipebook_ids.allocate()
 
-    Ensures the generated value is not already a urlindex."""
-    while True:
-        i = randint(lower_bound, lower_bound*10-1)
-        if not Recipe.objects.filter(id=i).exists():
-            return i
+
+class RecipeBookQuerySet(models.QuerySet):
+    def with_membership(self, recipe):
+        """Annotate each book with whether it contains `recipe`.
+
+        The check is an EXISTS over the membership table in the same
+        query, so no book's recipes are loaded."""
+        field = RecipeBook._meta.get_field('recipes')
+        sql = (
+            'EXISTS (SELECT 1 FROM {through} '
+            'WHERE {through}.{book_column} = {books}.{pk} '
+            'AND {through}.{recipe_column} = %s)'
+        ).format(
+            through=field.m2m_db_table(),
+            book_column=field.m2m_column_name(),
+            recipe_column=field.m2m_reverse_name(),
+            books=RecipeBook._meta.db_table,
+            pk=RecipeBook._meta.pk.column
+        )
+        return self.annotate(contains_recipe=RawSQL(
+            sql,
+            (recipe.pk,),
+            output_field=models.BooleanField()
+        ))
 
 
 class RecipeBook(models.Model):
@@ -35,6 +61,25 @@ class RecipeBook(models.Model):
         related_name='recipebooks'
     )
     date_created = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the book or its memberships change.
+    version = models.PositiveIntegerField(default=1)
+
+    objects = RecipeBookQuerySet.as_manager()
+
+    class Meta:
+        index_together = [('user', 'date_created', 'id')]
+
+    def save(self, *args, **kwargs):
+        # A new row's allocated id is unused, so skip the UPDATE Django
+        # would otherwise try first because the primary key is set.
+        if self.pk is None:
+            self.pk = create_unique_urlindex()
+        if self._state.adding and not kwargs.get('force_update'):
+            kwargs.setdefault('force_insert', True)
+        if not self._state.adding:
+            # Memberships bump the row without touching this instance.
+            self.version = F('version') + 1
+        super(RecipeBook, self).save(*args, **kwargs)
 
     def __str__(self):
         return self.title
@@ -43,9 +88,108 @@ class RecipeBook(models.Model):
         return reverse('view_recipebook', args=[str(self.id)])
 
 
+recipebook_ids = IdAllocator('recipebook', 'recipebook.RecipeBook')
+
+
+def owns_recipebooks(user, book_ids):
+    """Return whether `user` owns every one of `book_ids`.
+
+    One COUNT over all the ids; missing books count as not owned."""
+    book_ids = set(book_ids)
+    if not book_ids:
+        return True
+    return RecipeBook.objects.filter(
+        pk__in=book_ids,
+        user=user
+    ).count() == len(book_ids)
+
+
+def set_recipe_recipebooks(recipe, user, book_ids):
+    """Put `recipe` in exactly `book_ids` out of `user`'s recipe books.
+
+    Other users' books are left alone. Only the difference from the
+    current memberships is written, with one DELETE and one bulk INSERT,
+    and m2m_changed is sent as for `recipe.recipebooks.add()` and
+    `remove()`. Returns the sets of book ids added and removed."""
+    through = RecipeBook.recipes.through
+    db = router.db_for_write(through, instance=recipe)
+    book_ids = set(book_ids)
+    with transaction.atomic(using=db):
+        # Diff against the rows being written, not a read replica.
+        current = set(through.objects.using(db).filter(
+            recipe_id=recipe.pk,
+            recipebook__user=user
+        ).values_list('recipebook_id', flat=True))
+        added = book_ids - current
+        removed = current - book_ids
+        if removed:
+            send_membership_changed(recipe, 'pre_remove', removed, db)
+            through.objects.using(db).filter(
+                recipe_id=recipe.pk,
+                recipebook_id__in=removed
+            ).delete()
+            send_membership_changed(recipe, 'post_remove', removed, db)
+        if added:
+            send_membership_changed(recipe, 'pre_add', added, db)
+            through.objects.using(db).bulk_create(
+                through(recipe_id=recipe.pk, recipebook_id=book_id)
+                for book_id in added
+            )
+            send_membership_changed(recipe, 'post_add', added, db)
+    return added, removed
+
+
+def send_membership_changed(recipe, action, book_ids, db):
+    m2m_changed.send(
+        sender=RecipeBook.recipes.through,
+        action=action,
+        instance=recipe,
+        reverse=True,
+        model=RecipeBook,
+        pk_set=book_ids,
+        using=db
+    )
+
+
 class RecipeBookForm(ModelForm):
     """Form for creating a new, empty recipebook."""
 
     class Meta:
         model = RecipeBook
         fields = ['title', 'description']
+
+    def __init__(self, *args, **kwargs):
+        # Pages render these forms on every view; leave the id of a new
+        # recipe book unset until it is saved rather than allocate one.
+        if kwargs.get('instance') is None:
+            kwargs['instance'] = RecipeBook(id=None)
+        super(RecipeBookForm, self).__init__(*args, **kwargs)
+
+
+def bump_recipebook_versions(book_ids):
+    RecipeBook.objects.filter(pk__in=book_ids).update(
+        version=F('version') + 1
+    )
+
+
+@receiver(m2m_changed, sender=RecipeBook.recipes.through)
+def change_recipebook_membership(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump_recipebook_versions([instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        bump_recipebook_versions(pk_set)
+    elif action == 'pre_clear':
+        bump_recipebook_versions(list(
+            instance.recipebooks.values_list('pk', flat=True)
+        ))
+
+
+@receiver(post_save, sender=RecipeBook)
+@receiver(post_delete, sender=RecipeBook)
+def change_recipebook(sender, instance, raw=False, **kwargs):
+    # Profiles list their owner's latest books.
+    if not raw:
+        bump_profile_version(instance.user_id)
+        invalidate_pages(profile_tag(instance.user.username))
@@ -1,9 +1,17 @@
 import json
+import os
+import tempfile
+from io import StringIO
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.urls import reverse
 from django.test import TestCase
+from ranking.models import RecipeRanking
 from recipe.models import Recipe
 from .models import RecipeBook
+from .transfer import TransferError, export_lines, import_lines
 
 
 class RecipeBookCreateViewTests(TestCase):
@@ -151,6 +159,40 @@ class RecipeBookDetailViewTests(RecipeBookTestCase):
         self.assertContains(self.client.get(p3), title, 10)
 
 
+class RecipeBookConditionalGetTests(RecipeBookTestCase):
+    """Test unchanged recipe book pages are answered with 304."""
+
+    def setUp(self):
+        super(RecipeBookConditionalGetTests, self).setUp()
+        self.url = reverse('view_recipebook', args=[self.recipebook.id])
+        self.response = self.client.get(self.url)
+
+    def revalidate(self):
+        return self.client.get(
+            self.url,
+            HTTP_IF_NONE_MATCH=self.response['ETag']
+        ).status_code
+
+    def test_not_modified(self):
+        # The stamps, then the session and user.
+        with self.assertNumQueries(3):
+            self.assertEqual(self.revalidate(), 304)
+
+    def test_membership_changes_tag(self):
+        self.recipebook.recipes.remove(self.recipes[0])
+        self.assertEqual(self.revalidate(), 200)
+
+    def test_recipe_edit_changes_tag(self):
+        self.recipes[0].title = 'new title'
+        self.recipes[0].save()
+        self.assertEqual(self.revalidate(), 200)
+
+    def test_book_edit_changes_tag(self):
+        self.recipebook.title = 'new title'
+        self.recipebook.save()
+        self.assertEqual(self.revalidate(), 200)
+
+
 class RecipeBookUpdateViewTests(RecipeBookTestCase):
     """Tests for view for updating recipe book."""
 
@@ -276,3 +318,196 @@ class RecipeBookAjaxCreateTests(TestCase):
         count = RecipeBook.objects.count()
         self.client.post(self.url, dict(title='hi', description='there'))
         self.assertEqual(RecipeBook.objects.count(), count)
+
+
+class RecipeTransferTests(TestCase):
+    """Tests for JSON Lines import and export."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='ann')
+        self.other = User.objects.create(username='bob')
+        self.original = Recipe.objects.create(
+            user=self.other,
+            title='original',
+            description='description',
+            ingredients='1 egg',
+            directions='cook'
+        )
+        self.recipes = [self.create_recipe('first', self.original)]
+        for i in range(4):
+            self.recipes.append(
+                self.create_recipe('recipe#{}'.format(i), self.recipes[-1])
+            )
+        self.book = RecipeBook.objects.create(user=self.user, title='book')
+        self.book.recipes.add(self.original, *self.recipes[:3])
+        self.empty_book = RecipeBook.objects.create(
+            user=self.user,
+            title='empty'
+        )
+
+    def create_recipe(self, title, origin=None):
+        return Recipe.objects.create(
+            user=self.user,
+            title=title,
+            description='description',
+            ingredients='2 cups milk',
+            directions='stir\nwell',
+            origin_recipe=origin
+        )
+
+    def export(self, chunk_size=2):
+        return list(export_lines(
+            self.user.recipes.all(),
+            self.user.recipebooks.all(),
+            chunk_size
+        ))
+
+    def test_export(self):
+        records = [json.loads(line) for line in self.export()]
+        self.assertEqual(
+            [r['title'] for r in records],
+            ['first', 'recipe#0', 'recipe#1', 'recipe#2', 'recipe#3',
+             'book', 'empty']
+        )
+        self.assertEqual(records[0]['origin'], self.original.pk)
+        self.assertEqual(records[1]['origin'], self.recipes[0].pk)
+        self.assertEqual(
+            set(records[5]['recipes']),
+            set([self.original.pk] + [r.pk for r in self.recipes[:3]])
+        )
+        self.assertEqual(records[6]['recipes'], [])
+
+    def test_export_queries_per_chunk(self):
+        """Rows are read a chunk at a time, not one query per row."""
+        with self.assertNumQueries(4 + 2):
+            self.export(chunk_size=2)
+
+    def test_round_trip(self):
+        lines = self.export()
+        counts = import_lines(lines, user=self.other, batch_size=2)
+        self.assertEqual(counts, dict(recipes=5, recipebooks=2))
+        copies = self.other.recipes.exclude(pk=self.original.pk)
+        self.assertEqual(copies.count(), 5)
+        by_title = dict((r.title, r) for r in copies)
+        # Links inside the import point at the imported copies...
+        self.assertEqual(
+            by_title['recipe#0'].origin_recipe_id,
+            by_title['first'].pk
+        )
+        # ...and links outside it at the existing recipe.
+        self.assertEqual(
+            by_title['first'].origin_recipe_id,
+            self.original.pk
+        )
+        book = self.other.recipebooks.get(title='book')
+        self.assertEqual(
+            set(book.recipes.values_list('title', flat=True)),
+            {'original', 'first', 'recipe#0', 'recipe#1'}
+        )
+        self.assertEqual(
+            by_title['first'].get_ingredients(),
+            ['2 cups milk']
+        )
+        self.assertEqual(
+            list(by_title['recipe#1'].get_ancestors()),
+            [self.original, by_title['first'], by_title['recipe#0']]
+        )
+        self.assertEqual(by_title['first'].derivation_count, 1)
+        self.assertEqual(
+            Recipe.objects.get(pk=self.original.pk).derivation_count,
+            2
+        )
+
+    def test_forward_origin(self):
+        """Origins later in the file are linked once they are imported."""
+        lines = self.export()
+        self.user.recipes.all().delete()
+        import_lines(reversed(lines[:5]), user=self.other, batch_size=2)
+        copies = dict(
+            (r.title, r) for r in self.other.recipes.exclude(
+                pk=self.original.pk
+            )
+        )
+        self.assertEqual(
+            copies['recipe#3'].origin_recipe_id,
+            copies['recipe#2'].pk
+        )
+        self.assertEqual(
+            list(copies['recipe#3'].get_ancestors()),
+            [self.original, copies['first'], copies['recipe#0'],
+             copies['recipe#1'], copies['recipe#2']]
+        )
+        self.assertEqual(copies['recipe#2'].derivation_count, 1)
+        self.assertEqual(
+            Recipe.objects.get(pk=self.original.pk).derivation_count,
+            1
+        )
+
+    def test_users_by_name(self):
+        import_lines(self.export())
+        self.assertEqual(self.user.recipes.count(), 10)
+        self.assertEqual(self.user.recipebooks.count(), 4)
+
+    def test_imports_fill_feeds(self):
+        import_lines(self.export(), user=self.other)
+        self.assertEqual(self.other.feed_entries.count(), 6)
+
+    def test_imports_ranked(self):
+        import_lines(self.export(), user=self.other)
+        ranked = RecipeRanking.objects.filter(recipe__user=self.other)
+        self.assertEqual(ranked.exclude(pk=self.original.pk).count(), 5)
+
+    def test_imports_invalidate_pages(self):
+        cache.clear()
+        url = reverse('profile', args=[self.other.username])
+        self.assertNotContains(self.client.get(url), 'recipe#0')
+        import_lines(self.export(), user=self.other)
+        self.assertContains(self.client.get(url), 'recipe#0')
+
+    def test_invalid_values(self):
+        record = json.loads(self.export()[0])
+        for field, value, message in (
+                ('title', 'x' * 51, 'title must be at most 50 characters'),
+                ('description', 1, 'description must be a string'),
+                ('id', '1', 'id must be an integer'),
+                ('origin', [], 'origin must be an integer or null')):
+            line = json.dumps(dict(record, **{field: value}))
+            with self.assertRaisesMessage(TransferError, message):
+                import_lines([line], user=self.other)
+        self.assertEqual(self.other.recipes.count(), 1)
+
+    def test_unknown_user(self):
+        lines = self.export()
+        self.user.delete()
+        with self.assertRaisesMessage(TransferError, "line 1: unknown user"):
+            import_lines(lines)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_invalid_line(self):
+        with self.assertRaisesMessage(TransferError, 'line 2: unknown type'):
+            import_lines(self.export()[:1] + ['{"type": "cake"}'])
+        self.assertEqual(Recipe.objects.count(), 6)
+
+    def test_commands(self):
+        path = os.path.join(tempfile.mkdtemp(), 'recipes.jsonl')
+        call_command('export_recipes', user='ann', output=path)
+        out = StringIO()
+        call_command('import_recipes', path, user='bob', stdout=out)
+        self.assertIn('Imported 5 recipes and 2 recipe books', out.getvalue())
+        self.assertEqual(self.other.recipes.count(), 6)
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, user='nobody')
+
+    def test_export_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('export_recipes'))
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body, ''.join(self.export()))
+
+    def test_export_view_anonymous(self):
+        response = self.client.get(reverse('export_recipes'))
+        self.assertRedirects(
+            response, reverse('auth_login'), fetch_redirect_response=False
+        )
@@ -0,0 +1,385 @@
+"""Import and export of recipes and recipe books as JSON Lines.
+
+Each line is one object. Recipes come first, oldest first, then books:
+
+    {"type": "recipe", "id": 1, "user": "ann", "title": ..., "description":
+     ..., "ingredients": ..., "directions": ..., "origin": null}
+    {"type": "recipebook", "id": 2, "user": "ann", "title": ...,
+     "description": ..., "recipes": [1]}
+
+Ids are those of the exporting site. Imports give every row a new id and
+rewrite `origin` and book memberships to match. Both directions read and
+write in batches, so memory does not grow with the number of rows, apart
+from maps of old to new recipe ids and lineages kept while importing.
+"""
+import json
+from collections import Counter
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from feed.models import create_entries, get_audience
+from ranking.models import (
+    RecipeRanking, bayesian_rating, decayed, record_event
+)
+from recipe.lineage import lineage_for, move_subtree
+from recipe.models import Recipe, recipe_ids
+from recipe.parsing import compile_recipe
+from user_profile.models import bump_profile_version
+from utils.page_cache import (
+    LISTING_TAG, invalidate_pages, profile_tag, recipe_tag
+)
+from utils.utils import cursor_filter
+from .models import RecipeBook, recipebook_ids
+
+
+RECIPE_FIELDS = ('title', 'description', 'ingredients', 'directions')
+
+BOOK_FIELDS = ('title', 'description')
+
+
+class TransferError(ValueError):
+    """An import line could not be read, holds an invalid value or refers
+    to a missing user."""
+
+    def __init__(self, number, message):
+        super(TransferError, self).__init__(
+            'line {}: {}'.format(number, message)
+        )
+
+
+def chunked(queryset, fields, order=('date_created', 'id'), chunk_size=500):
+    """Yield `values()` dicts of a queryset, fetched a chunk at a time.
+
+    Chunks are read with keyset filters on `order`, so each is an
+    index seek no matter how far into the table it starts."""
+    last = None
+    while True:
+        chunk = queryset.order_by(*order)
+        if last is not None:
+            chunk = chunk.filter(cursor_filter(order, False, last))
+        rows = list(chunk.values(*(fields + order))[:chunk_size])
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        last = [rows[-1][field] for field in order]
+
+
+def export_lines(recipes, books, chunk_size=500):
+    """Yield JSON lines for a queryset each of recipes and books."""
+    fields = ('id', 'user__username', 'origin_recipe_id') + RECIPE_FIELDS
+    for row in chunked(recipes, fields, chunk_size=chunk_size):
+        yield dump(dict(
+            type='recipe',
+            id=row['id'],
+            user=row['user__username'],
+            origin=row['origin_recipe_id'],
+            **dict((field, row[field]) for field in RECIPE_FIELDS)
+        ))
+    batch = []
+    fields = ('id', 'user__username') + BOOK_FIELDS
+    for row in chunked(books, fields, chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) == chunk_size:
+            yield from export_books(batch)
+            batch = []
+    yield from export_books(batch)
+
+
+def export_books(rows):
+    """Yield JSON lines for book rows, with their recipes in one query."""
+    if not rows:
+        return
+    through = RecipeBook.recipes.through
+    members = dict((row['id'], []) for row in rows)
+    pairs = through.objects.filter(
+        recipebook_id__in=list(members)
+    ).order_by('id').values_list('recipebook_id', 'recipe_id')
+    for book_id, recipe_id in pairs:
+        members[book_id].append(recipe_id)
+    for row in rows:
+        yield dump(dict(
+            type='recipebook',
+            id=row['id'],
+            user=row['user__username'],
+            recipes=members[row['id']],
+            **dict((field, row[field]) for field in BOOK_FIELDS)
+        ))
+
+
+def dump(record):
+    return json.dumps(record, sort_keys=True) + '\n'
+
+
+class Importer(object):
+    """Insert recipes and books from parsed lines, a batch at a time.
+
+    Rows go to `user` if given, and otherwise to the user named in each
+    line, who must exist. A recipe's origin, or a book's recipe, that is
+    not in the import is linked to the existing recipe with that id, if
+    any, so exports from this site keep links to other users' recipes.
+    New recipes are added to feeds and rankings, and cached pages
+    showing them are invalidated; derive notifications are not sent.
+    """
+
+    def __init__(self, user=None, batch_size=500):
+        self.user = user
+        self.batch_size = batch_size
+        self.recipe_ids = {}
+        self.imported = set()
+        self.lineages = {}
+        self.derivations = Counter()
+        self.forward_origins = []
+        self.users = {}
+        self.audiences = {}
+        self.owners = set()
+        self.counts = dict(recipes=0, recipebooks=0)
+
+    def run(self, lines):
+        """Import every line; returns counts of rows created."""
+        kind = None
+        batch = []
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            record = self.parse(number, line)
+            if batch and (record['type'] != kind or
+                          len(batch) == self.batch_size):
+                self.flush(kind, batch)
+                batch = []
+            kind = record['type']
+            batch.append((number, record))
+        if batch:
+            self.flush(kind, batch)
+        self.count_derivations()
+        self.link_forward_origins()
+        self.invalidate()
+        return self.counts
+
+    def parse(self, number, line):
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise TransferError(number, 'invalid JSON ({})'.format(e))
+        if not isinstance(record, dict):
+            raise TransferError(number, 'expected an object')
+        if record.get('type') == 'recipe':
+            model, fields = Recipe, RECIPE_FIELDS
+        elif record.get('type') == 'recipebook':
+            model, fields = RecipeBook, BOOK_FIELDS
+        else:
+            raise TransferError(number, 'unknown type {!r}'.format(
+                record.get('type')
+            ))
+        missing = [f for f in ('id',) + fields if f not in record]
+        if missing:
+            raise TransferError(number, 'missing ' + ', '.join(missing))
+        self.check(number, record, model, fields)
+        return record
+
+    def check(self, number, record, model, fields):
+        """Reject values the database would, before any are inserted."""
+        def invalid(field, expected):
+            raise TransferError(number, '{} must be {}'.format(
+                field, expected
+            ))
+        for field in fields:
+            if not isinstance(record[field], str):
+                invalid(field, 'a string')
+            max_length = model._meta.get_field(field).max_length
+            if max_length and len(record[field]) > max_length:
+                invalid(field, 'at most {} characters'.format(max_length))
+        if not is_id(record['id']):
+            invalid('id', 'an integer')
+        if not isinstance(record.get('user', ''), str):
+            invalid('user', 'a string')
+        origin = record.get('origin')
+        if origin is not None and not is_id(origin):
+            invalid('origin', 'an integer or null')
+        recipes = record.get('recipes', [])
+        if not (isinstance(recipes, list) and all(map(is_id, recipes))):
+            invalid('recipes', 'a list of integers')
+
+    def flush(self, kind, batch):
+        self.load_users(batch)
+        with transaction.atomic():
+            if kind == 'recipe':
+                self.create_recipes(batch)
+            else:
+                self.create_books(batch)
+
+    def load_users(self, batch):
+        if self.user is not None:
+            return
+        names = set(record.get('user') for _, record in batch)
+        names.difference_update(self.users)
+        if names:
+            self.users.update(User.objects.filter(
+                username__in=names
+            ).values_list('username', 'id'))
+        for number, record in batch:
+            if record.get('user') not in self.users:
+                raise TransferError(number, 'unknown user {!r}'.format(
+                    record.get('user')
+                ))
+
+    def user_id(self, record):
+        if self.user is not None:
+            self.owners.add((self.user.pk, self.user.username))
+            return self.user.pk
+        self.owners.add((self.users[record['user']], record['user']))
+        return self.users[record['user']]
+
+    def existing_recipes(self, ids):
+        """Return the lineages of recipes here among `ids`, by id.
+
+        Ids of imported recipes are left out."""
+        ids = set(pk for pk in ids if isinstance(pk, int))
+        ids.difference_update(self.recipe_ids)
+        ids = sorted(ids)
+        found = {}
+        for start in range(0, len(ids), self.batch_size):
+            found.update(Recipe.objects.filter(
+                pk__in=ids[start:start + self.batch_size]
+            ).values_list('pk', 'lineage'))
+        return found
+
+    def create_recipes(self, batch):
+        new_ids = recipe_ids.allocate_many(len(batch))
+        self.imported.update(new_ids)
+        existing = self.existing_recipes(
+            record.get('origin') for _, record in batch
+        )
+        recipes = []
+        for (_, record), pk in zip(batch, new_ids):
+            origin = record.get('origin')
+            if origin in self.recipe_ids:
+                origin = self.recipe_ids[origin]
+                origin_lineage = self.lineages[origin]
+            elif origin in existing:
+                origin_lineage = existing[origin]
+            else:
+                if origin is not None:
+                    # Possibly a recipe later in the import.
+                    self.forward_origins.append((pk, origin))
+                origin = None
+                origin_lineage = ''
+            self.recipe_ids[record['id']] = pk
+            self.lineages[pk] = lineage_for(pk, origin_lineage)
+            if origin is not None:
+                self.derivations[origin] += 1
+            recipe = Recipe(
+                id=pk,
+                user_id=self.user_id(record),
+                origin_recipe_id=origin,
+                version=1,
+                lineage=self.lineages[pk],
+                **dict((field, record[field]) for field in RECIPE_FIELDS)
+            )
+            recipe.compiled = compile_recipe(
+                recipe.ingredients,
+                recipe.directions
+            )
+            recipes.append(recipe)
+        Recipe.objects.bulk_create(recipes)
+        self.fan_out(recipes)
+        self.rank(recipes)
+        self.counts['recipes'] += len(recipes)
+
+    def fan_out(self, recipes):
+        """Add recipes to feeds, as saving each one would have."""
+        by_author = {}
+        for recipe in recipes:
+            by_author.setdefault(recipe.user_id, []).append(
+                (recipe.pk, recipe.date_created)
+            )
+        for author, entries in by_author.items():
+            if author not in self.audiences:
+                self.audiences[author] = get_audience(author)
+            create_entries(self.audiences[author], entries)
+
+    def rank(self, recipes):
+        """Add recipes to the rankings, as saving each one would have."""
+        RecipeRanking.objects.bulk_create([
+            RecipeRanking(
+                recipe_id=recipe.pk,
+                rating=bayesian_rating(0, 0),
+                trending=decayed('recipe', recipe.date_created)
+            )
+            for recipe in recipes
+        ])
+
+    def count_derivations(self):
+        """Add the imported derivations to their origins' counts."""
+        by_count = {}
+        for origin, count in self.derivations.items():
+            by_count.setdefault(count, []).append(origin)
+        for count, origins in by_count.items():
+            for start in range(0, len(origins), self.batch_size):
+                Recipe.objects.filter(
+                    pk__in=origins[start:start + self.batch_size]
+                ).update(
+                    derivation_count=F('derivation_count') + count,
+                    version=F('version') + 1
+                )
+                for origin in origins:
+                    record_event(origin, 'derivation', count=count)
+
+    def link_forward_origins(self):
+        for pk, origin in self.forward_origins:
+            if origin in self.recipe_ids:
+                move_subtree(Recipe, pk, self.recipe_ids[origin])
+
+    def invalidate(self):
+        """Change the versions and cache stamps of the pages showing the
+        imported rows, once the import commits."""
+        tags = [LISTING_TAG]
+        for user_id, username in sorted(self.owners):
+            bump_profile_version(user_id)
+            tags.append(profile_tag(username))
+        # Their derivation counts changed.
+        tags.extend(recipe_tag(pk) for pk in self.derivations)
+        invalidate_pages(*tags)
+
+    def create_books(self, batch):
+        new_ids = recipebook_ids.allocate_many(len(batch))
+        existing = self.existing_recipes(
+            pk for _, record in batch for pk in record.get('recipes', ())
+        )
+        books = []
+        members = []
+        for (number, record), pk in zip(batch, new_ids):
+            books.append(RecipeBook(
+                id=pk,
+                user_id=self.user_id(record),
+                **dict((field, record[field]) for field in BOOK_FIELDS)
+            ))
+            seen = set()
+            for recipe_id in record.get('recipes', ()):
+                recipe_id = self.recipe_ids.get(recipe_id, recipe_id)
+                if recipe_id in seen:
+                    continue
+                if recipe_id in existing or recipe_id in self.imported:
+                    seen.add(recipe_id)
+                    members.append(RecipeBook.recipes.through(
+                        recipebook_id=pk,
+                        recipe_id=recipe_id
+                    ))
+        RecipeBook.objects.bulk_create(books)
+        RecipeBook.recipes.through.objects.bulk_create(
+            members,
+            batch_size=self.batch_size
+        )
+        self.counts['recipebooks'] += len(books)
+
+
+def is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def import_lines(lines, user=None, batch_size=500):
+    """Import JSON lines from an iterable, in one transaction.
+
+    Returns a dict of the numbers of recipes and books created."""
+    with transaction.atomic():
+        return Importer(user, batch_size).run(lines)
@@ -5,9 +5,12 @@ from django.views.generic import (
     UpdateView,
     DeleteView
 )
+from django.db.models import Count, Sum
 from django.urls import reverse
 from django.contrib.auth.mixins import LoginRequiredMixin
-from utils.utils import paginate, ownership_dispatch
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from utils.utils import ownership_dispatch, page_etag, paginate
 from .models import RecipeBook, RecipeBookForm
 
 
@@ -29,13 +32,28 @@ class RecipeBookCreateView(LoginRequiredMixin, CreateView):
         )
 
 
+def recipebook_etag(request, pk):
+    """ETag from the book's version and its recipes' versions."""
+    stamps = RecipeBook.objects.filter(pk=pk).annotate(
+        count=Count('recipes'),
+        versions=Sum('recipes__version')
+    ).values_list('version', 'count', 'versions').first()
+    if stamps is None:
+        return None
+    return page_etag(request, *stamps)
+
+
+@method_decorator(condition(etag_func=recipebook_etag), name='dispatch')
 class RecipeBookDetailView(DetailView):
     model = RecipeBook
     template_name = 'view_recipebook.html'
 
     def get_context_data(self, **kwargs):
         context = super(RecipeBookDetailView, self).get_context_data(**kwargs)
-        context.update(paginate(self.request, self.object.recipes.all()))
+        context.update(paginate(
+            self.request,
+            self.object.recipes.for_listing()
+        ))
         context['own_recipebook'] = self.object.user == self.request.user
         context['recipebook_form'] = RecipeBookForm
         return context
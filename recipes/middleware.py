@@ -0,0 +1,269 @@
+import json
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+from utils.page_cache import (
+    cache_page, get_cached_page, page_response, resolve_cached_page
+)
+from .routers import primary_reads, routing
+
+
+logger = logging.getLogger('recipes.performance')
+
+PIN_COOKIE = 'use_primary'
+
+REQUEST_STATS = {}
+
+_stats_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a view runs more queries than its budget allows."""
+
+
+def get_query_budget(url_name):
+    """Return the query budget for a URL name, or None for no budget."""
+    default = getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(url_name, default)
+
+
+def get_cache_tables():
+    """Return the tables of the caches kept in the database."""
+    return [
+        config['LOCATION'] for config in settings.CACHES.values()
+        if config['BACKEND'].endswith('.DatabaseCache')
+    ]
+
+
+def split_cache_queries(logged, names, queries, cache_queries):
+    """Add logged queries to `queries`, or to `cache_queries` if they use
+    one of the quoted cache table `names`.
+
+    A savepoint opened just before, or released just after, a cache
+    query is the cache's too: DatabaseCache writes in atomic blocks."""
+    def is_cache(i):
+        return (0 <= i < len(logged) and
+                any(name in logged[i]['sql'] for name in names))
+    for i, query in enumerate(logged):
+        opened = query['sql'].startswith('SAVEPOINT')
+        closed = query['sql'].startswith(
+            ('RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+        )
+        if (is_cache(i) or opened and is_cache(i + 1) or
+                closed and is_cache(i - 1)):
+            cache_queries.append(query)
+        else:
+            queries.append(query)
+
+
+def record_request_stats(url_name, metrics):
+    """Add one request's metrics to the totals for its URL name."""
+    with _stats_lock:
+        stats = REQUEST_STATS.setdefault(url_name, dict(
+            requests=0,
+            queries=0,
+            max_queries=0,
+            db_ms=0.0,
+            template_ms=0.0,
+            total_ms=0.0,
+            max_total_ms=0.0,
+        ))
+        stats['requests'] += 1
+        stats['queries'] += metrics['queries']
+        stats['max_queries'] = max(stats['max_queries'], metrics['queries'])
+        stats['db_ms'] += metrics['db_ms']
+        stats['template_ms'] += metrics['template_ms']
+        stats['total_ms'] += metrics['total_ms']
+        stats['max_total_ms'] = max(
+            stats['max_total_ms'],
+            metrics['total_ms']
+        )
+
+
+def get_request_stats():
+    """Return a copy of the per URL name totals, with averages added."""
+    with _stats_lock:
+        stats = dict((name, dict(s)) for name, s in REQUEST_STATS.items())
+    for s in stats.values():
+        for key in ('queries', 'db_ms', 'template_ms', 'total_ms'):
+            s['avg_' + key] = s[key] / s['requests']
+    return stats
+
+
+def reset_request_stats():
+    with _stats_lock:
+        REQUEST_STATS.clear()
+
+
+def format_server_timing(metrics):
+    return ', '.join([
+        'db;dur={:.1f};desc="{} queries"'.format(
+            metrics['db_ms'],
+            metrics['queries']
+        ),
+        'tpl;dur={:.1f}'.format(metrics['template_ms']),
+        'total;dur={:.1f}'.format(metrics['total_ms']),
+    ])
+
+
+class PerformanceMiddleware(object):
+    """Measure queries, database time and render time for each request.
+
+    Metrics are sent as a Server-Timing header and a JSON log line on
+    the `recipes.performance` logger, added to per URL name totals (see
+    `get_request_stats`), and checked against `QUERY_BUDGETS`. A request
+    over budget logs a warning, or raises `QueryBudgetExceeded` when
+    `QUERY_BUDGET_RAISE` is set, as it is in development and tests.
+
+    Queries are timed with Django's debug cursor, the one used to fill
+    `connection.queries` when DEBUG is on. Those of a database cache are
+    counted apart, as `cache_queries`, and do not count against budgets.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.performance = dict(template_ms=0.0)
+        saved = []
+        for connection in connections.all():
+            saved.append((
+                connection,
+                connection.force_debug_cursor,
+                len(connection.queries_log)
+            ))
+            connection.force_debug_cursor = True
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            total_ms = (time.perf_counter() - start) * 1000
+            queries = []
+            cache_queries = []
+            tables = get_cache_tables()
+            for connection, force_debug_cursor, logged in saved:
+                connection.force_debug_cursor = force_debug_cursor
+                split_cache_queries(
+                    list(connection.queries_log)[logged:],
+                    [connection.ops.quote_name(table) for table in tables],
+                    queries,
+                    cache_queries
+                )
+        match = request.resolver_match
+        metrics = dict(
+            url_name=match.url_name if match else None,
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+            queries=len(queries),
+            cache_queries=len(cache_queries),
+            db_ms=round(sum(
+                float(q['time']) for q in queries + cache_queries
+            ) * 1000, 2),
+            template_ms=round(request.performance['template_ms'], 2),
+            total_ms=round(total_ms, 2),
+        )
+        response.performance = metrics
+        response['Server-Timing'] = format_server_timing(metrics)
+        record_request_stats(metrics['url_name'], metrics)
+        self.check_budget(metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        # Being the outermost middleware, this runs last, just before
+        # the response is rendered.
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.performance['template_ms'] += (
+                (time.perf_counter() - start) * 1000
+            )
+        response.add_post_render_callback(rendered)
+        return response
+
+    def check_budget(self, metrics):
+        budget = get_query_budget(metrics['url_name'])
+        metrics['query_budget'] = budget
+        if budget is None or metrics['queries'] <= budget:
+            logger.info(json.dumps(metrics, sort_keys=True))
+            return
+        logger.warning(json.dumps(metrics, sort_keys=True))
+        if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+            raise QueryBudgetExceeded(
+                '{} ran {} queries, over its budget of {}'.format(
+                    metrics['url_name'] or metrics['path'],
+                    metrics['queries'],
+                    budget
+                )
+            )
+
+
+class AnonymousPageCacheMiddleware(object):
+    """Serve whole pages to anonymous visitors from the cache.
+
+    Only GET requests for pages listed in `utils.page_cache.PAGE_TAGS`
+    are cached, and only successful responses that set no cookies and
+    used no CSRF token, as those carry something of the visitor's own.
+    Pages are rendered from the primary database: one rendered from a
+    lagging replica just after an invalidation would be stored under
+    the new stamps. Must come after `AuthenticationMiddleware`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cached = None
+        if request.method == 'GET' and request.user.is_anonymous():
+            cached = resolve_cached_page(request.path_info)
+        if cached is None:
+            return self.get_response(request)
+        match, tags = cached
+        path = request.get_full_path()
+        page, stamps = get_cached_page(path, tags)
+        if page is not None:
+            # As the view would have, for PerformanceMiddleware.
+            request.resolver_match = match
+            return page_response(request, page)
+        with primary_reads():
+            response = self.get_response(request)
+        if (response.status_code == 200 and
+                not response.streaming and
+                not response.cookies and
+                not request.META.get('CSRF_COOKIE_USED')):
+            cache_page(path, stamps, response)
+        return response
+
+
+class ReplicaPinningMiddleware(object):
+    """Let GET and HEAD requests read from database replicas, unless the
+    client wrote recently.
+
+    A request that writes, or uses any other method, sets a cookie
+    keeping its client's reads on the primary for
+    `REPLICA_PIN_SECONDS`, longer than replicas lag, so that the client
+    sees its own writes, e.g. the recipe it was just redirected to. See
+    `recipes.routers`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        use_replicas = (
+            request.method in ('GET', 'HEAD') and
+            PIN_COOKIE not in request.COOKIES
+        )
+        with routing(use_replicas) as state:
+            response = self.get_response(request)
+            wrote = state.wrote
+        if wrote or request.method not in ('GET', 'HEAD'):
+            response.set_cookie(
+                PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True
+            )
+        return response
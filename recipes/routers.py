@@ -0,0 +1,84 @@
+"""Route reads to replicas and writes to the primary database.
+
+Only requests marked by `ReplicaPinningMiddleware` read from replicas:
+GET and HEAD requests from clients that have not written recently.
+Everything else, e.g. management commands and other requests, reads
+from the primary, as does a request for the rest of its run once it
+has written anything, and code run under `primary_reads`.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+_state = threading.local()
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def routing(use_replicas):
+    """Route the reads of a block of code, noting whether it writes.
+
+    With `use_replicas`, reads go to a replica chosen at random until
+    something is written. Yields the state, whose `wrote` is then set."""
+    replicas = get_replicas() if use_replicas else []
+    saved = dict(_state.__dict__)
+    _state.replica = random.choice(replicas) if replicas else None
+    _state.wrote = False
+    try:
+        yield _state
+    finally:
+        _state.__dict__.clear()
+        _state.__dict__.update(saved)
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary within a block of code, e.g. while rendering
+    a page that others will be served, which must not be stale."""
+    replica = getattr(_state, 'replica', None)
+    _state.replica = None
+    try:
+        yield
+    finally:
+        _state.replica = replica
+
+
+def is_cache(model):
+    # DatabaseCache's table, whose entries must be read as soon as they
+    # are written, and whose writes are no writes of the client's.
+    return model._meta.app_label == 'django_cache'
+
+
+class ReplicaRouter(object):
+    """Send reads to the current request's replica, if it has one.
+
+    The database cache always uses the primary."""
+
+    def db_for_read(self, model, **hints):
+        if is_cache(model) or getattr(_state, 'wrote', False):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from where the instance did.
+            return instance._state.db
+        return getattr(_state, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if not is_cache(model):
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
@@ -38,20 +38,30 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'ids',
+    'utils',
     'recipe',
     'user_profile',
     'recipebook',
     'review',
     'notification',
     'shoppinglist',
+    'feed',
+    'recommendation',
+    'ranking',
+    'jobs',
+    'benchmark',
 ]
 
 MIDDLEWARE = [
+    'recipes.middleware.PerformanceMiddleware',
+    'recipes.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'recipes.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -93,6 +103,71 @@ DATABASES = {
     }
 }
 
+# Read replicas of the primary, e.g. DB_REPLICA_HOSTS=replica1,replica2,
+# otherwise configured as it is. GET and HEAD requests read from them
+# (see recipes.routers); tests use the primary's database for each.
+
+DATABASE_REPLICAS = []
+
+for i, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = 'replica{}'.format(i + 1)
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=host,
+        TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['recipes.routers.ReplicaRouter']
+
+# How long a client reads from the primary after writing, to see its
+# own writes despite replication lag.
+
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.10/topics/cache/
+# Outside development the default cache must be shared by every process,
+# web and worker alike, for invalidations, counters and statistics to be
+# seen by all of them. It defaults to the database's django_cache table,
+# created by `manage.py createcachetable` in the release phase; set
+# CACHE_BACKEND and CACHE_LOCATION to use another.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache' if DEBUG else
+            'django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION',
+            '' if DEBUG else 'django_cache'
+        ),
+    },
+    # Rendered recipe fragments, kept in each process's memory. Keys
+    # include the recipe's version, so no invalidation is shared.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+FRAGMENT_CACHE = 'fragments'
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Whole pages for anonymous visitors (recipes.middleware.
+# AnonymousPageCacheMiddleware), in the default cache so that every
+# worker sees invalidations.
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
@@ -146,7 +221,9 @@ ACCOUNT_ACTIVATION_DAYS = 7
 if DEBUG:
     EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 else:
-    EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    EMAIL_BACKEND = 'jobs.mail.QueuedEmailBackend'
+
+JOBS_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 
 EMAIL_HOST = os.environ.get('EMAIL_HOST')
 
@@ -163,3 +240,67 @@ EMAIL_USE_TLS = True
 LOGOUT_REDIRECT_URL = '/'
 
 LOGIN_REDIRECT_URL = '/'
+
+
+# Notifications
+
+NOTIFICATION_STREAM_TIMEOUT = 25
+
+NOTIFICATION_STREAM_INTERVAL = 5
+
+NOTIFICATION_STREAM_KEEPALIVE = 10
+
+NOTIFICATION_STREAM_RETRY_MS = 1000
+
+NOTIFICATION_COUNT_CACHE_TIMEOUT = 60 * 60
+
+
+# Background jobs (jobs.models), run by `manage.py runworker`. In
+# development they run as soon as they are enqueued.
+
+JOBS_EAGER = DEBUG
+
+JOBS_LEASE_SECONDS = 5 * 60
+
+JOBS_RETRY_DELAY = 30
+
+JOBS_MAX_ATTEMPTS = 5
+
+
+# Performance instrumentation (recipes.middleware.PerformanceMiddleware)
+# Requests running more queries than their URL name's budget log a
+# warning, and fail in development and tests.
+
+QUERY_BUDGETS = {
+    'home': 16,
+    'view_recipe': 11,
+    'recipe_search': 12,
+    'notification_count_view': 3,
+    'view_notifications': 5,
+    'profile': 10,
+}
+
+QUERY_BUDGET_DEFAULT = None
+
+QUERY_BUDGET_RAISE = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'recipes.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'jobs': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
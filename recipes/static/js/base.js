@@ -34,16 +34,47 @@ recipes = {};
     });
   }
 
-  function checkNotifications() {
+  POLL_DELAY = 5000;
+  MAX_POLL_DELAY = 300000;
+  MAX_STREAM_ERRORS = 3;
+
+  function showNotificationsCount(n) {
+    $('.notifications-count').html(n ? ' (' + n + ')' : '');
+  }
+
+  function pollNotifications(delay, lastCount) {
+    // Poll with exponential backoff, resetting when the count changes.
     $.get('/notifications/count', (data) => {
-      var n = data['count']
-      $('.notifications-count').html(n ? ' (' + n + ')' : '');
+      var n = data['count'];
+      showNotificationsCount(n);
+      delay = n === lastCount ? Math.min(delay * 2, MAX_POLL_DELAY) : POLL_DELAY;
+      setTimeout(() => pollNotifications(delay, n), delay);
+    }).fail(() => {
+      delay = Math.min(delay * 2, MAX_POLL_DELAY);
+      setTimeout(() => pollNotifications(delay, lastCount), delay);
     });
   }
 
   function initNotificationsCheck() {
-    checkNotifications();
-    setInterval(checkNotifications, 5000);
+    if (!window.EventSource) {
+      pollNotifications(POLL_DELAY);
+      return;
+    }
+    var source = new EventSource('/notifications/stream'),
+        errors = 0;
+    source.onopen = () => errors = 0;
+    source.addEventListener('count', (e) => {
+      showNotificationsCount(JSON.parse(e.data)['count']);
+    });
+    source.onerror = () => {
+      // The server ends each stream periodically and the browser
+      // reconnects; only give up on repeated or fatal failures.
+      errors += 1;
+      if (source.readyState == EventSource.CLOSED || errors > MAX_STREAM_ERRORS) {
+        source.close();
+        pollNotifications(POLL_DELAY);
+      }
+    };
   }
 
   recipes.dialog = dialog;
@@ -29,8 +29,22 @@
     }
   }
 
+  function ajaxUpdateRecipeBooks(form, status) {
+    status.text('Saving...');
+    $.post(form.attr('action'), form.serialize())
+      .done(() => status.text('Saved'))
+      .fail(() => status.text('Could not save recipe books'));
+  }
+
   function initializeRecipeBookForm() {
     makeModal('.recipe-recipebooks', 'Recipe Books', 'select');
+    var updateForm = $('#recipebook-form'),
+        status = $('<span class="recipebook-status"></span>');
+    updateForm.append(status);
+    updateForm.on('submit', (e) => {
+      e.preventDefault();
+      ajaxUpdateRecipeBooks(updateForm, status);
+    });
     var form = $('#new-recipebook-form');
     form.css('display', 'block');
     form.find('input[type="submit"]').on('click', (e) => {
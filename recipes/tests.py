@@ -1,7 +1,21 @@
-from django.test import TestCase
+import json
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
 from recipe.models import Recipe
+from recipebook.models import RecipeBook
+from review.models import Review
+from user_profile.models import follow, unfollow
+from utils.page_cache import page_key
+from recipes.routers import ReplicaRouter, routing
+from recipes.middleware import (
+    PIN_COOKIE, QueryBudgetExceeded, get_request_stats, reset_request_stats
+)
 
 
 class HomePageTests(TestCase):
@@ -66,7 +80,7 @@ class RecipeStreamTests(TestCase):
         self.not_followed_recipe = recipe_with_user('user3', 'recipe3')
         me = self.my_recipe.user
         self.client.force_login(me)
-        me.profile.follows.add(self.followed_recipe.user)
+        follow(me, self.followed_recipe.user)
         self.response = self.client.get(reverse('home'))
 
     def assert_has_recipe(self, recipe):
@@ -101,3 +115,263 @@ class RecipeStreamTests(TestCase):
             self.followed_recipe.user.recipes.add(recipe)
         response = self.client.get(reverse('home'))
         self.assertContains(response, title, 10)
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class PerformanceMiddlewareTests(TestCase):
+    """Tests for the request performance instrumentation."""
+
+    def setUp(self):
+        reset_request_stats()
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """Responses report database, template and total time."""
+        response = self.client.get(reverse('about'))
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_queries_counted(self):
+        """The recorded query count matches the queries run."""
+        recipe_with_user('testuser', 'title')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.performance['queries'], len(queries))
+        self.assertGreater(response.performance['template_ms'], 0)
+
+    def test_database_cache_queries_counted_apart(self):
+        """Queries of a database cache are not held against budgets."""
+        recipe_with_user('testuser', 'title')
+        response = self.client.get(reverse('home'))
+        uncached = response.performance['queries']
+        database_caches = dict(settings.CACHES, default=dict(
+            BACKEND='django.core.cache.backends.db.DatabaseCache',
+            LOCATION='performance_test_cache'
+        ))
+        with self.settings(CACHES=database_caches):
+            call_command('createcachetable')
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.performance['queries'], uncached)
+        self.assertGreater(response.performance['cache_queries'], 0)
+
+    def test_stats_aggregated_by_url_name(self):
+        """Requests are totalled per URL name."""
+        self.client.get(reverse('about'))
+        self.client.get(reverse('about'))
+        self.client.get(reverse('home'))
+        stats = get_request_stats()
+        self.assertEqual(stats['about']['requests'], 2)
+        self.assertEqual(stats['home']['requests'], 1)
+
+    def test_over_budget_raises(self):
+        """A view running more queries than its budget fails."""
+        with self.settings(QUERY_BUDGETS={'home': 0}):
+            with self.assertLogs('recipes.performance', 'WARNING') as logs:
+                with self.assertRaises(QueryBudgetExceeded):
+                    self.client.get(reverse('home'))
+        metrics = json.loads(logs.records[0].getMessage())
+        self.assertEqual(metrics['url_name'], 'home')
+        self.assertEqual(metrics['query_budget'], 0)
+        self.assertGreater(metrics['queries'], 0)
+
+    def test_within_budget(self):
+        """A view within its budget is not affected."""
+        with self.settings(QUERY_BUDGETS={'about': 0}):
+            response = self.client.get(reverse('about'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.performance['query_budget'], 0)
+
+
+class AnonymousPageCacheTests(TestCase):
+    """Test whole pages are cached for anonymous visitors until what
+    they show changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.recipe = recipe_with_user('author', 'soup')
+        self.user = self.recipe.user
+        self.recipe_url = reverse('view_recipe', args=[self.recipe.id])
+        self.profile_url = reverse('profile', args=['author'])
+
+    def assertCached(self, url):
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_pages_cached(self):
+        for url in (reverse('home'), self.recipe_url, self.profile_url):
+            response = self.assertCached(url)
+            self.assertContains(response, 'soup')
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_stats_recorded_by_url_name(self):
+        reset_request_stats()
+        self.assertCached(self.recipe_url)
+        self.assertEqual(get_request_stats()['view_recipe']['requests'], 2)
+
+    def test_query_strings_cached_apart(self):
+        self.assertCached(reverse('home'))
+        response = self.client.get(reverse('home') + '?p=2')
+        self.assertNotContains(response, 'soup')
+
+    def test_logged_in_not_cached(self):
+        self.client.force_login(self.user)
+        self.client.get(self.recipe_url)
+        response = self.client.get(self.recipe_url)
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_recipe_edit_invalidates(self):
+        derived = Recipe(
+            user=self.user,
+            title='stew',
+            origin_recipe=self.recipe
+        )
+        derived.save()
+        derived_url = reverse('view_recipe', args=[derived.id])
+        urls = (reverse('home'), self.recipe_url, self.profile_url,
+                derived_url)
+        for url in urls:
+            self.assertCached(url)
+        # Deriving bumped its version.
+        self.recipe.refresh_from_db()
+        self.recipe.title = 'broth'
+        self.recipe.save()
+        for url in urls:
+            self.assertContains(self.client.get(url), 'broth')
+
+    def test_review_invalidates(self):
+        self.assertCached(self.recipe_url)
+        Review(
+            user=self.user,
+            recipe=self.recipe,
+            title='tasty',
+            body='very',
+            score=5
+        ).save()
+        self.assertContains(self.client.get(self.recipe_url), 'tasty')
+
+    def test_follows_invalidate(self):
+        other = User(username='other')
+        other.save()
+        self.assertCached(self.profile_url)
+        follow(other, self.user)
+        response = self.client.get(self.profile_url)
+        self.assertContains(response, 'Followers (1)')
+        unfollow(other, self.user)
+        response = self.client.get(self.profile_url)
+        self.assertContains(response, 'Followers (0)')
+
+    def test_recipebook_invalidates(self):
+        self.assertCached(self.profile_url)
+        RecipeBook(user=self.user, title='desserts', description='').save()
+        self.assertContains(self.client.get(self.profile_url), 'desserts')
+
+    def test_not_found_not_cached(self):
+        url = reverse('view_recipe', args=[self.recipe.id + 1000])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertIsNone(cache.get(page_key(url)))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Test reads go to replicas unless the client wrote recently.
+
+    The replica is a second connection to the test database."""
+
+    def setUp(self):
+        connections.databases['replica1'] = dict(
+            connections.databases['default']
+        )
+        self.addCleanup(self.remove_replica)
+        cache.clear()
+        self.recipe = recipe_with_user('author', 'soup')
+        self.url = reverse('view_recipe', args=[self.recipe.id])
+
+    def remove_replica(self):
+        connections['replica1'].close()
+        del connections._connections.replica1
+        del connections.databases['replica1']
+
+    def get_queries(self, method, url, **kwargs):
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            with CaptureQueriesContext(connection) as primary:
+                response = getattr(self.client, method)(url, **kwargs)
+        return response, len(replica), len(primary)
+
+    def test_get_reads_replica(self):
+        self.client.force_login(self.recipe.user)
+        response, replica, primary = self.get_queries('get', self.url)
+        self.assertContains(response, 'soup')
+        self.assertGreater(replica, 0)
+        self.assertEqual(primary, 0)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_cached_page_rendered_from_primary(self):
+        """A page stored for anonymous visitors is never rendered from a
+        replica, which may not have the change that invalidated it."""
+        response, replica, primary = self.get_queries('get', self.url)
+        self.assertContains(response, 'soup')
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response, replica, primary = self.get_queries('get', self.url)
+        self.assertContains(response, 'soup')
+        self.assertEqual(replica + primary, 0)
+
+    def test_write_pins_to_primary(self):
+        self.client.force_login(self.recipe.user)
+        response, replica, primary = self.get_queries(
+            'post',
+            reverse('new_recipe'),
+            data=dict(
+                title='stew',
+                description='a stew',
+                ingredients='food',
+                directions='make it'
+            )
+        )
+        self.assertEqual(replica, 0)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response, replica, primary = self.get_queries('get', response.url)
+        self.assertContains(response, 'stew')
+        self.assertEqual(replica, 0)
+
+    def test_database_cache(self):
+        """The cache table is read from the primary, and storing a page
+        does not count as the client writing."""
+        database_caches = dict(settings.CACHES, default=dict(
+            BACKEND='django.core.cache.backends.db.DatabaseCache',
+            LOCATION='replica_test_cache'
+        ))
+        with self.settings(CACHES=database_caches):
+            call_command('createcachetable')
+            self.addCleanup(self.drop_cache_table)
+            with routing(True):
+                self.assertEqual(ReplicaRouter().db_for_read(
+                    caches['default'].cache_model_class
+                ), 'default')
+            response, replica, primary = self.get_queries('get', self.url)
+            self.assertEqual(replica, 0)
+            self.assertNotIn(PIN_COOKIE, response.cookies)
+            response, replica, primary = self.get_queries('get', self.url)
+            # Served from the cache.
+            self.assertEqual(replica, 0)
+            self.assertContains(response, 'soup')
+
+    def drop_cache_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE replica_test_cache')
+
+    def test_reads_after_write_use_primary(self):
+        router = ReplicaRouter()
+        with routing(True):
+            self.assertEqual(router.db_for_read(Recipe), 'replica1')
+            router.db_for_write(Recipe)
+            self.assertEqual(router.db_for_read(Recipe), 'default')
+        with routing(False):
+            self.assertEqual(router.db_for_read(Recipe), 'default')
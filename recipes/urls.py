@@ -13,4 +13,5 @@ urlpatterns = [
     url(r'^review/', include('review.urls')),
     url(r'^notifications/', include('notification.urls')),
     url(r'^list/', include('shoppinglist.urls')),
+    url(r'^ranking/', include('ranking.urls')),
 ]
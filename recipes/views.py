@@ -1,16 +1,10 @@
-from itertools import chain
 from django.views.generic.base import TemplateView
 from utils.utils import paginate
 from recipe.models import Recipe, RecipeForm
-
-
-def get_recipes(user):
-    followed_recipes = chain.from_iterable(
-        user.recipes.all()
-        for user in user.profile.follows.all()
-    )
-    user_recipes = user.recipes.all()
-    return chain(followed_recipes, user_recipes)
+from feed.models import get_feed
+from recommendation.models import (
+    get_follow_suggestions, get_recipe_suggestions
+)
 
 
 class HomePage(TemplateView):
@@ -19,18 +13,21 @@ class HomePage(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super(HomePage, self).get_context_data(**kwargs)
-        if self.request.user.is_authenticated():
-            recipes = list(get_recipes(self.request.user))
-            if not recipes:
-                recipes = Recipe.objects.all()
+        recipes = None
+        user = self.request.user
+        if user.is_authenticated():
+            recipes = get_feed(user)
+            if not recipes.exists():
                 context['no_recipes'] = True
-        else:
-            recipes = Recipe.objects.all()
-        sorted_recipes = sorted(
-            recipes,
-            key=lambda r: r.date_created, reverse=True
-        )
-        context.update(paginate(self.request, sorted_recipes))
+                recipes = get_recipe_suggestions(user)
+                if recipes.exists():
+                    context['suggested_recipes'] = True
+                else:
+                    recipes = None
+            context['follow_suggestions'] = get_follow_suggestions(user)
+        if recipes is None:
+            recipes = Recipe.objects.order_by('-date_created')
+        context.update(paginate(self.request, recipes.for_listing()))
         context['recipe_form'] = RecipeForm
         return context
 
@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import FollowSuggestion, RecipeSuggestion
+
+
+@admin.register(FollowSuggestion)
+class FollowSuggestionAdmin(admin.ModelAdmin):
+    pass
+
+
+@admin.register(RecipeSuggestion)
+class RecipeSuggestionAdmin(admin.ModelAdmin):
+    pass
@@ -0,0 +1,215 @@
+"""Offline computation of follow and recipe suggestions.
+
+Everything is loaded as sparse matrices indexed by position in sorted id
+arrays, and scored with matrix products:
+
+- Follow suggestions are friends of friends. With F the follow matrix
+  (row follows column), F W F counts the paths from a user through the
+  users they follow, each weighted by W to discount users who follow
+  nearly everyone.
+- Recipe suggestions are item-item. Recipes are described by the books
+  they are in and the ratings they got; their cosine similarity S is
+  kept to each recipe's nearest neighbours, and a user's profile P of
+  books and ratings is scored as P S.
+
+Users with fewer than `k` suggestions are topped up with the most
+followed users or the most collected and best rated recipes, scored 0.
+"""
+import numpy as np
+from scipy import sparse
+from django.contrib.auth.models import User
+from recipe.models import Recipe
+from recipebook.models import RecipeBook
+from review.models import Review
+from user_profile.models import Follow
+
+
+def load(queryset, *fields):
+    """Return `fields` of every row as an integer array, one row each."""
+    rows = list(queryset.order_by().values_list(*fields).iterator())
+    return np.array(rows, dtype=np.int64).reshape(-1, len(fields))
+
+
+def known(rows, column, ids):
+    """Drop rows whose `column` is not in `ids`.
+
+    Loads are separate queries, so rows may refer to ones created after
+    an earlier load."""
+    return rows[np.isin(rows[:, column], ids)]
+
+
+def matrix(rows, columns, shape, data=None):
+    """Return a CSR matrix of `data`, or ones, at the given positions."""
+    if data is None:
+        data = np.ones(len(rows))
+    return sparse.csr_matrix((data, (rows, columns)), shape=shape)
+
+
+def top_entries(scores, k):
+    """Yield each row's `k` largest entries as (row, columns, values).
+
+    Largest first, ties broken by column."""
+    scores = scores.tocsr()
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        columns = scores.indices[start:end]
+        values = scores.data[start:end]
+        if len(values) > k:
+            keep = np.argpartition(-values, k - 1)[:k]
+            columns, values = columns[keep], values[keep]
+        order = np.lexsort((columns, -values))
+        yield row, columns[order], values[order]
+
+
+def prune(scores, k):
+    """Return `scores` with all but each row's `k` largest entries
+    dropped."""
+    rows, columns, values = [], [], []
+    for row, row_columns, row_values in top_entries(scores, k):
+        rows.append(np.full(len(row_columns), row))
+        columns.append(row_columns)
+        values.append(row_values)
+    if not rows:
+        return sparse.csr_matrix(scores.shape)
+    return matrix(
+        np.concatenate(rows),
+        np.concatenate(columns),
+        scores.shape,
+        np.concatenate(values)
+    )
+
+
+def rank(scores, exclude, popularity, k):
+    """Yield the top `k` columns of each row of `scores` not in `exclude`.
+
+    Rows are yielded as (row, columns, values), topped up with the most
+    popular columns, by the `popularity` array, not excluded."""
+    exclude = exclude.tocsr() > 0
+    scores = scores.tocsr()
+    scores = scores - scores.multiply(exclude)
+    scores.eliminate_zeros()
+    fallback = np.argsort(-popularity, kind='mergesort')
+    fallback = fallback[popularity[fallback] > 0]
+    for row, columns, values in top_entries(scores, k):
+        missing = k - len(columns)
+        if missing > 0:
+            start, end = exclude.indptr[row], exclude.indptr[row + 1]
+            seen = set(exclude.indices[start:end])
+            seen.update(columns)
+            extra = [
+                column for column in fallback[:k + len(seen)]
+                if column not in seen
+            ][:missing]
+            columns = np.concatenate([columns, extra]).astype(np.int64)
+            values = np.concatenate([values, np.zeros(len(extra))])
+        yield row, columns, values
+
+
+def suggest_follows(follows, k):
+    """Rank friends of friends for each user of a follow matrix."""
+    following = np.asarray(follows.sum(axis=1)).ravel()
+    weights = sparse.diags(1 / np.log2(2 + following))
+    scores = follows.dot(weights).dot(follows)
+    exclude = follows + sparse.identity(follows.shape[0], format='csr')
+    popularity = np.asarray(follows.sum(axis=0)).ravel()
+    return rank(scores, exclude, popularity, k)
+
+
+def recipe_similarity(books, ratings, neighbours):
+    """Return the cosine similarity of recipes, the columns of `books`
+    and `ratings`, kept to each recipe's nearest `neighbours`."""
+    items = sparse.vstack([books, ratings]).tocsc()
+    norms = np.sqrt(np.asarray(items.multiply(items).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    items = items.dot(sparse.diags(1 / norms))
+    similarity = items.T.dot(items).tocsr()
+    similarity = similarity - sparse.diags(similarity.diagonal())
+    similarity.eliminate_zeros()
+    return prune(similarity, neighbours)
+
+
+def suggest_recipes(profiles, similarity, seen, popularity, k):
+    """Rank recipes similar to each user's profile, skipping `seen`."""
+    return rank(profiles.dot(similarity), seen, popularity, k)
+
+
+def rating_weights(scores):
+    """Weight ratings so that scores of 2 and under say nothing."""
+    return np.clip(scores - 2, 0, None) / 3
+
+
+def follow_suggestions(k=10):
+    """Yield (user id, suggested user id, score), k per user by rank."""
+    user_ids = load(User.objects.all(), 'id')[:, 0]
+    user_ids.sort()
+    n = len(user_ids)
+    edges = load(Follow.objects.all(), 'follower_id', 'followed_id')
+    edges = known(known(edges, 0, user_ids), 1, user_ids)
+    follows = matrix(
+        np.searchsorted(user_ids, edges[:, 0]),
+        np.searchsorted(user_ids, edges[:, 1]),
+        (n, n)
+    )
+    for row, columns, values in suggest_follows(follows, k):
+        for column, value in zip(columns, values):
+            yield int(user_ids[row]), int(user_ids[column]), float(value)
+
+
+def recipe_suggestions(k=10, neighbours=50):
+    """Yield (user id, recipe id, score), k per user by rank."""
+    user_ids = load(User.objects.all(), 'id')[:, 0]
+    user_ids.sort()
+    recipes = known(load(Recipe.objects.all(), 'id', 'user_id'), 1, user_ids)
+    recipes = recipes[np.argsort(recipes[:, 0])]
+    recipe_ids = recipes[:, 0]
+    book_owners = known(
+        load(RecipeBook.objects.all(), 'id', 'user_id'), 1, user_ids
+    )
+    book_owners = book_owners[np.argsort(book_owners[:, 0])]
+    members = load(
+        RecipeBook.recipes.through.objects.all(),
+        'recipebook_id',
+        'recipe_id'
+    )
+    members = known(known(members, 0, book_owners[:, 0]), 1, recipe_ids)
+    reviews = load(Review.objects.all(), 'user_id', 'recipe_id', 'score')
+    reviews = known(known(reviews, 0, user_ids), 1, recipe_ids)
+    shape = (len(user_ids), len(recipe_ids))
+
+    books = matrix(
+        np.searchsorted(book_owners[:, 0], members[:, 0]),
+        np.searchsorted(recipe_ids, members[:, 1]),
+        (len(book_owners), len(recipe_ids))
+    )
+    owners = matrix(
+        np.searchsorted(user_ids, book_owners[:, 1]),
+        np.arange(len(book_owners)),
+        (len(user_ids), len(book_owners))
+    )
+    review_rows = np.searchsorted(user_ids, reviews[:, 0])
+    review_columns = np.searchsorted(recipe_ids, reviews[:, 1])
+    ratings = matrix(
+        review_rows,
+        review_columns,
+        shape,
+        rating_weights(reviews[:, 2])
+    )
+    collected = owners.dot(books)
+    profiles = collected + ratings
+    seen = (
+        collected +
+        matrix(review_rows, review_columns, shape) +
+        matrix(
+            np.searchsorted(user_ids, recipes[:, 1]),
+            np.arange(len(recipe_ids)),
+            shape
+        )
+    )
+    similarity = recipe_similarity(books, ratings, neighbours)
+    popularity = np.asarray(
+        books.sum(axis=0) + ratings.sum(axis=0)
+    ).ravel()
+    for row, columns, values in suggest_recipes(
+            profiles, similarity, seen, popularity, k):
+        for column, value in zip(columns, values):
+            yield int(user_ids[row]), int(recipe_ids[column]), float(value)
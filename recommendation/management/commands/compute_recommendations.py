@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from recommendation.engine import follow_suggestions, recipe_suggestions
+from recommendation.models import (
+    FollowSuggestion, RecipeSuggestion, replace_suggestions
+)
+
+
+class Command(BaseCommand):
+    help = 'Recompute follow and recipe suggestions for every user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Suggestions of each kind to keep per user.'
+        )
+        parser.add_argument(
+            '--neighbours',
+            type=int,
+            default=50,
+            help='Similar recipes to keep per recipe.'
+        )
+
+    def handle(self, *args, **options):
+        follows = replace_suggestions(
+            FollowSuggestion,
+            'suggested_id',
+            follow_suggestions(options['top'])
+        )
+        recipes = replace_suggestions(
+            RecipeSuggestion,
+            'recipe_id',
+            recipe_suggestions(options['top'], options['neighbours'])
+        )
+        self.stdout.write(
+            'Stored {} follow and {} recipe suggestions.'.format(
+                follows,
+                recipes
+            )
+        )
@@ -0,0 +1,108 @@
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from recipe.models import Recipe
+
+
+class FollowSuggestion(models.Model):
+    """A user `user` may want to follow, ranked from 0.
+
+    Written by the compute_recommendations command; read with one seek
+    on the unique (user, rank) index."""
+
+    user = models.ForeignKey(
+        User,
+        related_name='follow_suggestions',
+        on_delete=models.deletion.CASCADE
+    )
+    suggested = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.deletion.CASCADE
+    )
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('user', 'rank')
+
+    def __str__(self):
+        return '{} for {}'.format(self.suggested_id, self.user_id)
+
+
+class RecipeSuggestion(models.Model):
+    """A recipe `user` may like, ranked from 0.
+
+    Written by the compute_recommendations command; read with one seek
+    on the unique (user, rank) index."""
+
+    user = models.ForeignKey(
+        User,
+        related_name='recipe_suggestions',
+        on_delete=models.deletion.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='suggestions',
+        on_delete=models.deletion.CASCADE
+    )
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('user', 'rank')
+
+    def __str__(self):
+        return '{} for {}'.format(self.recipe_id, self.user_id)
+
+
+def get_follow_suggestions(user, limit=5):
+    """Return suggestions of users for `user` to follow, best first.
+
+    Suggested users are selected with them. Users followed since the
+    suggestions were computed are left out."""
+    return FollowSuggestion.objects.filter(user=user).exclude(
+        suggested__follower_edges__follower=user
+    ).select_related('suggested').order_by('rank')[:limit]
+
+
+def get_recipe_suggestions(user, limit=10):
+    """Return recipes `user` may like, best first.
+
+    Recipes the user has written, collected or reviewed since the
+    suggestions were computed are left out."""
+    return Recipe.objects.filter(suggestions__user=user).exclude(
+        user=user
+    ).exclude(
+        recipebooks__user=user
+    ).exclude(
+        reviews__user=user
+    ).order_by('suggestions__rank')[:limit]
+
+
+def replace_suggestions(model, field, rows, batch_size=500):
+    """Replace every suggestion of `model` with `rows`, atomically.
+
+    `rows` yields (user id, `field` value, score), grouped by user and in
+    rank order. Readers see the old suggestions until the new commit."""
+    count = 0
+    with transaction.atomic():
+        model.objects.all().delete()
+        batch = []
+        rank = 0
+        last_user = None
+        for user_id, item_id, score in rows:
+            rank = rank + 1 if user_id == last_user else 0
+            last_user = user_id
+            batch.append(model(
+                user_id=user_id,
+                score=score,
+                rank=rank,
+                **{field: item_id}
+            ))
+            if len(batch) == batch_size:
+                model.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        count += len(batch)
+    return count
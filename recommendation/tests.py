@@ -0,0 +1,186 @@
+from io import StringIO
+import numpy as np
+from scipy import sparse
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from recipe.models import Recipe
+from recipebook.models import RecipeBook
+from review.models import Review
+from user_profile.models import follow
+from .engine import matrix, prune, rank, suggest_follows
+from .models import (
+    FollowSuggestion, RecipeSuggestion, get_follow_suggestions,
+    get_recipe_suggestions
+)
+
+
+def create_recipe(user, title='recipe'):
+    recipe = Recipe(
+        user=user,
+        title=title,
+        description='a recipe',
+        ingredients='food',
+        directions='make it'
+    )
+    recipe.save()
+    return recipe
+
+
+def create_book(user, recipes):
+    book = RecipeBook(user=user, title='book', description='a book')
+    book.save()
+    book.recipes.add(*recipes)
+    return book
+
+
+def ranked(rows):
+    return [(row, list(columns)) for row, columns, _ in rows]
+
+
+class EngineTests(TestCase):
+    """Test the matrix computations on small inputs."""
+
+    def test_friends_of_friends(self):
+        # 0 follows 1 and 2, who both follow 3; 2 also follows 4.
+        follows = matrix([0, 0, 1, 2, 2], [1, 2, 3, 3, 4], (5, 5))
+        suggestions = dict(ranked(suggest_follows(follows, 2)))
+        self.assertEqual(suggestions[0], [3, 4])
+
+    def test_followed_and_self_not_suggested(self):
+        # 0 follows 1, who follows 0 and 2; 0 already follows 2.
+        follows = matrix([0, 0, 1, 1], [1, 2, 0, 2], (3, 3))
+        suggestions = dict(ranked(suggest_follows(follows, 3)))
+        self.assertEqual(suggestions[0], [])
+
+    def test_topped_up_with_popular(self):
+        follows = matrix([1, 2, 3], [2, 0, 0], (4, 4))
+        suggestions = dict(ranked(suggest_follows(follows, 2)))
+        # 3 is followed by nobody, so is never a filler.
+        self.assertEqual(suggestions[1], [0])
+        self.assertEqual(suggestions[3], [2])
+
+    def test_rank_ties_by_column(self):
+        scores = sparse.csr_matrix(np.array([[1.0, 2.0, 2.0, 0.5]]))
+        exclude = sparse.csr_matrix((1, 4))
+        rows = ranked(rank(scores, exclude, np.zeros(4), 3))
+        self.assertEqual(rows, [(0, [1, 2, 0])])
+
+    def test_prune(self):
+        scores = sparse.csr_matrix(np.array([[3.0, 1.0, 2.0], [0, 0, 1.0]]))
+        pruned = prune(scores, 2).toarray()
+        self.assertEqual(pruned.tolist(), [[3.0, 0, 2.0], [0, 0, 1.0]])
+
+
+class ComputeRecommendationsTests(TestCase):
+    """Test the command's stored suggestions and how pages read them."""
+
+    def setUp(self):
+        self.users = []
+        for name in ('ann', 'bob', 'cat', 'dan'):
+            user = User(username=name)
+            user.save()
+            self.users.append(user)
+        self.ann, self.bob, self.cat, self.dan = self.users
+
+    def compute(self):
+        call_command('compute_recommendations', stdout=StringIO())
+
+    def test_follow_suggestions(self):
+        follow(self.ann, self.bob)
+        follow(self.bob, self.cat)
+        self.compute()
+        suggested = [
+            s.suggested for s in get_follow_suggestions(self.ann)
+        ]
+        self.assertEqual(suggested[0], self.cat)
+        self.assertNotIn(self.bob, suggested)
+        self.assertNotIn(self.ann, suggested)
+
+    def test_followed_since_not_suggested(self):
+        follow(self.ann, self.bob)
+        follow(self.bob, self.cat)
+        self.compute()
+        follow(self.ann, self.cat)
+        suggested = [
+            s.suggested for s in get_follow_suggestions(self.ann)
+        ]
+        self.assertNotIn(self.cat, suggested)
+
+    def test_recipe_suggestions(self):
+        soup = create_recipe(self.dan, 'soup')
+        bread = create_recipe(self.dan, 'bread')
+        cake = create_recipe(self.dan, 'cake')
+        create_book(self.bob, [soup, bread])
+        create_book(self.cat, [soup, bread])
+        create_book(self.ann, [soup])
+        Review(
+            user=self.cat,
+            recipe=cake,
+            title='no',
+            body='no',
+            score=1
+        ).save()
+        self.compute()
+        suggested = list(get_recipe_suggestions(self.ann))
+        self.assertEqual(suggested[0], bread)
+        self.assertNotIn(soup, suggested)
+        # Authors are not suggested their own recipes.
+        self.assertFalse(RecipeSuggestion.objects.filter(user=self.dan))
+
+    def test_collected_since_not_suggested(self):
+        recipes = [
+            create_recipe(self.dan, title)
+            for title in ('soup', 'bread', 'cake', 'pie')
+        ]
+        for rank, recipe in enumerate(recipes):
+            for user in (self.ann, self.dan):
+                RecipeSuggestion(
+                    user=user,
+                    recipe=recipe,
+                    score=1,
+                    rank=rank
+                ).save()
+        soup, bread, cake, pie = recipes
+        create_book(self.ann, [soup])
+        Review(
+            user=self.ann,
+            recipe=bread,
+            title='yes',
+            body='yes',
+            score=5
+        ).save()
+        self.assertEqual(list(get_recipe_suggestions(self.ann)), [cake, pie])
+        self.assertEqual(
+            list(get_recipe_suggestions(self.ann, limit=1)),
+            [cake]
+        )
+        # Their own recipes.
+        self.assertEqual(list(get_recipe_suggestions(self.dan)), [])
+
+    def test_recompute_replaces(self):
+        follow(self.ann, self.bob)
+        follow(self.bob, self.cat)
+        self.compute()
+        self.compute()
+        ranks = list(FollowSuggestion.objects.filter(
+            user=self.ann
+        ).values_list('rank', flat=True))
+        self.assertEqual(sorted(ranks), list(range(len(ranks))))
+
+    def test_home_falls_back_to_suggestions(self):
+        soup = create_recipe(self.dan, 'soup')
+        bread = create_recipe(self.dan, 'bread')
+        create_book(self.bob, [soup, bread])
+        create_book(self.ann, [soup])
+        follow(self.bob, self.cat)
+        follow(self.ann, self.bob)
+        self.compute()
+        self.client.force_login(self.ann)
+        response = self.client.get(reverse('home'))
+        self.assertTrue(response.context['no_recipes'])
+        self.assertTrue(response.context['suggested_recipes'])
+        self.assertEqual(list(response.context['objects']), [bread])
+        self.assertContains(response, 'People you may want to follow')
+        self.assertContains(response, reverse('profile', args=['cat']))
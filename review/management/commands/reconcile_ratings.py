@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipe.models import Recipe
+from review.models import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the review aggregates stored on recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes to reconcile per transaction.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+        fixed = checked = 0
+        last_id = 0
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                fixed += reconcile_ratings(
+                    Recipe.objects.filter(id__in=batch)
+                )
+            checked += len(batch)
+            last_id = batch[-1]
+        self.stdout.write(
+            'Checked {} recipes, corrected {}.'.format(checked, fixed)
+        )
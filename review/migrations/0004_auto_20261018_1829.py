@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:29
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0005_auto_20261018_1829'),
+        ('review', '0003_review_date_created'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='review',
+            index_together=set([('recipe', 'date_created', 'id')]),
+        ),
+    ]
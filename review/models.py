@@ -1,7 +1,13 @@
 from django.db import models
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.forms import ModelForm
 from django.contrib.auth.models import User
 from recipe.models import Recipe
+from utils.page_cache import (
+    LISTING_TAG, invalidate_pages, profile_tag, recipe_tag
+)
 
 
 class Review(models.Model):
@@ -22,6 +28,16 @@ class Review(models.Model):
     )
     date_created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        index_together = [('recipe', 'date_created', 'id')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded score so edits can adjust aggregates."""
+        instance = super(Review, cls).from_db(db, field_names, values)
+        instance._loaded_score = instance.__dict__.get('score')
+        return instance
+
     def __str__(self):
         return self.title
 
@@ -30,3 +46,71 @@ class ReviewForm(ModelForm):
     class Meta:
         model = Review
         fields = ['title', 'score', 'body']
+
+
+def update_rating(recipe_id, count, score):
+    """Adjust a recipe's review aggregates in place."""
+    Recipe.objects.filter(pk=recipe_id).update(
+        review_count=F('review_count') + count,
+        score_sum=F('score_sum') + score,
+        version=F('version') + 1
+    )
+
+
+def reconcile_ratings(recipes=None):
+    """Recompute review aggregates, fixing any that have drifted.
+
+    Returns the number of recipes corrected."""
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    actual = recipes.annotate(
+        actual_count=Count('reviews'),
+        actual_sum=Sum('reviews__score')
+    ).values_list(
+        'id', 'review_count', 'score_sum', 'actual_count', 'actual_sum'
+    )
+    fixed = 0
+    for pk, count, score_sum, actual_count, actual_sum in actual.iterator():
+        actual_sum = actual_sum or 0
+        if (count, score_sum) != (actual_count, actual_sum):
+            Recipe.objects.filter(pk=pk).update(
+                review_count=actual_count,
+                score_sum=actual_sum,
+                version=F('version') + 1
+            )
+            fixed += 1
+    return fixed
+
+
+@receiver(post_save, sender=Review)
+def add_review_rating(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        update_rating(instance.recipe_id, 1, instance.score)
+    else:
+        loaded = getattr(instance, '_loaded_score', None)
+        if loaded is not None and loaded != instance.score:
+            update_rating(instance.recipe_id, 0, instance.score - loaded)
+    instance._loaded_score = instance.score
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    update_rating(instance.recipe_id, -1, -instance.score)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_pages(sender, instance, raw=False, **kwargs):
+    # Listings show recipes' average scores.
+    if raw:
+        return
+    author = Recipe.objects.filter(pk=instance.recipe_id).values_list(
+        'user__username',
+        flat=True
+    ).first()
+    tags = [LISTING_TAG, recipe_tag(instance.recipe_id)]
+    if author is not None:
+        tags.append(profile_tag(author))
+    invalidate_pages(*tags)
@@ -1,3 +1,5 @@
+from io import StringIO
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.urls import reverse
@@ -85,3 +87,72 @@ class DeleteReviewTestCase(ReviewTestCase):
         url = reverse('delete_review', args=[self.review.id])
         response = self.client.get(url)
         self.assertContains(response, 'method="POST"')
+
+
+class RatingAggregateTests(ReviewTestCase):
+    """Test the review aggregates stored on recipes."""
+
+    def add_review(self, score):
+        review = Review(
+            user=self.user,
+            recipe=self.recipe,
+            title='review',
+            body='body',
+            score=score
+        )
+        review.save()
+        return review
+
+    def refresh(self):
+        self.recipe.refresh_from_db()
+        return self.recipe
+
+    def test_posting_review_updates_aggregates(self):
+        self.client.post(reverse('new_review', args=[self.recipe.id]), dict(
+            title='good review',
+            score=4,
+            body='very good',
+        ))
+        self.assertEqual(self.refresh().review_count, 1)
+        self.assertEqual(self.recipe.score_sum, 4)
+
+    def test_deleting_review_updates_aggregates(self):
+        self.add_review(5)
+        review = self.add_review(2)
+        self.client.post(reverse('delete_review', args=[review.id]))
+        self.assertEqual(self.refresh().review_count, 1)
+        self.assertEqual(self.recipe.score_sum, 5)
+
+    def test_editing_score_updates_aggregates(self):
+        self.add_review(5)
+        review = Review.objects.get(pk=self.add_review(1).pk)
+        review.score = 3
+        review.save()
+        self.assertEqual(self.refresh().score_sum, 8)
+        self.assertEqual(self.recipe.review_count, 2)
+
+    def test_average_score(self):
+        for score in (5, 4, 4):
+            self.add_review(score)
+        self.assertEqual(self.refresh().get_average_score(), 4.3)
+
+    def test_average_score_needs_no_queries(self):
+        self.add_review(3)
+        recipe = self.refresh()
+        with self.assertNumQueries(0):
+            recipe.get_average_score()
+
+    def test_no_reviews_has_no_average(self):
+        self.assertIsNone(self.recipe.get_average_score())
+
+    def test_reconcile_ratings_repairs_drift(self):
+        self.add_review(5)
+        self.add_review(3)
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            review_count=7, score_sum=1
+        )
+        out = StringIO()
+        call_command('reconcile_ratings', stdout=out)
+        self.assertEqual(self.refresh().review_count, 2)
+        self.assertEqual(self.recipe.score_sum, 8)
+        self.assertIn('corrected 1', out.getvalue())
@@ -1,10 +1,11 @@
+from django.db import transaction
 from django.urls import reverse
 from django.views.generic import DeleteView
 from django.http import HttpResponseRedirect
 from recipe.models import Recipe
 from .models import Review, ReviewForm
 from utils.utils import ownership_dispatch
-from notification.models import Notification
+from notification.models import notify
 
 
 def review_create_view(request, pk):
@@ -15,12 +16,9 @@ def review_create_view(request, pk):
         review = form.save(commit=False)
         review.user = request.user
         review.recipe = Recipe.objects.filter(pk=pk).first()
-        review.save()
-        Notification(
-            user=review.recipe.user,
-            type='review',
-            object_key=review.id
-        ).save()
+        with transaction.atomic():
+            review.save()
+            notify(review.recipe.user_id, 'review', review.id)
     return HttpResponseRedirect(reverse('view_recipe', args=[pk]))
 
 
@@ -29,5 +27,12 @@ class ReviewDeleteView(DeleteView):
     model = Review
     template_name = 'delete_review.html'
 
+    def delete(self, request, *args, **kwargs):
+        """Delete the review and its rating contribution together."""
+        with transaction.atomic():
+            return super(ReviewDeleteView, self).delete(
+                request, *args, **kwargs
+            )
+
     def get_success_url(self):
         return reverse('view_recipe', args=[self.object.recipe.id])
@@ -0,0 +1,266 @@
+"""Parsing and merging of recipe ingredient lines.
+
+A line such as "1 1/2 cups flour, sifted" is parsed into a quantity,
+a unit and an ingredient name. Units are normalized to a canonical name
+and, where they measure volume or mass, to millilitres or grams, so
+"1 cup milk" and "4 tbsp milk" merge into one shopping list item.
+"""
+import re
+from collections import OrderedDict, namedtuple
+from fractions import Fraction
+
+
+Unit = namedtuple('Unit', 'name dimension factor')
+
+Ingredient = namedtuple('Ingredient', 'quantity unit name key')
+
+VOLUME = 'volume'
+
+MASS = 'mass'
+
+METRIC = {'ml', 'l', 'g', 'kg'}
+
+ABBREVIATIONS = {'tsp', 'tbsp', 'ml', 'l', 'fl oz', 'g', 'kg', 'oz', 'lb'}
+
+
+def _units():
+    units = {}
+
+    def add(name, dimension, factor, *aliases):
+        unit = Unit(name, dimension or name, factor)
+        for alias in (name,) + aliases:
+            units[alias] = unit
+
+    add('tsp', VOLUME, 4.92892, 'teaspoon', 'teaspoons', 'tsps')
+    add('tbsp', VOLUME, 14.7868, 'tablespoon', 'tablespoons', 'tbsps',
+        'tbs', 'tbl')
+    add('cup', VOLUME, 236.588, 'cups')
+    add('fl oz', VOLUME, 29.5735, 'fluid ounce', 'fluid ounces')
+    add('pint', VOLUME, 473.176, 'pints', 'pt')
+    add('quart', VOLUME, 946.353, 'quarts', 'qt')
+    add('gallon', VOLUME, 3785.41, 'gallons', 'gal')
+    add('ml', VOLUME, 1, 'milliliter', 'milliliters', 'millilitre',
+        'millilitres')
+    add('l', VOLUME, 1000, 'liter', 'liters', 'litre', 'litres')
+    add('g', MASS, 1, 'gram', 'grams', 'gr')
+    add('kg', MASS, 1000, 'kilogram', 'kilograms', 'kgs')
+    add('oz', MASS, 28.3495, 'ounce', 'ounces')
+    add('lb', MASS, 453.592, 'pound', 'pounds', 'lbs')
+    for name in ('clove', 'can', 'pinch', 'dash', 'slice', 'piece',
+                 'package', 'bunch', 'stick', 'sprig', 'handful', 'head',
+                 'jar', 'bottle'):
+        add(name, None, 1, plural(name))
+    units['pkg'] = units['package']
+    return units
+
+
+def plural(word):
+    if word.endswith(('ch', 'sh', 's', 'x', 'o')):
+        return word + 'es'
+    return word + 's'
+
+
+def singular(word):
+    """Crudely singularize a word, e.g. "tomatoes" to "tomato"."""
+    if len(word) <= 3 or word.endswith(('ss', 'us')):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'sses', 'xes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+UNITS = _units()
+
+UNIT_NAMES = dict((unit.name, unit) for unit in UNITS.values())
+
+VULGAR_FRACTIONS = {
+    '\u00bd': '1/2', '\u2153': '1/3', '\u2154': '2/3', '\u00bc': '1/4',
+    '\u00be': '3/4', '\u215b': '1/8', '\u215c': '3/8', '\u215d': '5/8',
+    '\u215e': '7/8',
+}
+
+VULGAR_RE = re.compile(
+    r'(\d)?\s*([{}])'.format(''.join(VULGAR_FRACTIONS))
+)
+
+NUMBER = r'(?:\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?|an?(?=\s))'
+
+QUANTITY_RE = re.compile(
+    r'^(?P<quantity>{0})(?:\s*(?:-|to)\s*(?P<upper>{0}))?\s*'.format(NUMBER)
+)
+
+UNIT_RE = re.compile(
+    r'^(?P<unit>fl\.?\s*oz|fluid ounces?|[a-z]+)\.?(?:\s+|$)'
+)
+
+FLUID_OUNCE_RE = re.compile(r'^fl\.?\s*oz$')
+
+BULLET_RE = re.compile('^[\\s\\-*\u2022]+')
+
+PARENTHESES_RE = re.compile(r'\([^)]*\)')
+
+TO_TASTE_RE = re.compile(r'\s+to taste$')
+
+
+def parse_number(text):
+    if text in ('a', 'an'):
+        return 1.0
+    return float(sum(Fraction(part) for part in text.split()))
+
+
+def replace_vulgar_fraction(match):
+    """Turn e.g. "1\u00bd" into "1 1/2"."""
+    whole = match.group(1) + ' ' if match.group(1) else ''
+    return whole + VULGAR_FRACTIONS[match.group(2)]
+
+
+def parse_ingredient(line):
+    """Parse one ingredient line; return None for blank lines."""
+    text = line.strip().lower()
+    text = VULGAR_RE.sub(replace_vulgar_fraction, text)
+    text = BULLET_RE.sub('', text)
+    if not text:
+        return None
+    quantity = None
+    unit = None
+    match = QUANTITY_RE.match(text)
+    if match:
+        try:
+            quantity = parse_number(match.group('upper') or
+                                    match.group('quantity'))
+        except (ValueError, ZeroDivisionError):
+            # E.g. "1/0 cup": the amount is unknown, not the ingredient.
+            quantity = None
+        rest = text[match.end():]
+        unit_match = UNIT_RE.match(rest)
+        if unit_match:
+            alias = FLUID_OUNCE_RE.sub('fl oz', unit_match.group('unit'))
+            if alias in UNITS:
+                unit = UNITS[alias]
+                rest = rest[unit_match.end():]
+        text = rest
+        if text.startswith('of '):
+            text = text[3:]
+    name = PARENTHESES_RE.sub('', text).split(',')[0]
+    name = re.sub(r'\s+', ' ', name).strip(' .;:')
+    name = TO_TASTE_RE.sub('', name)
+    if not name:
+        return None
+    key = ' '.join(singular(word) for word in name.split())
+    return Ingredient(quantity, unit, name, key)
+
+
+def best_unit(unit_names, dimension, base):
+    """Pick the unit to show a merged amount in."""
+    if dimension not in (VOLUME, MASS):
+        return UNIT_NAMES[dimension]
+    if len(unit_names) == 1:
+        return UNIT_NAMES[next(iter(unit_names))]
+    metric = bool(METRIC & unit_names)
+    if dimension == VOLUME:
+        if metric:
+            names = ('l', 'ml')
+        else:
+            names = ('cup', 'tbsp', 'tsp')
+    else:
+        names = ('kg', 'g') if metric else ('lb', 'oz')
+    for name in names:
+        if base >= UNIT_NAMES[name].factor * (0.25 if name == 'cup' else 1):
+            return UNIT_NAMES[name]
+    return UNIT_NAMES[names[-1]]
+
+
+def format_quantity(quantity):
+    """Show a quantity as a whole number, mixed fraction or decimal."""
+    fraction = Fraction(quantity).limit_denominator(8)
+    if abs(float(fraction) - quantity) > 0.01:
+        return '{:.2f}'.format(quantity).rstrip('0').rstrip('.')
+    whole, remainder = divmod(fraction, 1)
+    parts = []
+    if whole:
+        parts.append(str(whole))
+    if remainder:
+        parts.append(str(remainder))
+    return ' '.join(parts) or '0'
+
+
+def describe(quantity, unit, name):
+    """Return the text of a shopping list item."""
+    if quantity is None:
+        return name
+    parts = [format_quantity(quantity)]
+    if unit is not None:
+        if quantity > 1 and unit.name not in ABBREVIATIONS:
+            parts.append(plural(unit.name))
+        else:
+            parts.append(unit.name)
+    elif quantity > 1:
+        # Counted ingredients: "2 onion" merged from "1 onion" twice.
+        words = name.split(' ')
+        if singular(words[-1]) == words[-1]:
+            words[-1] = plural(words[-1])
+        name = ' '.join(words)
+    parts.append(name)
+    return ' '.join(parts)
+
+
+class Amount(object):
+    """A running total of one ingredient in one dimension."""
+
+    def __init__(self, name, key, dimension):
+        self.name = name
+        self.key = key
+        self.dimension = dimension
+        self.base = None
+        self.unit_names = set()
+
+    def add(self, quantity, unit):
+        if quantity is None:
+            return
+        factor = unit.factor if unit else 1
+        self.base = (self.base or 0) + quantity * factor
+        if unit is not None:
+            self.unit_names.add(unit.name)
+
+    def result(self):
+        """Return (quantity, unit) in the best unit for the total."""
+        if self.base is None:
+            return None, None
+        if self.dimension is None:
+            return self.base, None
+        unit = best_unit(self.unit_names, self.dimension, self.base)
+        return self.base / unit.factor, unit
+
+    def describe(self):
+        return describe(*self.result() + (self.name,))
+
+
+def dimension_of(ingredient):
+    if ingredient.unit is None:
+        return None
+    return ingredient.unit.dimension
+
+
+def merge_ingredients(ingredients):
+    """Total parsed ingredients by name and dimension.
+
+    Returns Amounts in first-seen order. Amounts of the same ingredient
+    that cannot be converted into each other, e.g. cups and grams of
+    flour, stay separate."""
+    amounts = OrderedDict()
+    for ingredient in ingredients:
+        key = (ingredient.key, dimension_of(ingredient))
+        if key not in amounts:
+            amounts[key] = Amount(ingredient.name, *key)
+        amounts[key].add(ingredient.quantity, ingredient.unit)
+    return list(amounts.values())
+
+
+def parse_lines(text):
+    """Parse every line of a recipe's ingredients."""
+    parsed = (parse_ingredient(line) for line in text.split('\n'))
+    return [ingredient for ingredient in parsed if ingredient is not None]
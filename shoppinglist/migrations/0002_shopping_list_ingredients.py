@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:50
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shoppinglist', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglistitem',
+            name='name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='shoppinglistitem',
+            name='quantity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shoppinglistitem',
+            name='unit',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglistitem',
+            name='done',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglistitem',
+            name='title',
+            field=models.CharField(max_length=200),
+        ),
+    ]
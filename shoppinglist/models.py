@@ -1,13 +1,84 @@
-from django.db import models
+from collections import namedtuple
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from .ingredients import (
+    UNIT_NAMES,
+    Ingredient,
+    describe,
+    dimension_of,
+    merge_ingredients,
+    parse_lines
+)
+
+
+# An ingredient already on a shopping list, as the item with this id.
+ListedIngredient = namedtuple(
+    'ListedIngredient', Ingredient._fields + ('item_id',)
+)
 
 
 class ShoppingListItem(models.Model):
-    """Model for shopping list items."""
+    """Model for shopping list items.
+
+    Items added from recipes also keep the ingredient's merge key, unit
+    and quantity, so adding more recipes adds to them. Items typed in
+    by hand have only a title."""
     user = models.ForeignKey(
         User,
         related_name='shopping_list_items',
         on_delete=models.deletion.CASCADE
     )
-    title = models.CharField(max_length=50)
+    title = models.CharField(max_length=200)
     done = models.BooleanField(default=False)
+    name = models.CharField(max_length=100, blank=True)
+    unit = models.CharField(max_length=20, blank=True)
+    quantity = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return self.title
+
+
+def add_recipes_to_shopping_list(user, recipes):
+    """Add the ingredients of `recipes` to a user's shopping list.
+
+    Ingredients are totalled across the recipes and with the items
+    already on the list that are not done, so each ingredient appears
+    once. Merged items are replaced, and everything is written with a
+    delete and one bulk insert. Returns the number of items written."""
+    ingredients = []
+    for text in recipes.values_list('ingredients', flat=True):
+        ingredients.extend(parse_lines(text))
+    if not ingredients:
+        return 0
+    keys = set(
+        (ingredient.key, dimension_of(ingredient))
+        for ingredient in ingredients
+    )
+    listed = ShoppingListItem.objects.filter(
+        user=user, done=False
+    ).exclude(name='').values_list('id', 'name', 'unit', 'quantity')
+    existing = []
+    for pk, name, unit, quantity in listed:
+        ingredient = ListedIngredient(
+            quantity, UNIT_NAMES.get(unit), name, name, pk
+        )
+        if (name, dimension_of(ingredient)) in keys:
+            existing.append(ingredient)
+    # Recipe ingredients come first so merged items are named after them.
+    items = []
+    for amount in merge_ingredients(ingredients + existing):
+        quantity, unit = amount.result()
+        items.append(ShoppingListItem(
+            user=user,
+            title=describe(quantity, unit, amount.name)[:200],
+            name=amount.key[:100],
+            unit=unit.name if unit else '',
+            quantity=quantity
+        ))
+    with transaction.atomic():
+        if existing:
+            ShoppingListItem.objects.filter(
+                pk__in=[ingredient.item_id for ingredient in existing]
+            ).delete()
+        ShoppingListItem.objects.bulk_create(items)
+    return len(items)
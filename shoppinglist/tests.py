@@ -1,7 +1,13 @@
+import json
+from io import StringIO
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth.models import User
-from .models import ShoppingListItem
+from recipe.models import Recipe
+from recipebook.models import RecipeBook
+from .ingredients import merge_ingredients, parse_ingredient, parse_lines
+from .models import ShoppingListItem, add_recipes_to_shopping_list
 
 
 class ShoppingListDetailView(TestCase):
@@ -24,3 +30,168 @@ class ShoppingListDetailView(TestCase):
     def test_shopping_response_has_titles(self):
         for item in self.items:
             self.assertContains(self.response, item.title)
+
+
+class IngredientParsingTests(TestCase):
+    """Tests for parsing ingredient lines."""
+
+    def test_fraction_and_unit(self):
+        ingredient = parse_ingredient('1 1/2 cups flour, sifted')
+        self.assertEqual(ingredient.quantity, 1.5)
+        self.assertEqual(ingredient.unit.name, 'cup')
+        self.assertEqual(ingredient.name, 'flour')
+
+    def test_unit_attached_to_number(self):
+        ingredient = parse_ingredient('200g butter')
+        self.assertEqual(ingredient.quantity, 200)
+        self.assertEqual(ingredient.unit.name, 'g')
+
+    def test_vulgar_fraction(self):
+        ingredient = parse_ingredient('1½ tsp vanilla')
+        self.assertEqual(ingredient.quantity, 1.5)
+        self.assertEqual(ingredient.unit.name, 'tsp')
+
+    def test_range_uses_upper_bound(self):
+        ingredient = parse_ingredient('2-3 large tomatoes (ripe)')
+        self.assertEqual(ingredient.quantity, 3)
+        self.assertIsNone(ingredient.unit)
+        self.assertEqual(ingredient.key, 'large tomato')
+
+    def test_article_and_of(self):
+        ingredient = parse_ingredient('a pinch of salt')
+        self.assertEqual(ingredient.quantity, 1)
+        self.assertEqual(ingredient.unit.name, 'pinch')
+        self.assertEqual(ingredient.name, 'salt')
+
+    def test_no_quantity(self):
+        ingredient = parse_ingredient('salt to taste')
+        self.assertIsNone(ingredient.quantity)
+        self.assertEqual(ingredient.name, 'salt')
+
+    def test_zero_denominator(self):
+        ingredient = parse_ingredient('1/0 cup flour')
+        self.assertIsNone(ingredient.quantity)
+        self.assertEqual(ingredient.name, 'flour')
+        self.assertEqual(merge_ingredients([ingredient])[0].describe(),
+                         'flour')
+
+    def test_blank(self):
+        self.assertIsNone(parse_ingredient('  '))
+        self.assertEqual(len(parse_lines('1 egg\n\n- 2 eggs\n')), 2)
+
+
+class IngredientMergingTests(TestCase):
+    """Tests for totalling parsed ingredients."""
+
+    def describe(self, text):
+        return [a.describe() for a in merge_ingredients(parse_lines(text))]
+
+    def test_converts_units(self):
+        self.assertEqual(
+            self.describe('1 cup milk\n4 tbsp milk'),
+            ['1 1/4 cups milk']
+        )
+
+    def test_metric_units_scale(self):
+        self.assertEqual(
+            self.describe('800 g beef\n0.5 kg beef'),
+            ['1.3 kg beef']
+        )
+
+    def test_plurals_merge(self):
+        self.assertEqual(self.describe('2 eggs\n1 egg'), ['3 eggs'])
+        self.assertEqual(
+            self.describe('1 tomato\n1 tomato'),
+            ['2 tomatoes']
+        )
+
+    def test_dimensions_kept_apart(self):
+        self.assertEqual(
+            self.describe('1 cup flour\n100 g flour\n2 cloves garlic'),
+            ['1 cup flour', '100 g flour', '2 cloves garlic']
+        )
+
+
+class AddToShoppingListTests(TestCase):
+    """Tests for adding recipes and recipe books to a shopping list."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='cook')
+        self.client.force_login(self.user)
+        self.book = RecipeBook.objects.create(user=self.user, title='book')
+
+    def add_recipes(self, count, ingredients):
+        recipes = []
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title='recipe#{}'.format(i),
+                description='description',
+                ingredients=ingredients.format(i=i),
+                directions='directions'
+            )
+            recipes.append(recipe)
+        self.book.recipes.add(*recipes)
+        return recipes
+
+    def titles(self):
+        return list(self.user.shopping_list_items.order_by('id')
+                    .values_list('title', flat=True))
+
+    def test_add_recipe(self):
+        recipe, = self.add_recipes(1, '2 cups milk\n3 eggs')
+        response = self.client.post(
+            reverse('add_recipe_to_shopping_list', args=[recipe.pk])
+        )
+        self.assertRedirects(response, reverse('view_shopping_list'))
+        self.assertEqual(self.titles(), ['2 cups milk', '3 eggs'])
+
+    def test_add_recipebook_merges(self):
+        self.add_recipes(3, '1 cup milk\n1 egg')
+        self.client.post(
+            reverse('add_recipebook_to_shopping_list', args=[self.book.pk])
+        )
+        self.assertEqual(self.titles(), ['3 cups milk', '3 eggs'])
+
+    def test_merges_with_list(self):
+        recipe, = self.add_recipes(1, '1 cup milk\n1 onion')
+        ShoppingListItem.objects.create(user=self.user, title='bread')
+        add_recipes_to_shopping_list(self.user, self.book.recipes.all())
+        add_recipes_to_shopping_list(self.user, self.book.recipes.all())
+        self.assertEqual(self.titles(), ['bread', '2 cups milk', '2 onions'])
+
+    def test_done_items_not_merged(self):
+        self.add_recipes(1, '1 cup milk')
+        add_recipes_to_shopping_list(self.user, self.book.recipes.all())
+        self.user.shopping_list_items.update(done=True)
+        add_recipes_to_shopping_list(self.user, self.book.recipes.all())
+        self.assertEqual(self.titles(), ['1 cup milk', '1 cup milk'])
+
+    def test_anonymous_redirected(self):
+        recipe, = self.add_recipes(1, '1 egg')
+        self.client.logout()
+        response = self.client.post(
+            reverse('add_recipe_to_shopping_list', args=[recipe.pk])
+        )
+        self.assertRedirects(
+            response, reverse('auth_login'), fetch_redirect_response=False
+        )
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_query_count_independent_of_size(self):
+        """Adding a book takes the same queries for 2 or 40 recipes."""
+        self.add_recipes(2, '1 cup milk\n{i} g ingredient{i}')
+        add_recipes_to_shopping_list(self.user, self.book.recipes.all())
+        with self.assertNumQueries(6):
+            add_recipes_to_shopping_list(self.user, self.book.recipes.all())
+        self.add_recipes(38, '1 cup milk\n{i} g ingredient{i}')
+        with self.assertNumQueries(6):
+            add_recipes_to_shopping_list(self.user, self.book.recipes.all())
+
+    def test_large_book(self):
+        """A 200-recipe book is added well within a second."""
+        out = StringIO()
+        call_command('benchmark_shopping_list', repeat=1, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['recipes'], 200)
+        self.assertLess(report['max_ms'], 1000)
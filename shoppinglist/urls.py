@@ -1,6 +1,16 @@
 from django.conf.urls import url
-from .views import ShoppingListDetailView
+from .views import (
+    ShoppingListDetailView,
+    add_recipe_view,
+    add_recipebook_view
+)
 
 urlpatterns = [
+    url(r'^add/recipe/(?P<pk>[0-9]+)$',
+        add_recipe_view,
+        name='add_recipe_to_shopping_list'),
+    url(r'^add/recipebook/(?P<pk>[0-9]+)$',
+        add_recipebook_view,
+        name='add_recipebook_to_shopping_list'),
     url(r'$', ShoppingListDetailView.as_view(), name='view_shopping_list'),
 ]
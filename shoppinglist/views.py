@@ -1,8 +1,54 @@
+from django.http import HttpResponseRedirect
+from django.shortcuts import get_object_or_404
 from django.views.generic import TemplateView
 from django.contrib.auth.models import User
+from django.urls import reverse
+from recipe.models import Recipe
+from recipebook.models import RecipeBook
+from .models import add_recipes_to_shopping_list
 
 
 class ShoppingListDetailView(TemplateView):
     """View for viewing shopping lists."""
     model = User
     template_name = 'view_shopping_list.html'
+
+    def get_context_data(self, **kwargs):
+        context = super(ShoppingListDetailView, self).get_context_data(
+            **kwargs
+        )
+        user = self.request.user
+        if user.is_authenticated():
+            context['items'] = user.shopping_list_items.order_by(
+                'done', 'id'
+            )
+        return context
+
+
+def add_recipe_view(request, pk):
+    """Add a recipe's ingredients to the user's shopping list.
+
+    For POST requests only."""
+    if request.user.is_anonymous():
+        return HttpResponseRedirect(reverse('auth_login'))
+    if request.method != 'POST':
+        return HttpResponseRedirect(reverse('view_recipe', args=[pk]))
+    get_object_or_404(Recipe, pk=pk)
+    add_recipes_to_shopping_list(
+        request.user,
+        Recipe.objects.filter(pk=pk)
+    )
+    return HttpResponseRedirect(reverse('view_shopping_list'))
+
+
+def add_recipebook_view(request, pk):
+    """Add the ingredients of every recipe in a recipe book.
+
+    For POST requests only."""
+    if request.user.is_anonymous():
+        return HttpResponseRedirect(reverse('auth_login'))
+    if request.method != 'POST':
+        return HttpResponseRedirect(reverse('view_recipebook', args=[pk]))
+    book = get_object_or_404(RecipeBook, pk=pk)
+    add_recipes_to_shopping_list(request.user, book.recipes.all())
+    return HttpResponseRedirect(reverse('view_shopping_list'))
@@ -1,7 +1,13 @@
 from django.contrib import admin
-from .models import UserProfile
+from .models import Follow, UserProfile
 
 
 @admin.register(UserProfile)
 class RecipeBookAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(Follow)
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('follower', 'followed', 'date_created')
+    raw_id_fields = ('follower', 'followed')
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.6 on 2026-10-18 18:58
+from __future__ import unicode_literals
+
+from collections import Counter
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_follows(apps, schema_editor):
+    """Copy UserProfile.follows into Follow edges and count them."""
+    UserProfile = apps.get_model('user_profile', 'UserProfile')
+    Follow = apps.get_model('user_profile', 'Follow')
+    Through = UserProfile._meta.get_field('follows').remote_field.through
+    pairs = list(Through.objects.values_list(
+        'userprofile__user_id', 'user_id'
+    ))
+    Follow.objects.bulk_create(
+        (Follow(follower_id=a, followed_id=b) for a, b in pairs if a != b),
+        batch_size=500
+    )
+    followers = Counter(b for a, b in pairs if a != b)
+    following = Counter(a for a, b in pairs if a != b)
+    for user_id in set(followers) | set(following):
+        UserProfile.objects.filter(user_id=user_id).update(
+            follower_count=followers[user_id],
+            following_count=following[user_id]
+        )
+
+
+def copy_follows_back(apps, schema_editor):
+    UserProfile = apps.get_model('user_profile', 'UserProfile')
+    Follow = apps.get_model('user_profile', 'Follow')
+    Through = UserProfile._meta.get_field('follows').remote_field.through
+    profile_ids = dict(UserProfile.objects.values_list('user_id', 'id'))
+    pairs = Follow.objects.values_list('follower_id', 'followed_id')
+    Through.objects.bulk_create(
+        (Through(userprofile_id=profile_ids[a], user_id=b) for a, b in pairs),
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('user_profile', '0003_userprofile_follows'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('followed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower_edges', to=settings.AUTH_USER_MODEL)),
+                ('follower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='follow',
+            unique_together=set([('follower', 'followed')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='follow',
+            index_together=set([('followed', 'follower')]),
+        ),
+        migrations.RunPython(copy_follows, copy_follows_back),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='follows',
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.contrib.auth.models import User
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models import Count, F
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from utils.page_cache import invalidate_pages, profile_tag
 
 
 class UserProfile(models.Model):
@@ -13,16 +15,177 @@ class UserProfile(models.Model):
         related_name="profile",
     )
     bio = models.TextField(max_length=1000, blank=True)
-    follows = models.ManyToManyField(
+    # Denormalized from Follow, so profiles show counts without
+    # counting edges.
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Bumped whenever anything shown on the profile page but not in
+    # its recipe listing changes.
+    version = models.PositiveIntegerField(default=1)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            # Follows bump the row without touching this instance.
+            self.version = F('version') + 1
+        super(UserProfile, self).save(*args, **kwargs)
+
+    def __str__(self):
+        return "{}'s profile".format(self.user.username)
+
+
+class Follow(models.Model):
+    """An edge of the follow graph: `follower` follows `followed`.
+
+    The unique index on (follower, followed) serves "who does this user
+    follow" and "does this user follow these"; the index on (followed,
+    follower) serves "who follows this user"."""
+
+    follower = models.ForeignKey(
+        User,
+        related_name='following_edges',
+        on_delete=models.CASCADE
+    )
+    followed = models.ForeignKey(
         User,
-        related_name="followers"
+        related_name='follower_edges',
+        on_delete=models.CASCADE
     )
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('follower', 'followed')
+        index_together = [('followed', 'follower')]
 
     def __str__(self):
-        return "{}'s profile".format(self.user.username)
+        return '{} follows {}'.format(self.follower_id, self.followed_id)
+
+
+def follow(follower, followed):
+    """Make `follower` follow `followed`.
+
+    Returns whether they did not already; users cannot follow
+    themselves."""
+    if follower.pk == followed.pk:
+        return False
+    _, created = Follow.objects.get_or_create(
+        follower=follower,
+        followed=followed
+    )
+    return created
+
+
+def unfollow(follower, followed):
+    """Stop `follower` following `followed`; returns whether they did."""
+    deleted, _ = Follow.objects.filter(
+        follower=follower,
+        followed=followed
+    ).delete()
+    return bool(deleted)
+
+
+def following_ids(user, user_ids):
+    """Return which of `user_ids` `user` follows, in one query.
+
+    For listing pages marking each listed user as followed or not."""
+    user_ids = list(user_ids)
+    if not user_ids or not user.is_authenticated():
+        return set()
+    return set(Follow.objects.filter(
+        follower=user,
+        followed__in=user_ids
+    ).values_list('followed_id', flat=True))
+
+
+def get_following(user):
+    """Return the users `user` follows, most recently followed first."""
+    return User.objects.filter(
+        follower_edges__follower=user
+    ).order_by('-follower_edges__date_created')
+
+
+def get_followers(user):
+    """Return the users following `user`, most recent first."""
+    return User.objects.filter(
+        following_edges__followed=user
+    ).order_by('-following_edges__date_created')
+
+
+def update_follow_counts(follower_id, followed_id, delta):
+    UserProfile.objects.filter(user_id=follower_id).update(
+        following_count=F('following_count') + delta,
+        version=F('version') + 1
+    )
+    UserProfile.objects.filter(user_id=followed_id).update(
+        follower_count=F('follower_count') + delta,
+        version=F('version') + 1
+    )
+
+
+def bump_profile_version(user_id):
+    UserProfile.objects.filter(user_id=user_id).update(
+        version=F('version') + 1
+    )
+
+
+def reconcile_follow_counts(profiles=None):
+    """Recompute follower and following counts, fixing any that drifted.
+
+    Returns the number of profiles corrected."""
+    if profiles is None:
+        profiles = UserProfile.objects.all()
+    followers = dict(Follow.objects.values_list('followed').annotate(
+        count=Count('id')
+    ).order_by())
+    following = dict(Follow.objects.values_list('follower').annotate(
+        count=Count('id')
+    ).order_by())
+    rows = profiles.values_list(
+        'pk', 'user_id', 'follower_count', 'following_count'
+    )
+    fixed = 0
+    for pk, user_id, follower_count, following_count in rows.iterator():
+        actual = (followers.get(user_id, 0), following.get(user_id, 0))
+        if (follower_count, following_count) != actual:
+            UserProfile.objects.filter(pk=pk).update(
+                follower_count=actual[0],
+                following_count=actual[1],
+                version=F('version') + 1
+            )
+            fixed += 1
+    return fixed
 
 
 @receiver(post_save, sender=User)
-def update_tracker_profile(sender, **kwargs):
-    if not UserProfile.objects.filter(user=kwargs['instance']):
-        UserProfile(user=kwargs['instance']).save()
+def update_tracker_profile(sender, instance, created, raw=False, **kwargs):
+    # Pages expect every user to have a profile, so it is made with the
+    # user rather than by a job; later saves, e.g. at each login, no
+    # longer look for it.
+    if created and not raw:
+        UserProfile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_follow_counts(instance.follower_id, instance.followed_id, 1)
+        invalidate_follow_pages(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow(sender, instance, **kwargs):
+    update_follow_counts(instance.follower_id, instance.followed_id, -1)
+    invalidate_follow_pages(instance)
+
+
+def invalidate_follow_pages(follow):
+    # Both profiles show follow counts.
+    invalidate_pages(
+        profile_tag(follow.follower.username),
+        profile_tag(follow.followed.username)
+    )
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_profile_page(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_pages(profile_tag(instance.user.username))
@@ -1,8 +1,20 @@
-from django.test import TestCase
-from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import AnonymousUser, User
 from django.urls import reverse
 from recipe.models import Recipe
 from recipebook.models import RecipeBook
+from notification.models import Notification
+from .models import (
+    Follow,
+    UserProfile,
+    follow,
+    following_ids,
+    get_following,
+    reconcile_follow_counts,
+    unfollow
+)
 
 
 class UserProfileTests(TestCase):
@@ -30,7 +42,7 @@ class ProfileViewTests(TestCase):
         self.user.profile.bio = self.bio
         self.followed_user = User(username='another')
         self.followed_user.save()
-        self.user.profile.follows.add(self.followed_user)
+        follow(self.user, self.followed_user)
         self.user.profile.save()
         self.recipe = Recipe(
             user=self.user,
@@ -97,13 +109,13 @@ class ProfileViewTests(TestCase):
         another_user.save()
         follow_url = format(reverse('follow', args=[another_user.username]))
         self.client.post(follow_url, dict(follow='follow'))
-        self.assertEqual(self.user.profile.follows.last(), another_user)
+        self.assertEqual(get_following(self.user).first(), another_user)
 
     def test_followed_profile_has_unfollow_button(self):
         self.client.force_login(self.user)
         another_user = User(username='one_more')
         another_user.save()
-        self.user.profile.follows.add(another_user)
+        follow(self.user, another_user)
         profile_url = reverse('profile', args=[another_user.username])
         follow_url = format(reverse('follow', args=[another_user.username]))
         follow_action_url = 'action="{}"'.format(follow_url)
@@ -116,10 +128,10 @@ class ProfileViewTests(TestCase):
         self.client.force_login(self.user)
         another_user = User(username='one_more')
         another_user.save()
-        self.user.profile.follows.add(another_user)
+        follow(self.user, another_user)
         follow_url = format(reverse('follow', args=[another_user.username]))
         self.client.post(follow_url, dict(follow='unfollow'))
-        self.assertNotEqual(self.user.profile.follows.last(), another_user)
+        self.assertNotIn(another_user, get_following(self.user))
 
     def test_logged_out_has_no_follow_button(self):
         profile_url = reverse('profile', args=[self.user.username])
@@ -179,11 +191,11 @@ class FollowListsTestCase(TestCase):
         for i in range(50):
             other_user = User(username='user_follows_{}'.format(i))
             other_user.save()
-            user.profile.follows.add(other_user)
+            follow(user, other_user)
         for i in range(50):
             other_user = User(username='following_user_{}'.format(i))
             other_user.save()
-            other_user.profile.follows.add(user)
+            follow(other_user, user)
         following_url = reverse('following_list', args=[user])
         self.following_response = self.client.get(following_url)
         follower_url = reverse('followers_list', args=[user])
@@ -238,3 +250,174 @@ class RecipeBooksTests(TestCase):
         response = self.client.get(url)
         title = self.recipebooks[0].title
         self.assertContains(response, title, 10)
+
+
+class FollowGraphTests(TestCase):
+    """Tests for follow edges and their denormalized counts."""
+
+    def setUp(self):
+        self.users = []
+        for i in range(4):
+            user = User(username='user{}'.format(i))
+            user.save()
+            self.users.append(user)
+        self.me = self.users[0]
+
+    def profile(self, user):
+        return UserProfile.objects.get(user=user)
+
+    def test_counts(self):
+        for user in self.users[1:]:
+            follow(self.me, user)
+        follow(self.users[1], self.me)
+        self.assertEqual(self.profile(self.me).following_count, 3)
+        self.assertEqual(self.profile(self.me).follower_count, 1)
+        self.assertEqual(self.profile(self.users[1]).follower_count, 1)
+        unfollow(self.me, self.users[1])
+        self.assertEqual(self.profile(self.me).following_count, 2)
+        self.assertEqual(self.profile(self.users[1]).follower_count, 0)
+
+    def test_follow_twice(self):
+        self.assertTrue(follow(self.me, self.users[1]))
+        self.assertFalse(follow(self.me, self.users[1]))
+        self.assertEqual(self.profile(self.me).following_count, 1)
+        self.assertTrue(unfollow(self.me, self.users[1]))
+        self.assertFalse(unfollow(self.me, self.users[1]))
+        self.assertEqual(self.profile(self.me).following_count, 0)
+
+    def test_cannot_follow_self(self):
+        self.assertFalse(follow(self.me, self.me))
+        self.assertFalse(Follow.objects.exists())
+
+    def test_deleted_user_leaves_counts(self):
+        follow(self.me, self.users[1])
+        self.users[1].delete()
+        self.assertEqual(self.profile(self.me).following_count, 0)
+
+    def test_following_ids(self):
+        follow(self.me, self.users[1])
+        follow(self.me, self.users[3])
+        follow(self.users[2], self.me)
+        with self.assertNumQueries(1):
+            ids = following_ids(
+                self.me, [user.pk for user in self.users]
+            )
+        self.assertEqual(ids, {self.users[1].pk, self.users[3].pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(following_ids(AnonymousUser(), [1]), set())
+
+    def test_reconcile(self):
+        follow(self.me, self.users[1])
+        UserProfile.objects.update(follower_count=5, following_count=5)
+        self.assertEqual(reconcile_follow_counts(), 4)
+        self.assertEqual(self.profile(self.me).following_count, 1)
+        self.assertEqual(self.profile(self.users[1]).follower_count, 1)
+        self.assertEqual(reconcile_follow_counts(), 0)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_follow_view_notifies_once(self):
+        self.client.force_login(self.me)
+        url = reverse('follow', args=[self.users[1].username])
+        self.client.post(url, dict(follow='follow'))
+        self.client.post(url, dict(follow='follow'))
+        self.assertEqual(
+            Notification.objects.filter(type='follow').count(),
+            1
+        )
+
+    def test_follow_view_missing_user(self):
+        self.client.force_login(self.me)
+        response = self.client.post(
+            reverse('follow', args=['nobody']),
+            dict(follow='follow')
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_profile_counts_without_graph_queries(self):
+        """The profile page reads counts, not follow edges."""
+        for user in self.users[1:]:
+            follow(user, self.me)
+        self.client.force_login(self.users[1])
+        url = reverse('profile', args=[self.me.username])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'Followers (3)')
+        self.assertContains(response, 'Following (0)')
+        self.assertContains(response, 'value="unfollow"')
+        edge_queries = [
+            q['sql'] for q in queries if 'user_profile_follow' in q['sql']
+        ]
+        self.assertEqual(len(edge_queries), 1)
+
+    def test_lists_mark_followed_users(self):
+        follow(self.me, self.users[1])
+        follow(self.users[2], self.users[1])
+        follow(self.users[3], self.users[1])
+        self.client.force_login(self.me)
+        url = reverse('followers_list', args=[self.users[1].username])
+        response = self.client.get(url)
+        self.assertEqual(response.context['followed_ids'], set())
+        follow(self.me, self.users[3])
+        response = self.client.get(url)
+        self.assertEqual(
+            response.context['followed_ids'],
+            {self.users[3].pk}
+        )
+        self.assertContains(response, 'class="followed"', 1)
+
+
+class ProfileConditionalGetTests(TestCase):
+    """Test unchanged profile pages are answered with 304."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='cook')
+        self.viewer = User.objects.create(username='viewer')
+        self.client.force_login(self.viewer)
+        self.url = reverse('profile', args=['cook'])
+        self.response = self.client.get(self.url)
+
+    def revalidate(self):
+        return self.client.get(
+            self.url,
+            HTTP_IF_NONE_MATCH=self.response['ETag']
+        ).status_code
+
+    def test_not_modified(self):
+        self.assertEqual(self.revalidate(), 304)
+
+    def test_follow_changes_tag(self):
+        follow(self.viewer, self.user)
+        self.assertEqual(self.revalidate(), 200)
+
+    def test_recipe_changes_tag(self):
+        Recipe.objects.create(
+            user=self.user,
+            title='new',
+            description='new',
+            ingredients='food',
+            directions='make it'
+        )
+        self.assertEqual(self.revalidate(), 200)
+
+    def test_recipebook_changes_tag(self):
+        RecipeBook(user=self.user, title='book', description='').save()
+        self.assertEqual(self.revalidate(), 200)
+
+    def test_recipe_replaced_changes_tag(self):
+        """Deleting a recipe and creating one keeps the recipe count and
+        version sum, but not the tag."""
+        recipe = Recipe.objects.create(user=self.user, title='old')
+        self.response = self.client.get(self.url)
+        recipe.delete()
+        Recipe.objects.create(user=self.user, title='new')
+        self.assertEqual(self.revalidate(), 200)
+
+    def test_bio_changes_tag(self):
+        profile = self.user.profile
+        profile.bio = 'I cook'
+        profile.save()
+        self.assertEqual(self.revalidate(), 200)
+
+    def test_missing_user(self):
+        url = reverse('profile', args=['nobody'])
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -4,6 +4,7 @@ from .views import (
     RecipeBooksListView,
     ProfileUpdateView,
     follow_view,
+    export_view,
     FollowingListView,
     FollowersListView,
 )
@@ -21,4 +22,5 @@ urlpatterns = [
         name='profile_recipebooks'),
     url('edit$', ProfileUpdateView.as_view(), name='edit_profile'),
     url('follow/(?P<slug>\w+)$', follow_view, name='follow'),
+    url('export$', export_view, name='export_recipes'),
 ]
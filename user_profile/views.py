@@ -1,32 +1,58 @@
 from django.contrib.auth.models import User
+from django.db.models import Count, Sum
+from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.views.generic import DetailView, UpdateView
-from django.http import HttpResponseRedirect
-from utils.utils import paginate
-from .models import UserProfile
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from utils.utils import page_etag, paginate, paginate_by_cursor
+from .models import (
+    UserProfile,
+    follow,
+    following_ids,
+    get_followers,
+    get_following,
+    unfollow
+)
 from recipebook.models import RecipeBookForm
-from notification.models import Notification
+from recipebook.transfer import export_lines
+from notification.models import notify
 
 
+def profile_etag(request, slug):
+    """ETag from the profile's version and its user's recipes'.
+
+    The profile version changes as recipes are created and deleted,
+    which the count and sum of recipe versions can miss."""
+    stamps = User.objects.filter(username=slug).annotate(
+        count=Count('recipes'),
+        versions=Sum('recipes__version')
+    ).values_list('profile__version', 'count', 'versions').first()
+    if stamps is None:
+        return None
+    return page_etag(request, *stamps)
+
+
+@method_decorator(condition(etag_func=profile_etag), name='dispatch')
 class ProfileDetailView(DetailView):
     model = User
     template_name = 'profile_detail.html'
     slug_field = 'username'
+    queryset = User.objects.select_related('profile')
 
     def get_context_data(self, **kwargs):
         context = super(ProfileDetailView, self).get_context_data(**kwargs)
-        context.update(paginate(
+        context.update(paginate_by_cursor(
             self.request,
-            self.object.recipes.order_by('-date_created')
+            self.object.recipes.for_listing()
         ))
         context['own_profile'] = self.object == self.request.user
         recipebooks = self.object.recipebooks
         context['recipebooks'] = recipebooks.order_by('-date_created')[:5]
-        context['follower_count'] = get_followers(self.object).count()
-        if self.request.user.is_authenticated():
-            context['followed'] = self.request.user.profile.follows.filter(
-                username=self.object.username
-            ).count()
+        context['followed'] = bool(
+            following_ids(self.request.user, [self.object.pk])
+        )
         return context
 
 
@@ -46,19 +72,32 @@ def follow_view(request, slug):
     """Add a follower."""
     if request.user.is_anonymous():
         return HttpResponseRedirect(reverse('auth_login'))
-    user = User.objects.filter(username=slug).first()
+    user = get_object_or_404(User, username=slug)
     if request.POST['follow'] == 'follow':
-        request.user.profile.follows.add(user)
-        Notification(
-            user=user,
-            type='follow',
-            object_key=request.user.id
-        ).save()
+        if follow(request.user, user):
+            notify(user.id, 'follow', request.user.id)
     else:
-        request.user.profile.follows.remove(user)
+        unfollow(request.user, user)
     return HttpResponseRedirect(reverse('profile', args=[slug]))
 
 
+def export_view(request):
+    """Download the user's recipes and recipe books as JSON Lines.
+
+    The file is streamed as it is read, a chunk of rows at a time."""
+    if request.user.is_anonymous():
+        return HttpResponseRedirect(reverse('auth_login'))
+    user = request.user
+    response = StreamingHttpResponse(
+        export_lines(user.recipes.all(), user.recipebooks.all()),
+        content_type='application/x-ndjson; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        'attachment; filename="{}-recipes.jsonl"'.format(user.username)
+    )
+    return response
+
+
 class RecipeBooksListView(DetailView):
     model = User
     template_name = 'profile_recipebooks.html'
@@ -67,9 +106,9 @@ class RecipeBooksListView(DetailView):
     def get_context_data(self, **kwargs):
         context = super(RecipeBooksListView, self).get_context_data(**kwargs)
         context['own_profile'] = self.object == self.request.user
-        context.update(paginate(
+        context.update(paginate_by_cursor(
             self.request,
-            self.object.recipebooks.order_by('-date_created')
+            self.object.recipebooks.all()
         ))
         context['recipebook_form'] = RecipeBookForm
         return context
@@ -83,11 +122,8 @@ class FollowingListView(DetailView):
     def get_context_data(self, **kwargs):
         context = super(FollowingListView, self).get_context_data(**kwargs)
         context['following_list'] = True
-        context.update(paginate(
-            self.request,
-            self.object.profile.follows.all()
-        ))
-        return context
+        context.update(paginate(self.request, get_following(self.object)))
+        return mark_followed(self.request, context)
 
 
 class FollowersListView(DetailView):
@@ -98,8 +134,14 @@ class FollowersListView(DetailView):
     def get_context_data(self, **kwargs):
         context = super(FollowersListView, self).get_context_data(**kwargs)
         context.update(paginate(self.request, get_followers(self.object)))
-        return context
+        return mark_followed(self.request, context)
 
 
-def get_followers(user):
-    return User.objects.filter(profile__follows__username=user.username)
+def mark_followed(request, context):
+    """Add the ids of listed users the viewer follows to `context`."""
+    context['objects'] = list(context['objects'])
+    context['followed_ids'] = following_ids(
+        request.user,
+        [user.pk for user in context['objects']]
+    )
+    return context
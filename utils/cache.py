@@ -0,0 +1,71 @@
+import threading
+from django.core.cache import cache
+
+
+CACHE_STATS = {}
+
+
+class CacheStats(object):
+    """Hit and miss counters for one use of the cache.
+
+    Counts are kept in memory and added to totals in the cache every
+    `flush_every` events, so recording a hit costs no cache round trip
+    and totals from every process can be read by `manage.py cache_stats`.
+    """
+
+    flush_every = 100
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.pending = dict(hits=0, misses=0)
+        CACHE_STATS[name] = self
+
+    def key(self, kind):
+        return 'cache_stats:{}:{}'.format(self.name, kind)
+
+    def record(self, kind):
+        with self.lock:
+            self.pending[kind] += 1
+            if sum(self.pending.values()) < self.flush_every:
+                return
+            pending, self.pending = self.pending, dict(hits=0, misses=0)
+        self.add_totals(pending)
+
+    def hit(self):
+        self.record('hits')
+
+    def miss(self):
+        self.record('misses')
+
+    def add_totals(self, counts):
+        for kind, count in counts.items():
+            if not count:
+                continue
+            key = self.key(kind)
+            if not cache.add(key, count, None):
+                try:
+                    cache.incr(key, count)
+                except ValueError:
+                    cache.set(key, count, None)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, dict(hits=0, misses=0)
+        self.add_totals(pending)
+
+    def totals(self):
+        """Return flushed totals as a dict of hits, misses and hit rate."""
+        hits = cache.get(self.key('hits'), 0)
+        misses = cache.get(self.key('misses'), 0)
+        lookups = hits + misses
+        return dict(
+            hits=hits,
+            misses=misses,
+            hit_rate=hits / lookups if lookups else None
+        )
+
+    def reset(self):
+        with self.lock:
+            self.pending = dict(hits=0, misses=0)
+        cache.delete_many([self.key('hits'), self.key('misses')])
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from utils.cache import CACHE_STATS
+
+
+class Command(BaseCommand):
+    help = 'Show hit and miss counts recorded for cached lookups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Clear the counts after showing them.'
+        )
+
+    def handle(self, *args, **options):
+        for name in sorted(CACHE_STATS):
+            stats = CACHE_STATS[name]
+            totals = stats.totals()
+            if totals['hit_rate'] is None:
+                rate = '-'
+            else:
+                rate = '{:.1%}'.format(totals['hit_rate'])
+            self.stdout.write('{}: {} hits, {} misses, hit rate {}'.format(
+                name, totals['hits'], totals['misses'], rate
+            ))
+            if options['reset']:
+                stats.reset()
@@ -0,0 +1,124 @@
+"""Whole pages cached for anonymous visitors.
+
+Each cached page depends on tags named after what it shows, e.g. one
+recipe or one user's profile. Every tag has a stamp in the cache, and a
+page is stored with the stamps its tags had before it was rendered; it
+is served only while they are unchanged. Changing a tag's stamp, from
+the signal receivers of the models shown, invalidates every page that
+depends on it, whatever its query string.
+"""
+from hashlib import md5
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_etags
+from .cache import CacheStats
+
+
+LISTING_TAG = 'recipes'
+
+page_cache_stats = CacheStats('page')
+
+
+def recipe_tag(recipe_id):
+    return 'recipe:{}'.format(recipe_id)
+
+
+def profile_tag(username):
+    return 'profile:{}'.format(username)
+
+
+# Tags of the pages cached, by URL name, from the URL's arguments.
+PAGE_TAGS = {
+    'home': lambda kwargs: [LISTING_TAG],
+    'view_recipe': lambda kwargs: [recipe_tag(kwargs['pk'])],
+    'profile': lambda kwargs: [profile_tag(kwargs['slug'])],
+}
+
+
+def stamp_key(tag):
+    return 'page:stamp:{}'.format(tag)
+
+
+def page_key(path):
+    return 'page:{}'.format(md5(path.encode()).hexdigest())
+
+
+def resolve_cached_page(path):
+    """Return (resolver match, tags) for the page at `path`, or None if
+    it is not cached."""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    tags = PAGE_TAGS.get(match.url_name)
+    if tags is None:
+        return None
+    return match, tags(match.kwargs)
+
+
+def bump_stamps(tags):
+    cache.set_many(dict((stamp_key(tag), uuid4().hex) for tag in tags), None)
+
+
+def invalidate_pages(*tags):
+    """Invalidate the cached pages depending on any of `tags`.
+
+    Stamps change immediately and again when the transaction commits,
+    so a page rendered from data read before the commit is not kept."""
+    if not tags:
+        return
+    bump_stamps(tags)
+    transaction.on_commit(lambda: bump_stamps(tags))
+
+
+def get_cached_page(path, tags):
+    """Return (page, stamps) for `path`, page being None on a miss.
+
+    Tags without a stamp are given one; pages are stored with the
+    stamps returned, and dropped once these change."""
+    keys = [stamp_key(tag) for tag in tags]
+    found = cache.get_many([page_key(path)] + keys)
+    stamps = []
+    for key in keys:
+        stamp = found.get(key)
+        if stamp is None:
+            stamp = uuid4().hex
+            if not cache.add(key, stamp, None):
+                stamp = cache.get(key)
+        stamps.append(stamp)
+    page = found.get(page_key(path))
+    if page is None or page['stamps'] != stamps:
+        page_cache_stats.miss()
+        return None, stamps
+    page_cache_stats.hit()
+    return page, stamps
+
+
+def cache_page(path, stamps, response):
+    cache.set(page_key(path), dict(
+        stamps=stamps,
+        status=response.status_code,
+        content=response.content,
+        headers=list(response.items())
+    ), settings.PAGE_CACHE_TIMEOUT)
+
+
+def page_response(request, page):
+    """Build the response for a cached page, or 304 if the client has
+    it."""
+    response = HttpResponse(page['content'], status=page['status'])
+    for header, value in page['headers']:
+        response[header] = value
+    if response.has_header('ETag'):
+        etags = parse_etags(response['ETag'])
+        response = get_conditional_response(
+            request,
+            etag=etags[0] if etags else None,
+            response=response
+        )
+    return response
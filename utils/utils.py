@@ -1,7 +1,15 @@
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from binascii import Error as DecodeError
+from hashlib import md5
 from math import ceil
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.query import QuerySet
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.http import HttpResponseRedirect, HttpResponseForbidden
+from django.middleware.csrf import get_token
 
 
 def ownership_dispatch_factory(cls):
@@ -50,12 +58,17 @@ def paginate(request, objects, page_param='p', per_page=10):
 
     dict(
       objects=<paginated objects>,
-      pages=<rendered pages>
+      pages=<rendered pages>,
+      count=<number of objects>
     )"""
     params = request.GET.dict()
     page = get_page(params, page_param)
     uri = request.get_full_path().split('?')[0]
-    num_pages = max(ceil(len(objects) / per_page), 1)
+    if isinstance(objects, QuerySet):
+        count = objects.count()
+    else:
+        count = len(objects)
+    num_pages = max(ceil(count / per_page), 1)
     previous_page = next_page = None
     if page > 1:
         previous_page = format_url(uri, params, page_param, page-1)
@@ -66,5 +79,130 @@ def paginate(request, objects, page_param='p', per_page=10):
             previous_page_url=previous_page,
             next_page_url=next_page
         )),
-        objects=objects[(page-1)*per_page:page*per_page]
+        objects=objects[(page-1)*per_page:page*per_page],
+        count=count
     )
+
+
+def encode_cursor(direction, obj, fields):
+    """Encode an opaque cursor for the position of `obj`."""
+    values = [str(getattr(obj, f)) for f in fields]
+    data = json.dumps([direction, values]).encode()
+    return urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor, returning (direction, values) or None."""
+    try:
+        data = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(data.decode())
+    except (DecodeError, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+def cursor_values(model, fields, values):
+    """Convert a decoded cursor's values with `model`'s fields, returning
+    None unless each one is valid."""
+    if len(values) != len(fields):
+        return None
+    converted = []
+    for field, value in zip(fields, values):
+        if not isinstance(value, str):
+            return None
+        try:
+            value = model._meta.get_field(field).to_python(value)
+        except ValidationError:
+            return None
+        if value is None:
+            return None
+        converted.append(value)
+    return converted
+
+
+def cursor_filter(fields, descending, values):
+    """Build a filter for rows strictly after `values` in the ordering.
+
+    For fields (a, b) this is `a < x OR (a = x AND b < y)` when
+    `descending`, which lets the database seek with an index on (a, b)
+    instead of counting and skipping rows."""
+    lookup = 'lt' if descending else 'gt'
+    query = Q()
+    for i, field in enumerate(fields):
+        clause = Q(**{'{}__{}'.format(field, lookup): values[i]})
+        for prefix, value in zip(fields[:i], values):
+            clause &= Q(**{prefix: value})
+        query |= clause
+    return query
+
+
+def paginate_by_cursor(request, objects, order=('-date_created', '-id'),
+                       cursor_param='c', per_page=10):
+    """Like `paginate`, but pages with keyset cursors instead of offsets.
+
+    `objects` must be a queryset and `order` a unique ordering whose
+    fields share a direction. Only `per_page + 1` rows are fetched for
+    any page, regardless of how deep it is."""
+    fields = [f.lstrip('-') for f in order]
+    descending = order[0].startswith('-')
+    params = request.GET.dict()
+    uri = request.get_full_path().split('?')[0]
+    cursor = decode_cursor(params.get(cursor_param, ''))
+    if cursor:
+        values = cursor_values(objects.model, fields, cursor[1])
+        cursor = (cursor[0], values) if values is not None else None
+    backwards = cursor is not None and cursor[0] == 'prev'
+    if backwards:
+        reverse_order = [f[1:] if f[0] == '-' else '-' + f for f in order]
+        objects = objects.order_by(*reverse_order)
+        objects = objects.filter(
+            cursor_filter(fields, not descending, cursor[1])
+        )
+    else:
+        objects = objects.order_by(*order)
+        if cursor:
+            objects = objects.filter(
+                cursor_filter(fields, descending, cursor[1])
+            )
+    page = list(objects[:per_page + 1])
+    has_more = len(page) > per_page
+    page = page[:per_page]
+    if backwards:
+        page.reverse()
+        has_previous, has_next = has_more, True
+    else:
+        has_previous, has_next = cursor is not None, has_more
+    previous_page = next_page = None
+    if page and has_previous:
+        previous_page = format_url(
+            uri, params, cursor_param, encode_cursor('prev', page[0], fields)
+        )
+    if page and has_next:
+        next_page = format_url(
+            uri, params, cursor_param, encode_cursor('next', page[-1], fields)
+        )
+    return dict(
+        pagination_arrows=render_to_string('recipes/pages.html', dict(
+            previous_page_url=previous_page,
+            next_page_url=next_page
+        )),
+        objects=page
+    )
+
+
+def page_etag(request, *stamps):
+    """Return an ETag for a page rendered from objects at `stamps`.
+
+    Stamps are version numbers and counts read in one cheap query, so
+    an unchanged page can be answered with 304 before it is built. For
+    logged in users the tag also covers who they are and their CSRF
+    cookie, since their pages show per-user links and forms carrying
+    the token."""
+    parts = [str(stamp) for stamp in stamps]
+    if request.user.is_authenticated():
+        # Sets the cookie now if the page would have.
+        get_token(request)
+        parts.extend([str(request.user.pk), request.META['CSRF_COOKIE']])
+    return md5(':'.join(parts).encode()).hexdigest()